@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Shared on-disk cache for documents polled by many services.
+
+Lots of services on the same host fetch the very same XML or JSON document
+(Nemo, JIT, AD, Exalead...). The :class:`ResponseCache` class stores the
+response of an URL on disk so that only one download is done per interval, all
+other plugin executions reading it from the cache.
+
+**Example**::
+
+ >>> cache = ResponseCache(ttl=60)
+ >>> response = cache.get('http://wwgrpctm0001.ww.corp:8181/nemo.xml')
+ >>> response.from_cache
+ False
+ >>> response = cache.get('http://wwgrpctm0001.ww.corp:8181/nemo.xml')
+ >>> response.from_cache
+ True
+"""
+
+import os
+import errno
+import time
+import glob
+import fcntl
+import zlib
+import pickle
+import hashlib
+import tempfile
+import logging as log
+from xml.etree import cElementTree
+
+import requests
+
+logger = log.getLogger('monitoring.nagios.cache')
+
+__all__ = [
+    'ResponseCache',
+    'CachedResponse',
+    'CacheError',
+    'compact_xml_tree',
+]
+
+
+#: Arguments of ``requests.get`` that change the response, see
+#: :meth:`ResponseCache.get`.
+KEY_ARGUMENTS = ('params', 'headers', 'auth', 'cookies')
+
+
+class CacheError(Exception):
+    """Raised when the cache directory or files cannot be used."""
+    pass
+
+
+def default_cache_directory():
+    """
+    Return the default cache directory.
+
+    This is next to the retention files of the plugins, see
+    :class:`monitoring.nagios.plugin.NagiosPlugin`.
+    """
+    if os.environ.get("NAGIOSENV"):
+        return '/var/tmp/plugin/{NAGIOSENV}/cache'.format(**os.environ)
+    return '/var/tmp/plugin/cache'
+
+
+def compact_xml_tree(content):
+    """
+    Parse XML ``content`` into a compact tree of nested tuples.
+
+    Each element is represented by a tuple ``(tag, attributes, text,
+    children)``. This is a lot smaller and faster to unpickle than a
+    ``BeautifulSoup`` instance, and is suitable as a ``parser`` for
+    :meth:`ResponseCache.get`.
+
+    **Example**::
+
+     >>> compact_xml_tree('<a x="1"><b>text</b></a>')
+     ('a', {'x': '1'}, None, (('b', {}, 'text', ()),))
+
+    :param content: the XML document.
+    :type content: str
+    :returns: the root element as a tuple.
+    """
+    stack = [[None, None, None, []]]
+    for event, elem in cElementTree.iterparse(
+            _StringReader(content), events=('start', 'end')):
+        if event == 'start':
+            stack.append([elem.tag, dict(elem.attrib), None, []])
+        else:
+            tag, attrib, _, children = stack.pop()
+            stack[-1][3].append((tag, attrib, elem.text, tuple(children)))
+            elem.clear()
+    return stack[0][3][0]
+
+
+class _StringReader(object):
+    """Minimal file-like object over a string for ``iterparse``."""
+    def __init__(self, content, chunk_size=65536):
+        self._content = content
+        self._offset = 0
+        self._chunk_size = chunk_size
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self._chunk_size
+        data = self._content[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+class CachedResponse(object):
+    """
+    A response served by the :class:`ResponseCache`.
+
+    It mimics the attributes of a ``requests.Response`` that are used by the
+    plugins, so it can be wrapped by
+    :class:`monitoring.nagios.probes.http.HTTPResponse` too.
+
+    .. attribute:: CachedResponse.url
+
+        The URL that was fetched.
+
+    .. attribute:: CachedResponse.content
+
+        The raw body of the response.
+
+    .. attribute:: CachedResponse.headers
+
+        The HTTP headers of the last full response (dict).
+
+    .. attribute:: CachedResponse.fetched
+
+        The Unix timestamp the content was last validated with the server.
+
+    .. attribute:: CachedResponse.from_cache
+
+        ``True`` if no download was made to serve this response.
+
+    .. attribute:: CachedResponse.validators
+
+        Opaque values given to :meth:`ResponseCache.store` that identify the
+        version of the content (FTP modification time and size...).
+
+    .. attribute:: CachedResponse.parsed
+
+        The parsed form of the content if a ``parser`` was given, else
+        ``None``.
+    """
+    status_code = requests.codes.ok
+
+    def __init__(self, url, content, metadata, from_cache, parsed=None):
+        self.url = url
+        self.content = content
+        self.headers = metadata.get('headers', {})
+        self.encoding = metadata.get('encoding')
+        self.fetched = metadata.get('fetched', 0)
+        self.validators = metadata.get('validators')
+        self.from_cache = from_cache
+        self.parsed = parsed
+
+    @property
+    def age(self):
+        """Number of seconds since the content was validated."""
+        return time.time() - self.fetched
+
+    @property
+    def text(self):
+        """The content of the response as unicode."""
+        try:
+            return unicode(self.content, self.encoding or 'utf-8',
+                           errors='replace')
+        except LookupError:
+            return unicode(self.content, 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        """Cached responses are always successful ones."""
+        pass
+
+    def __repr__(self):
+        return "<{0} [{1}] from_cache={2}>".format(self.__class__.__name__,
+                                                   self.url,
+                                                   self.from_cache)
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of HTTP responses, keyed by URL.
+
+    - Responses younger than ``ttl`` seconds are served from disk without
+      contacting the server.
+    - Older responses are revalidated with ``If-None-Match`` /
+      ``If-Modified-Since`` headers, a ``304 Not Modified`` only refreshes the
+      cache timestamp.
+    - A lock file per URL makes concurrent plugins wait for the one that is
+      already downloading the document, instead of all downloading it.
+    - The parsed form of the document can be stored as well, see ``parser``
+      argument of :meth:`get`.
+
+    :param directory: where to store cached files. Default to
+                      :func:`default_cache_directory`.
+    :type directory: str
+    :param ttl: number of seconds a response is considered fresh. ``0``
+                disables the cache (always revalidate).
+    :type ttl: int
+    :param lock_timeout: maximum number of seconds to wait for another process
+                         that is fetching the same URL.
+    :type lock_timeout: int
+    :param session: a ``requests.Session`` like object used for downloads.
+    """
+    def __init__(self, directory=None, ttl=60, lock_timeout=30,
+                 session=None):
+        self.directory = directory or default_cache_directory()
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.session = session or requests.Session()
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not os.path.isdir(self.directory):
+                raise CacheError("Unable to create the cache folder "
+                                 "{0}: {1}".format(self.directory, e))
+
+        logger.debug("Response cache in %s, TTL is %ds.",
+                     self.directory, self.ttl)
+
+    def get(self, url, parser=None, **kwargs):
+        """
+        Return the response for ``url``, from the cache if possible.
+
+        :param url: the full URL to fetch.
+        :type url: str
+        :param parser: an optional callable that takes the raw content and
+                       returns its parsed form. The result is pickled
+                       (compressed) next to the content and reused until the
+                       content changes. Results must be picklable, see
+                       :func:`compact_xml_tree`.
+        :type parser: callable
+        :param kwargs: extra arguments given to ``requests.get`` (``auth``,
+                       ``timeout``...). ``params``, ``headers``, ``auth``
+                       and ``cookies`` are part of the cache key with the
+                       URL.
+        :returns: an instance of :class:`CachedResponse`.
+
+        :raises requests.exceptions.RequestException: if the download failed.
+        :raises CacheError: if the cache cannot be read or locked.
+        """
+        path = self._path(_request_key(url, kwargs))
+
+        # Fast path, no locking: files are replaced atomically
+        metadata = self._read_metadata(path)
+        if self._is_fresh(metadata):
+            logger.debug("Cache hit for %s (age %ds).", url,
+                         time.time() - metadata['fetched'])
+            return self._response(url, path, metadata, True, parser)
+
+        with _FileLock(path + '.lock', self.lock_timeout):
+            # Another process may have fetched it while we were waiting
+            metadata = self._read_metadata(path)
+            if self._is_fresh(metadata):
+                logger.debug("Cache filled by a concurrent check for %s.",
+                             url)
+                return self._response(url, path, metadata, True, parser)
+
+            metadata, from_cache = self._fetch(url, path, metadata, **kwargs)
+            return self._response(url, path, metadata, from_cache, parser)
+
+    def lock(self, url):
+        """
+        Return a context manager that holds the exclusive lock on ``url``.
+
+        Use it with :meth:`lookup`, :meth:`store` and :meth:`touch` to cache
+        documents that are not fetched over HTTP::
+
+         with cache.lock(url):
+             cached = cache.lookup(url)
+             if cached is None or cached.validators != validators:
+                 cached = cache.store(url, download(), validators)
+        """
+        return _FileLock(self._path(url) + '.lock', self.lock_timeout)
+
+    def lookup(self, url, fresh=False, parser=None):
+        """
+        Return the cached response for ``url`` without any download.
+
+        :param fresh: only return the response if it is younger than the TTL.
+        :type fresh: bool
+        :param parser: see :meth:`get`.
+        :returns: an instance of :class:`CachedResponse` or ``None``.
+        """
+        path = self._path(url)
+        metadata = self._read_metadata(path)
+        if metadata is None or (fresh and not self._is_fresh(metadata)):
+            return None
+        try:
+            return self._response(url, path, metadata, True, parser)
+        except CacheError:
+            return None
+
+    def store(self, url, content, validators=None, encoding=None,
+              parser=None):
+        """
+        Store ``content`` as the new version of ``url``.
+
+        :param content: the raw document.
+        :type content: str
+        :param validators: opaque, picklable values identifying this version
+                           of the content, see :meth:`lookup`.
+        :param encoding: the character set of the content, if known.
+        :param parser: see :meth:`get`.
+        :returns: an instance of :class:`CachedResponse`.
+        """
+        path = self._path(url)
+        metadata = self._store(url, path, content, {
+            'encoding': encoding,
+            'validators': validators,
+        })
+        return self._response(url, path, metadata, False, parser)
+
+    def touch(self, url):
+        """Mark the cached content of ``url`` as validated right now."""
+        path = self._path(url)
+        metadata = self._read_metadata(path)
+        if metadata is not None:
+            metadata['fetched'] = time.time()
+            _atomic_write(path + '.meta', pickle.dumps(
+                metadata, pickle.HIGHEST_PROTOCOL))
+
+    def invalidate(self, url):
+        """Remove all cached data about ``url``."""
+        path = self._path(url)
+        for filename in glob.glob(path + '.*'):
+            if filename.endswith('.lock'):
+                continue
+            _remove(filename)
+
+    # Internals
+    def _path(self, url):
+        """Return the base path of cache files for ``url``."""
+        return os.path.join(self.directory, hashlib.sha1(url).hexdigest())
+
+    def _is_fresh(self, metadata):
+        return metadata is not None \
+            and self.ttl > 0 \
+            and 0 <= time.time() - metadata['fetched'] < self.ttl
+
+    def _read_metadata(self, path):
+        try:
+            with open(path + '.meta', 'rb') as meta:
+                return pickle.load(meta)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _fetch(self, url, path, metadata, **kwargs):
+        """Download or revalidate ``url``. Return ``(metadata, from_cache)``."""
+        headers = dict(kwargs.pop('headers', None) or {})
+        if metadata is not None and os.path.isfile(path + '.body'):
+            validators = metadata.get('headers', {})
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last-modified'):
+                headers['If-Modified-Since'] = validators['last-modified']
+
+        logger.debug("Fetching %s (conditional headers: %s)...", url,
+                     headers)
+        response = self.session.get(url, headers=headers, **kwargs)
+        if response.status_code == requests.codes.not_modified \
+           and metadata is not None:
+            logger.debug("Not modified, keeping cached content.")
+            metadata['fetched'] = time.time()
+            _atomic_write(path + '.meta', pickle.dumps(
+                metadata, pickle.HIGHEST_PROTOCOL))
+            return metadata, True
+        response.raise_for_status()
+
+        metadata = self._store(url, path, response.content, {
+            'encoding': response.encoding,
+            'headers': dict((k.lower(), v)
+                            for k, v in response.headers.items()),
+        })
+
+        return metadata, False
+
+    def _store(self, url, path, content, metadata):
+        """Write a new version of the content and its metadata."""
+        metadata.update(url=url, fetched=time.time())
+
+        # Content changed, parsed trees are outdated
+        for filename in glob.glob(path + '.*.tree'):
+            _remove(filename)
+        _atomic_write(path + '.body', content)
+        _atomic_write(path + '.meta', pickle.dumps(metadata,
+                                                   pickle.HIGHEST_PROTOCOL))
+
+        return metadata
+
+    def _response(self, url, path, metadata, from_cache, parser):
+        try:
+            with open(path + '.body', 'rb') as body:
+                content = body.read()
+        except IOError as e:
+            raise CacheError("Unable to read cached content of {0} in "
+                             "{1}: {2}".format(url, path, e))
+
+        parsed = None
+        if parser is not None:
+            parsed = self._parsed(path, content, parser)
+
+        return CachedResponse(url, content, metadata, from_cache, parsed)
+
+    def _parsed(self, path, content, parser):
+        """Return the parsed form of the content, from disk if available."""
+        # The tree of this parser for this version of the content only
+        tree_file = '{0}.{1}.{2}.tree'.format(
+            path, _parser_id(parser), hashlib.sha1(content).hexdigest())
+        try:
+            with open(tree_file, 'rb') as tree:
+                logger.debug("Loading parsed tree from %s.", tree_file)
+                return pickle.loads(zlib.decompress(tree.read()))
+        except (IOError, EOFError, zlib.error, pickle.UnpicklingError):
+            pass
+
+        parsed = parser(content)
+        try:
+            _atomic_write(tree_file, zlib.compress(
+                pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)))
+        except (CacheError, pickle.PicklingError, TypeError) as e:
+            logger.debug("Cannot store parsed tree in %s: %s", tree_file, e)
+        return parsed
+
+
+def _request_key(url, kwargs):
+    """
+    Return the cache key of a GET of ``url``: the URL, and the arguments
+    that change the response if any.
+    """
+    arguments = []
+    for name in KEY_ARGUMENTS:
+        value = kwargs.get(name)
+        if value:
+            arguments.append((name, _key_value(value)))
+    if not arguments:
+        return url
+    return '{0} {1!r}'.format(url, arguments)
+
+
+def _key_value(value):
+    """Return a request argument in a stable form."""
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    if hasattr(value, 'username') and hasattr(value, 'password'):
+        # requests.auth.HTTPBasicAuth, HTTPDigestAuth...
+        return value.__class__.__name__, value.username, value.password
+    return repr(value)
+
+
+def _parser_id(parser):
+    """
+    Return an identifier of a parser function that is the same in every
+    plugin run, and different for two lambdas.
+    """
+    name = '{0}.{1}'.format(getattr(parser, '__module__', None),
+                            getattr(parser, '__name__',
+                                    parser.__class__.__name__))
+    code = getattr(parser, '__code__', None)
+    if code is not None:
+        name += ':{0}:{1}:{2}'.format(code.co_filename, code.co_firstlineno,
+                                      code.co_code)
+    return hashlib.sha1(name).hexdigest()[:16]
+
+
+class _FileLock(object):
+    """Exclusive lock on a file, waiting at most ``timeout`` seconds."""
+    def __init__(self, filename, timeout, interval=0.05):
+        self.filename = filename
+        self.timeout = timeout
+        self.interval = interval
+        self._fd = None
+
+    def __enter__(self):
+        try:
+            self._fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            raise CacheError("Unable to open cache lock {0}: {1}".format(
+                self.filename, e))
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+            if time.time() >= deadline:
+                os.close(self._fd)
+                raise CacheError("Timeout waiting for cache lock "
+                                 "{0} !".format(self.filename))
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        return False
+
+
+def _atomic_write(filename, data):
+    """
+    Write ``data`` to a temporary file then rename it to ``filename``.
+
+    :raises CacheError: if the file cannot be written.
+    """
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                   prefix='.tmp')
+    except (IOError, OSError) as e:
+        raise CacheError("Unable to write {0}: {1}".format(filename, e))
+    try:
+        with os.fdopen(fd, 'wb') as tmpfile:
+            tmpfile.write(data)
+        os.rename(tmp, filename)
+    except (IOError, OSError) as e:
+        _remove(tmp)
+        raise CacheError("Unable to write {0}: {1}".format(filename, e))
+    except:
+        _remove(tmp)
+        raise
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
@@ -23,6 +23,7 @@ import logging
 
 from monitoring.nagios.plugin import NagiosPlugin
 from monitoring.nagios.probes import ProbeHTTP
+from monitoring.nagios.cache import ResponseCache
 from monitoring.nagios.plugin import argument
 
 logger = logging.getLogger("monitoring.nagios.plugin.http")
@@ -48,14 +49,20 @@ class NagiosPluginHTTP(NagiosPlugin):
     - ``-p, --port``: :attr:`options.port`
     - ``-S, --ssl``: :attr:`options.ssl`
     - ``-a, --auth``: :attr:`options.auth`
+    - ``--cache-ttl``: :attr:`options.cache_ttl`
     """
     def __init__(self, *args, **kwargs):
         super(NagiosPluginHTTP, self).__init__(*args, **kwargs)
 
+        cache = None
+        if self.options.cache_ttl:
+            cache = ResponseCache(ttl=self.options.cache_ttl)
+
         self.http = ProbeHTTP(hostaddress=self.options.hostname,
                               port=self.options.port,
                               ssl=self.options.ssl,
-                              auth=self.options.auth)
+                              auth=self.options.auth,
+                              cache=cache)
 
         if 'NagiosPluginHTTP' == self.__class__.__name__:
             logger.debug('=== END PLUGIN INIT ===')
@@ -87,3 +94,11 @@ class NagiosPluginHTTP(NagiosPlugin):
                                         help='Login and password for Basic'
                                              'Authentication.',
                                         default=None)
+
+        self.parser.add_argument('--cache-ttl',
+                                 dest='cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help='Share GET responses between checks '
+                                      'for this number of seconds (default '
+                                      'to 0, no cache).')
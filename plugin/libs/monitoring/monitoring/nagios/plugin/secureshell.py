@@ -30,22 +30,33 @@ logger = log.getLogger('monitoring.nagios.plugin.ssh')
 
 
 class NagiosPluginSSH(NagiosPlugin):
-    """Base for a standard SSH Nagios plugin"""
+    """
+    Base for a standard SSH Nagios plugin.
+
+    The SSH connection is established the first time :attr:`ssh` is used, so
+    plugins that can answer from retention data do not connect at all.
+    """
     def __init__(self, *args, **kwargs):
+        self._ssh = None
         super(NagiosPluginSSH, self).__init__(*args, **kwargs)
 
-        # Init a new probe of type SSH
-        self.ssh = ProbeSSH(
-            hostaddress=self.options.hostname,
-            port=self.options.port,
-            username=self.options.username,
-            password=self.options.password,
-            timeout=self.options.timeout
-        )
-
         if 'NagiosPluginSSH' == self.__class__.__name__:
             logger.debug('=== END PLUGIN INIT ===')
 
+    @property
+    def ssh(self):
+        """The :class:`ProbeSSH` instance, connected on first access."""
+        if self._ssh is None:
+            # Init a new probe of type SSH
+            self._ssh = ProbeSSH(
+                hostaddress=self.options.hostname,
+                port=self.options.port,
+                username=self.options.username,
+                password=self.options.password,
+                timeout=self.options.timeout
+            )
+        return self._ssh
+
     def define_plugin_arguments(self):
         """Define arguments for the plugin"""
         super(NagiosPluginSSH, self).define_plugin_arguments()
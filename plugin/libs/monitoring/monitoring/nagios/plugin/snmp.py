@@ -23,15 +23,26 @@
 
 import logging as log
 
+from monitoring.nagios.cache import ResponseCache, CacheError
 from monitoring.nagios.plugin import argument
 from monitoring.nagios.probes import ProbeSNMP
+from monitoring.nagios.probes.snmpusm import UsmCache
 from monitoring.nagios.plugin import NagiosPlugin
 
 logger = log.getLogger('monitoring.nagios.plugin.snmp')
 
 
 class NagiosPluginSNMP(NagiosPlugin):
-    """A standard SNMP Nagios plugin."""
+    """
+    A standard SNMP Nagios plugin.
+
+    With ``--snmp-cache-ttl``, the checks of a device share a snapshot of their
+    OIDs, polled once per TTL, see :class:`ProbeSNMP`.
+
+    With SNMPv3, the engine ID of the agent and the keys of the user are kept
+    in a :class:`monitoring.nagios.probes.snmpusm.UsmCache` for the next
+    checks.
+    """
     def __init__(self, *args, **kwargs):
         super(NagiosPluginSNMP, self).__init__(*args, **kwargs)
 
@@ -42,6 +53,17 @@ class NagiosPluginSNMP(NagiosPlugin):
         elif self.options.snmpv3:
             self.snmp_version = 2
 
+        cache = None
+        if self.options.snmp_cache_ttl:
+            cache = ResponseCache(ttl=self.options.snmp_cache_ttl)
+
+        usm_cache = None
+        if self.snmp_version == 2:
+            try:
+                usm_cache = UsmCache()
+            except CacheError as e:
+                logger.debug('No SNMPv3 USM cache: %s', e)
+
         # Init a new probe of type SNMP
         self.snmp = ProbeSNMP(
             hostaddress=self.options.hostname,
@@ -51,6 +73,8 @@ class NagiosPluginSNMP(NagiosPlugin):
             password=self.options.snmpv3_password,
             auth_protocol=self.options.auth_protocol,
             priv_protocol=self.options.priv_protocol,
+            cache=cache,
+            usm_cache=usm_cache,
         )
 
         if 'NagiosPluginSNMP' == self.__class__.__name__:
@@ -99,6 +123,15 @@ class NagiosPluginSNMP(NagiosPlugin):
                                  type=argument.snmpv3_priv_protocol,
                                  help='SNMPv3 priv protocol (encryption)')
 
+        self.parser.add_argument('--snmp-cache-ttl',
+                                 dest='snmp_cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help='Poll the OIDs of all the checks of the '
+                                      'device at once and share them for '
+                                      'this number of seconds (default to 0, '
+                                      'no cache).')
+
     def verify_plugin_arguments(self):
         super(NagiosPluginSNMP, self).verify_plugin_arguments()
 
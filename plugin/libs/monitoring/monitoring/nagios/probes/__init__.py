@@ -1,6 +1,9 @@
 from monitoring.nagios.probes.base import Probe
 from monitoring.nagios.probes.snmp import ProbeSNMP
+from monitoring.nagios.probes.snmpengine import SNMPEngine
 from monitoring.nagios.probes.secureshell import ProbeSSH
 from monitoring.nagios.probes.mssql import ProbeMSSQL
 from monitoring.nagios.probes.wmi import ProbeWMI
 from monitoring.nagios.probes.http import ProbeHTTP
+from monitoring.nagios.probes.oftp import ProbeOFTP
+from monitoring.nagios.probes.haproxy import ProbeHAProxy
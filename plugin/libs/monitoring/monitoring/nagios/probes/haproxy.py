@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+HAProxy statistics probe.
+
+:class:`ProbeHAProxy` reads the statistics of HAProxy in one request: the
+``show info`` and ``show stat`` answers of its stats socket, or the CSV export
+of its HTTP stats page. The socket can be local, on TCP, or on a remote server
+through a :class:`monitoring.nagios.probes.secureshell.ProbeSSH` and
+``socat``.
+
+The result is a :class:`HAProxyStats` snapshot: one :class:`StatRecord` per
+frontend, backend and server, with numbers as integers. Byte and session rates
+are computed against the counters of a previous snapshot, that the plugins
+keep in their retention file.
+
+**Example**::
+
+ probe = ProbeHAProxy(url='http://lb1:7777/', auth=('admin', 'secret'))
+ stats = probe.snapshot()
+ try:
+     rates = stats.rates(plugin.load_data())
+ except IOError:
+     rates = {}
+ plugin.save_data(stats.counters())
+
+ for record in stats.proxy('www'):
+     print record.svname, record.scur, rates.get(record.key)
+"""
+
+import csv
+import time
+import pipes
+import socket
+import logging as log
+
+import requests
+from requests.exceptions import RequestException
+
+from monitoring.nagios.probes import Probe
+from monitoring.nagios.exceptions import NagiosUnknown
+from monitoring.nagios.cache import CacheError
+
+logger = log.getLogger('monitoring.nagios.probes.haproxy')
+
+#: Commands sent to the stats socket, in one connection.
+SOCKET_COMMANDS = 'show info;show stat\n'
+
+#: Columns of ``show stat`` that are always text.
+TEXT_FIELDS = frozenset(['pxname', 'svname', 'status', 'check_status',
+                         'last_chk', 'last_agt', 'agent_status', 'addr',
+                         'cookie', 'mode', 'algo', 'tracked'])
+
+#: Kinds of record, by value of the ``type`` column.
+RECORD_TYPES = {0: 'frontend', 1: 'backend', 2: 'server', 3: 'listener'}
+
+#: Counters used by :meth:`HAProxyStats.rates` by default: sessions, bytes
+#: in and bytes out.
+RATE_COUNTERS = ('stot', 'bin', 'bout')
+
+
+class StatRecord(object):
+    """
+    A line of ``show stat``: a frontend, a backend or a server of a proxy.
+
+    The columns are attributes, ``None`` when HAProxy leaves them empty::
+
+     >>> record.pxname, record.svname, record.scur, record.bin
+     ('www', 'FRONTEND', 12, 1863227)
+
+    .. attribute:: StatRecord.fields
+
+        dict of all the columns.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+
+    @property
+    def key(self):
+        """Tuple (proxy name, service name), unique in a snapshot."""
+        return self.fields['pxname'], self.fields['svname']
+
+    @property
+    def kind(self):
+        """``'frontend'``, ``'backend'``, ``'server'`` or ``'listener'``."""
+        if self.fields.get('type') in RECORD_TYPES:
+            return RECORD_TYPES[self.fields['type']]
+        # Before HAProxy 1.4 there is no type column
+        return {'FRONTEND': 'frontend',
+                'BACKEND': 'backend'}.get(self.fields['svname'], 'server')
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == 'fields':
+            raise AttributeError(name)
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return '<{0} {1}/{2}>'.format(self.__class__.__name__, *self.key)
+
+
+class HAProxyStats(object):
+    """
+    Statistics of HAProxy at a point in time, see :meth:`parse`.
+
+    .. attribute:: HAProxyStats.info
+
+        dict of the ``show info`` values, empty when read from the HTTP
+        stats page.
+
+    .. attribute:: HAProxyStats.records
+
+        list of :class:`StatRecord`, in the order of HAProxy.
+
+    .. attribute:: HAProxyStats.taken
+
+        Unix timestamp of the snapshot.
+    """
+    def __init__(self, info, records, taken=None):
+        self.info = info
+        self.records = records
+        self.taken = time.time() if taken is None else taken
+
+        self._by_key = {}
+        self._by_proxy = {}
+        for record in records:
+            self._by_key[record.key] = record
+            self._by_proxy.setdefault(record.pxname, []).append(record)
+
+    @classmethod
+    def parse(cls, content, taken=None):
+        """
+        Parse the answer of the stats socket or the HTTP CSV export.
+
+        ``show info`` lines are ``Name: value``; the ``show stat`` CSV starts
+        with its ``# pxname,svname,...`` header line.
+
+        :raises ValueError: if there is no statistics in ``content``.
+        """
+        info = {}
+        header = None
+        rows = []
+        for line in content.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('# '):
+                header = line[2:].split(',')
+            elif header is not None:
+                rows.append(line)
+            elif ':' in line:
+                name, value = line.split(':', 1)
+                info[name.strip()] = _value(value.strip())
+
+        if header is None:
+            raise ValueError('No statistics found in the answer of HAProxy: '
+                             '{0}'.format(content.strip()[:200]))
+
+        records = []
+        for row in csv.reader(rows):
+            fields = {}
+            for name, value in zip(header, row):
+                if not name:
+                    continue
+                fields[name] = value if name in TEXT_FIELDS \
+                    else _value(value)
+            records.append(StatRecord(fields))
+        return cls(info, records, taken)
+
+    def get(self, pxname, svname):
+        """Return the :class:`StatRecord` of a service, or ``None``."""
+        return self._by_key.get((pxname, svname))
+
+    def proxy(self, pxname):
+        """Return the records of a proxy: frontend, servers and backend."""
+        return list(self._by_proxy.get(pxname, []))
+
+    def select(self, proxies=None, kinds=None, exclude=('stats',)):
+        """
+        Return the records of some proxies and kinds.
+
+        :param proxies: names of the proxies, all of them if ``None``.
+        :param kinds: kinds of record, see :attr:`StatRecord.kind`.
+        :param exclude: names of the proxies to skip, the stats page by
+                        default.
+        :return: list of :class:`StatRecord`.
+        """
+        return [record for record in self.records
+                if (proxies is None or record.pxname in proxies)
+                and (kinds is None or record.kind in kinds)
+                and record.pxname not in exclude]
+
+    def counters(self, names=RATE_COUNTERS):
+        """
+        Return the counters to keep for the next :meth:`rates`, a picklable
+        dict.
+        """
+        return {
+            'taken': self.taken,
+            'uptime': self.info.get('Uptime_sec'),
+            'values': dict((record.key,
+                            dict((name, record.fields.get(name))
+                                 for name in names))
+                           for record in self.records),
+        }
+
+    def rates(self, previous, names=RATE_COUNTERS):
+        """
+        Compute the rate per second of counters since a previous snapshot.
+
+        The services that are new, and the counters that went backwards
+        (reload of HAProxy, ``clear counters``) have no rate. Nothing is
+        computed if HAProxy restarted in between.
+
+        :param previous: the :meth:`counters` of the previous snapshot.
+        :return: dict of the rates of each record key, like
+                 ``{('www', 'FRONTEND'): {'stot': 2.5, 'bin': 1024.0, ...}}``.
+        """
+        if not previous:
+            return {}
+        elapsed = self.taken - previous['taken']
+        if elapsed <= 0:
+            return {}
+        uptime = self.info.get('Uptime_sec')
+        if uptime is not None and previous.get('uptime') is not None \
+                and uptime < previous['uptime']:
+            logger.debug('HAProxy restarted, no rate computed.')
+            return {}
+
+        rates = {}
+        for record in self.records:
+            before = previous['values'].get(record.key)
+            if before is None:
+                continue
+            values = {}
+            for name in names:
+                now, then = record.fields.get(name), before.get(name)
+                if now is None or then is None or now < then:
+                    continue
+                values[name] = (now - then) / float(elapsed)
+            rates[record.key] = values
+        return rates
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+class ProbeHAProxy(Probe):
+    """
+    Read the statistics of HAProxy.
+
+    Give either ``url`` or ``socket``.
+
+    :param url: URL of the HTTP stats page, like ``http://lb1:7777/``. Its
+                CSV export ``;csv`` is read.
+    :type url: str
+    :param auth: tuple (login, password) of the stats page.
+    :type auth: tuple
+    :param socket: path of the stats socket, or tuple (host, port) of a TCP
+                   stats socket.
+    :type socket: str, tuple
+    :param ssh: read the stats socket on this server with ``socat``.
+    :type ssh: :class:`monitoring.nagios.probes.secureshell.ProbeSSH`
+    :param timeout: connection and read timeout in seconds.
+    :type timeout: float
+    :param cache: if an instance of
+                  :class:`monitoring.nagios.cache.ResponseCache`, the
+                  snapshot is shared by the checks of the same HAProxy until
+                  the TTL of the cache is over.
+    :param raise_errors: raise :exc:`ProbeHAProxy.HAProxyError` instead of
+                         stopping the plugin with an UNKNOWN status.
+    :type raise_errors: bool
+    """
+    class HAProxyError(Exception):
+        """Raised when the statistics cannot be read."""
+        def __init__(self, message):
+            self.message = message
+
+        def __str__(self):
+            return self.message
+
+    def __init__(self, url=None, auth=None, socket=None, ssh=None,
+                 timeout=10.0, cache=None, raise_errors=False):
+        super(ProbeHAProxy, self).__init__()
+
+        if (url is None) == (socket is None):
+            raise ValueError('Give either the URL or the socket of the '
+                             'statistics.')
+        self.url = url
+        self.auth = auth
+        self.socket = socket
+        self.ssh = ssh
+        self.timeout = timeout
+        self.cache = cache
+        self.raise_errors = raise_errors
+
+        logger.debug('Initialized a new HAProxy probe on %s.', self.source)
+
+    @property
+    def source(self):
+        """Where the statistics are read, also their key in the cache."""
+        if self.url is not None:
+            path = self.url.split(';')[0]
+            return path + ('' if path.endswith('/') else '/') + ';csv'
+        if isinstance(self.socket, tuple):
+            return 'haproxy://{0}:{1}'.format(*self.socket)
+        if self.ssh is not None:
+            return 'haproxy+ssh://{0}{1}'.format(self.ssh.hostaddress,
+                                                self.socket)
+        return 'haproxy://{0}'.format(self.socket)
+
+    def error(self, message):
+        """
+        Handle an error: raise :exc:`ProbeHAProxy.HAProxyError` if
+        ``raise_errors`` is set, exit with an UNKNOWN status otherwise.
+        """
+        if self.raise_errors:
+            raise self.HAProxyError(message)
+        raise NagiosUnknown(message)
+
+    def snapshot(self):
+        """
+        Read the statistics, or take them from the cache.
+
+        :return: a :class:`HAProxyStats`.
+        """
+        source = self.source
+        try:
+            if self.cache is None:
+                return HAProxyStats.parse(self.fetch())
+
+            cached = self.cache.lookup(source, fresh=True)
+            if cached is None:
+                with self.cache.lock(source):
+                    # Another check may have read them while we were waiting
+                    cached = self.cache.lookup(source, fresh=True)
+                    if cached is None:
+                        cached = self.cache.store(source, self.fetch())
+            else:
+                logger.debug('HAProxy statistics from the cache (age %ds).',
+                             cached.age)
+            return HAProxyStats.parse(cached.content, cached.fetched)
+        except CacheError as e:
+            self.error('HAProxy statistics cache error: {0}'.format(e))
+        except ValueError as e:
+            self.error('Unexpected HAProxy statistics from {0}\n'
+                       '{1}'.format(source, e))
+
+    def fetch(self):
+        """Return the raw statistics, see :meth:`HAProxyStats.parse`."""
+        if self.url is not None:
+            return self._fetch_http()
+        if self.ssh is not None:
+            return self._fetch_ssh()
+        return self._fetch_socket()
+
+    # Internals
+    def _fetch_http(self):
+        try:
+            response = requests.get(self.source, auth=self.auth,
+                                    timeout=self.timeout)
+            response.raise_for_status()
+        except RequestException as e:
+            self.error('HTTP GET error on URL: {0}\n{1}'.format(self.source,
+                                                                 e))
+        return response.content
+
+    def _fetch_socket(self):
+        try:
+            if isinstance(self.socket, tuple):
+                sock = socket.create_connection(self.socket, self.timeout)
+            else:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket)
+            try:
+                sock.sendall(SOCKET_COMMANDS)
+                chunks = []
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            finally:
+                sock.close()
+        except socket.error as e:
+            self.error('Cannot read the HAProxy stats socket {0}\n'
+                       '{1}'.format(self.source, e))
+        return ''.join(chunks)
+
+    def _fetch_ssh(self):
+        command = 'echo {0} | socat stdio UNIX-CONNECT:{1}'.format(
+            pipes.quote(SOCKET_COMMANDS.strip()), pipes.quote(self.socket))
+        try:
+            result = self.ssh.execute(command, timeout=self.timeout)
+        except self.ssh.SSHError as e:
+            self.error(str(e))
+        if result.status == 127:
+            self.error('Unable to find socat on {0} !'.format(
+                self.ssh.hostaddress))
+        elif result.status != 0:
+            self.error('Cannot read the HAProxy stats socket {0}\n'
+                       'Errors: {1}'.format(self.source,
+                                            '\n'.join(result.errors)))
+        return '\n'.join(result.output)
+
+
+def _value(value):
+    """Return a statistic as an integer, ``None`` if empty."""
+    if value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
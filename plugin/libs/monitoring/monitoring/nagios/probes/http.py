@@ -29,6 +29,7 @@ from bs4 import BeautifulSoup
 
 from monitoring.nagios.probes import Probe
 from monitoring.nagios.exceptions import NagiosUnknown
+from monitoring.nagios.cache import CacheError
 
 logger = logging.getLogger('monitoring.nagios.probes.http')
 
@@ -84,12 +85,18 @@ class ProbeHTTP(Probe):
 
     This is basically just a wrapper arround `requests
     <http://www.python-requests.org/en/latest/>`_ library.
+
+    If ``cache`` is an instance of
+    :class:`monitoring.nagios.cache.ResponseCache`, GET requests are served
+    from this cache.
     """
     status_codes = requests.codes
 
-    def __init__(self, hostaddress, port=80, ssl=False, auth=None):
+    def __init__(self, hostaddress, port=80, ssl=False, auth=None,
+                 cache=None):
         super(ProbeHTTP, self).__init__()
 
+        self.cache = cache
         self.hostaddress = hostaddress
         self.port = 80 if not port else port
         self.auth = () if not auth else auth
@@ -112,8 +119,14 @@ class ProbeHTTP(Probe):
         url = "{0}/{1}".format(self.baseurl, path)
 
         try:
-            response = requests.get(url, auth=self.auth, **kwargs)
-            response.raise_for_status()
+            if self.cache is not None:
+                response = self.cache.get(url, auth=self.auth, **kwargs)
+            else:
+                response = requests.get(url, auth=self.auth, **kwargs)
+                response.raise_for_status()
+        except CacheError as e:
+            raise NagiosUnknown("HTTP cache error on URL: {}\n"
+                                "{}".format(url, e))
         except RequestException as e:
             raise NagiosUnknown("HTTP GET error on URL: {}\n"
                                 "{}".format(url, e))
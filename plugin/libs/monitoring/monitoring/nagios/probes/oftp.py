@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+OFTP probe module.
+
+Check that ODETTE FTP servers (RFC 5024) are ready to accept sessions. The
+probe connects, waits for the Start Session Ready Message (SSRM) and, if a
+code is given, sends a Start Session (SSID) command to validate it. Several
+servers are probed at once from a single ``select`` loop.
+"""
+
+import errno
+import logging
+import select
+import socket
+import struct
+import time
+from collections import namedtuple
+
+from monitoring.nagios.probes import Probe
+
+logger = logging.getLogger('monitoring.nagios.probes.oftp')
+
+#: Names of the OFTP commands, by command code.
+COMMANDS = {
+    'I': 'SSRM', 'X': 'SSID', 'F': 'ESID', 'H': 'SFID', '2': 'SFPA',
+    '3': 'SFNA', 'D': 'DATA', 'C': 'CDT', 'T': 'EFID', '4': 'EFPA',
+    '5': 'EFNA', 'R': 'CD', 'P': 'RTR', 'E': 'EERP', 'N': 'NERP',
+    'J': 'SECD', 'A': 'AUCH', 'S': 'AURP',
+}
+
+#: Reasons of an End Session (ESID) command.
+ESID_REASONS = {
+    '00': 'Normal session termination',
+    '01': 'Command not recognised',
+    '02': 'Protocol violation',
+    '03': 'User code not known',
+    '04': 'Invalid password',
+    '05': 'Local site emergency close down',
+    '06': 'Command contained invalid data',
+    '07': 'Exchange Buffer size error',
+    '08': 'Resources not available',
+    '09': 'Time out',
+    '10': 'Mode or capabilities incompatible',
+    '11': 'Invalid challenge response',
+    '12': 'Secure authentication requirements incompatible',
+    '99': 'Unspecified abort code',
+}
+
+SSRM_READY = 'ODETTE FTP READY'
+
+# Stream Transmission Header: version 1, no flags, 3 bytes length
+STH_VERSION = '\x10'
+STH_LENGTH = 4
+
+
+class OFTPError(Exception):
+    """Raised on OFTP protocol errors."""
+    pass
+
+
+class OFTPResult(namedtuple('OFTPResult', 'host port available message '
+                                          'connect_time ready_time '
+                                          'session_time')):
+    """
+    Result of a :class:`ProbeOFTP`.
+
+    The times are in seconds from the start of the probe, ``None`` if the
+    step was not reached. ``session_time`` is only set when a start session
+    command was sent.
+    """
+    __slots__ = ()
+
+
+class OFTPStreamParser(object):
+    """
+    Split the bytes received from an OFTP server into exchange buffers.
+
+    Over TCP, each exchange buffer is framed by a Stream Transmission Header
+    (STH). Some old servers send bare commands ended by a carriage return,
+    they are detected by the first byte received. Data can be fed in chunks
+    of any size.
+
+    >>> parser = OFTPStreamParser()
+    >>> parser.feed('\\x10\\x00\\x00\\x17IODETTE ')
+    []
+    >>> parser.feed('FTP READY \\r')
+    ['IODETTE FTP READY \\r']
+    """
+    def __init__(self):
+        self.buffer = ''
+        self.framed = None
+
+    def feed(self, data):
+        """Add ``data`` and return the list of complete exchange buffers."""
+        self.buffer += data
+        if self.framed is None and self.buffer:
+            self.framed = self.buffer[0] == STH_VERSION
+
+        buffers = []
+        while True:
+            if self.framed:
+                if len(self.buffer) < STH_LENGTH:
+                    break
+                if self.buffer[0] != STH_VERSION:
+                    raise OFTPError('Invalid stream transmission header !')
+                length = struct.unpack('>I', '\x00' + self.buffer[1:4])[0]
+                if length <= STH_LENGTH:
+                    raise OFTPError('Invalid stream transmission length !')
+                if len(self.buffer) < length:
+                    break
+                buffers.append(self.buffer[STH_LENGTH:length])
+                self.buffer = self.buffer[length:]
+            else:
+                end = self.buffer.find('\r')
+                if end < 0:
+                    break
+                buffers.append(self.buffer[:end + 1])
+                self.buffer = self.buffer[end + 1:]
+        return buffers
+
+    def frame(self, command):
+        """Return ``command`` framed like the server commands."""
+        if self.framed:
+            return STH_VERSION + struct.pack('>I', len(command) +
+                                             STH_LENGTH)[1:] + command
+        return command
+
+
+def ssid_command(code, password, level=5, buffer_size=99999):
+    """
+    Build a Start Session (SSID) command for the sender only mode, so that
+    the server never starts to send files.
+
+    :param level: protocol level, 5 for OFTP 2.0 and 4 for OFTP 1.4.
+    """
+    return ''.join([
+        'X',
+        str(level),
+        code.upper().ljust(25)[:25],
+        password.upper().ljust(8)[:8],
+        '{0:05d}'.format(buffer_size),
+        'S',    # Sender only
+        'N',    # No compression
+        'N',    # No restart
+        'N',    # No special logic
+        '999',  # Credit
+        'N' if level >= 5 else ' ',  # No secure authentication
+        ' ' * 4,
+        ' ' * 8,  # User data
+        '\r',
+    ])
+
+
+def esid_command(level=5):
+    """Build a normal End Session (ESID) command."""
+    if level >= 5:
+        return 'F00000\r'
+    return 'F00\r'
+
+
+class ProbeOFTP(Probe):
+    """
+    Class ProbeOFTP.
+
+    :param hostaddress: the OFTP server address.
+    :param port: the OFTP server port.
+    :param timeout: seconds to wait for the server to be ready.
+    :param code: the identification code, to also check a start session.
+    :param password: the password of the identification code.
+    :param level: the OFTP protocol level of the start session.
+
+    **Example**::
+
+     probes = [ProbeOFTP(host, 3305) for host in hosts]
+     for result in probe_all(probes):
+         print result.host, result.available, result.message
+    """
+    def __init__(self, hostaddress='', port=3305, timeout=30, code=None,
+                 password='', level=5):
+        super(ProbeOFTP, self).__init__()
+
+        self.hostaddress = hostaddress
+        self.port = port
+        self.timeout = timeout
+        self.code = code
+        self.password = password
+        self.level = level
+
+        if 'ProbeOFTP' == self.__class__.__name__:
+            logger.debug('=== END PROBE INIT ===')
+
+    def probe(self):
+        """Probe the server and return a :class:`OFTPResult`."""
+        return probe_all([self])[0]
+
+
+class _OFTPSession(object):
+    """State of a :class:`ProbeOFTP` during :func:`probe_all`."""
+    def __init__(self, probe):
+        self.probe = probe
+        self.parser = OFTPStreamParser()
+        self.output = ''
+        self.state = 'connect'
+        self.result = None
+        self.times = {}
+        self.start = time.time()
+        self.deadline = self.start + probe.timeout
+
+        self.sock = None
+        try:
+            family, socktype, proto, _, address = socket.getaddrinfo(
+                probe.hostaddress, probe.port, 0, socket.SOCK_STREAM)[0]
+            self.sock = socket.socket(family, socktype, proto)
+            self.sock.setblocking(0)
+            error = self.sock.connect_ex(address)
+            if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                raise socket.error(error, errno.errorcode.get(error, error))
+        except socket.error as e:
+            logger.debug('%s:%s: %s', probe.hostaddress, probe.port, e)
+            self.finish(False, 'Cannot establish a connection to OFTP '
+                               'server !')
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def wants_write(self):
+        return self.state == 'connect' or bool(self.output)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def on_writable(self):
+        if self.state == 'connect':
+            error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error:
+                logger.debug('%s:%s: %s', self.probe.hostaddress,
+                             self.probe.port, errno.errorcode.get(error))
+                self.finish(False, 'Cannot establish a connection to OFTP '
+                                   'server !')
+                return
+            self.times['connect'] = time.time() - self.start
+            self.state = 'ready'
+            logger.debug('%s:%s: connected in %.3fs.', self.probe.hostaddress,
+                         self.probe.port, self.times['connect'])
+
+        if self.output:
+            sent = self.sock.send(self.output)
+            self.output = self.output[sent:]
+
+    def on_readable(self):
+        data = self.sock.recv(4096)
+        if not data:
+            self.finish(False, self.timeout_message() if self.state == 'ready'
+                        else 'Connection closed by the OFTP server !')
+            return
+
+        for command in self.parser.feed(data):
+            logger.debug('%s:%s: received %s %r', self.probe.hostaddress,
+                         self.probe.port, COMMANDS.get(command[:1], '?'),
+                         command)
+            self.handle(command)
+            if self.done:
+                break
+
+    def handle(self, command):
+        code = command[:1]
+        if code == 'F':
+            reason = command[1:3]
+            self.finish(False, 'OFTP session refused: {0} !'.format(
+                ESID_REASONS.get(reason, reason)))
+
+        elif self.state == 'ready':
+            if code != 'I' or SSRM_READY not in command:
+                raise OFTPError('Unexpected {0} command instead of the ready '
+                                'message !'.format(COMMANDS.get(code, code)))
+            self.times['ready'] = time.time() - self.start
+            if self.probe.code:
+                self.state = 'session'
+                self.output = self.parser.frame(ssid_command(
+                    self.probe.code, self.probe.password, self.probe.level))
+            else:
+                self.finish(True, 'OFTP server is available.')
+
+        elif self.state == 'session':
+            if code != 'X':
+                raise OFTPError('Unexpected {0} command instead of the start '
+                                'session !'.format(COMMANDS.get(code, code)))
+            self.times['session'] = time.time() - self.start
+            # Best effort, the session is closed anyway
+            try:
+                self.sock.send(self.parser.frame(
+                    esid_command(self.probe.level)))
+            except socket.error:
+                pass
+            self.finish(True, 'OFTP server is available and accepts the '
+                              'session.')
+
+    def timeout_message(self):
+        if self.state == 'connect':
+            return 'Unable to connect to OFTP server within {0:g} ' \
+                   'seconds !'.format(self.probe.timeout)
+        elif self.state == 'ready':
+            return 'OFTP server is reachable but no data was received !'
+        return 'OFTP server did not answer the start session !'
+
+    def finish(self, available, message):
+        self.result = OFTPResult(self.probe.hostaddress,
+                                 self.probe.port,
+                                 available,
+                                 message,
+                                 self.times.get('connect'),
+                                 self.times.get('ready'),
+                                 self.times.get('session'))
+        if self.sock is not None:
+            self.sock.close()
+
+
+def probe_all(probes):
+    """
+    Probe all the OFTP servers concurrently.
+
+    :param probes: list of :class:`ProbeOFTP`.
+    :returns: the list of :class:`OFTPResult`, in the order of ``probes``.
+    """
+    sessions = [_OFTPSession(probe) for probe in probes]
+
+    while True:
+        pending = [session for session in sessions if not session.done]
+        if not pending:
+            break
+
+        now = time.time()
+        for session in pending:
+            if session.deadline <= now:
+                session.finish(False, session.timeout_message())
+        pending = [session for session in pending if not session.done]
+        if not pending:
+            break
+
+        readers = [session for session in pending
+                   if session.state != 'connect']
+        writers = [session for session in pending if session.wants_write()]
+        timeout = max(0, min(session.deadline for session in pending) - now)
+        try:
+            readable, writable, _ = select.select(readers, writers, [],
+                                                  timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+
+        for session in writable:
+            try:
+                session.on_writable()
+            except socket.error as e:
+                logger.debug('%s: %s', session.probe.hostaddress, e)
+                session.finish(False, 'Cannot establish a connection to OFTP '
+                                      'server !')
+        for session in readable:
+            if session.done:
+                continue
+            try:
+                session.on_readable()
+            except (socket.error, OFTPError) as e:
+                session.finish(False, str(e) if isinstance(e, OFTPError)
+                               else 'Connection error with the OFTP '
+                                    'server: {0} !'.format(e))
+
+    return [session.result for session in sessions]
@@ -24,6 +24,8 @@
 import logging as log
 import string
 import socket
+import pipes
+from collections import namedtuple
 from datetime import datetime
 
 import paramiko
@@ -34,6 +36,32 @@ from monitoring.nagios.exceptions import NagiosUnknown
 
 logger = log.getLogger('monitoring.nagios.probes')
 
+# awk program of :meth:`ProbeSSH.aggregate`: the selected lines are grouped by
+# the key expression, and "<count> <sum> <min> <max> <key>" of the value
+# expression is printed for each group.
+AGGREGATE_AWK = """BEGIN {{ OFMT = CONVFMT = "%.15g" }}
+{selection} {{
+    k = {key}; v = {value}
+    if (!(k in n)) {{ lo[k] = v; hi[k] = v }}
+    n[k]++; s[k] += v
+    if (v < lo[k]) lo[k] = v
+    if (v > hi[k]) hi[k] = v
+}}
+END {{ for (k in n) print n[k], s[k], lo[k], hi[k], k }}"""
+
+# awk program of :meth:`ProbeSSH.matching_lines`: the first selected lines,
+# then the number of selected lines.
+MATCHING_AWK = """{selection} {{ n++; if ({limit} < 0 || n <= {limit}) print }}
+END {{ print n + 0 }}"""
+
+
+class Aggregate(namedtuple('Aggregate', 'count sum min max')):
+    """
+    Values of a group of lines, see :meth:`ProbeSSH.aggregate`: number of
+    lines, sum, minimum and maximum of the value.
+    """
+    __slots__ = ()
+
 
 class CommandResult(object):
     """
@@ -81,6 +109,11 @@ class ProbeSSH(Probe):
     :type password: str
     :param timeout: Connection timeout in seconds (default to 10 secs).
     :type timeout: float
+    :param raise_errors: raise :exc:`ProbeSSH.SSHError` if the connection
+                         fails, instead of stopping the plugin with an
+                         UNKNOWN status. For example to connect to several
+                         hosts and report the ones that do not answer.
+    :type raise_errors: bool
     """
     class SSHError(Exception):
         """Base class for all SSH related errors."""
@@ -103,7 +136,7 @@ class ProbeSSH(Probe):
         pass
 
     def __init__(self, hostaddress='', port=22, username=None, password=None,
-                 timeout=10.0):
+                 timeout=10.0, raise_errors=False):
         super(ProbeSSH, self).__init__()
 
         self.hostaddress = hostaddress
@@ -111,6 +144,7 @@ class ProbeSSH(Probe):
         self._password = password
         self.port = port
         self.timeout = timeout
+        self.raise_errors = raise_errors
 
         try:
             self._ssh_client = paramiko.SSHClient()
@@ -123,17 +157,26 @@ class ProbeSSH(Probe):
                                      timeout=self.timeout,
                                      compress=True)
         except paramiko.SSHException as e:
-            raise NagiosUnknown('''Cannot establish a SSH connection on remote
+            self.error('''Cannot establish a SSH connection on remote
 server !
 Host: %s
 Port: %s
 Message: %s''' % (self.hostaddress, self.port, e))
         except Exception as e:
-            raise NagiosUnknown('''Unexpected error during SSH connection !
+            self.error('''Unexpected error during SSH connection !
 Host: %s
 Port: %s
 Message: %s''' % (self.hostaddress, self.port, e))
 
+    def error(self, message):
+        """
+        Handle a SSH connection error: raise :exc:`ProbeSSH.SSHError` if
+        ``raise_errors`` is set, exit with an UNKNOWN status otherwise.
+        """
+        if self.raise_errors:
+            raise self.SSHError(message)
+        raise NagiosUnknown(message)
+
     def execute(self, command, timeout=None):
         """
         Execute a command on the remote server and return results.
@@ -245,3 +288,150 @@ Message: %s''' % (self.hostaddress, self.port, e))
             last_modified_timestamp)).total_seconds()
         last_modified_time = divmod(last_modified_totalsecs, 60)
         return int(last_modified_time[0])
+
+    # Remote aggregation: the output of the command is reduced by awk on the
+    # remote server, only the results are sent back.
+    def aggregate(self, command, key=None, value=None, pattern=None,
+                  exclude=None, where=None, separator=None):
+        """
+        Group the output lines of a command by a key and aggregate a value of
+        each group, on the remote server.
+
+        ``key`` and ``value`` are awk expressions of the fields of the line,
+        like ``'$1'`` or ``'$3 / 1024'``. By default all the lines are in the
+        same group ``''`` and the value is ``1``.
+
+        The lines are selected by ``pattern``, ``exclude``, ``where`` and
+        split in fields with ``separator``, see :meth:`matching_lines`.
+
+        :param command: Command line to execute on the remote server.
+        :type command: str
+        :return: dict of the :class:`Aggregate` of each key.
+
+        :raises ProbeSSH.SSHCommandFailed: if the aggregation failed.
+
+        **Example**::
+
+         >>> ssh.aggregate('df -P', key='$6', value='$5 + 0', where='NR > 1')
+         {'/': Aggregate(count=1, sum=42, min=42, max=42), ...}
+        """
+        program = AGGREGATE_AWK.format(
+            selection=self._selection(pattern, exclude, where),
+            key=key or '""', value=value or '1')
+        output = self._awk(command, program, pattern, exclude,
+                           separator=separator)
+
+        results = {}
+        for line in output:
+            fields = line.split(' ', 4)
+            try:
+                results[fields[4] if len(fields) > 4 else ''] = Aggregate(
+                    *[_number(field) for field in fields[:4]])
+            except (ValueError, TypeError):
+                raise self.SSHCommandFailed(
+                    'Unexpected result of the aggregation: {0}\n'
+                    'Command: {1}'.format(line, command))
+        return results
+
+    def count_by(self, command, key, **selection):
+        """
+        Count the output lines of a command by key, on the remote server.
+
+        :return: dict of the number of lines of each key, see
+                 :meth:`aggregate`.
+        """
+        return dict((k, aggregate.count) for k, aggregate
+                    in self.aggregate(command, key, **selection).iteritems())
+
+    def count_lines(self, command, **selection):
+        """
+        Count the output lines of a command on the remote server.
+
+        :return: the number of selected lines, see :meth:`matching_lines`.
+        """
+        return self.matching_lines(command, limit=0, **selection)[0]
+
+    def matching_lines(self, command, pattern=None, exclude=None, where=None,
+                       separator=None, limit=20):
+        """
+        Select output lines of a command on the remote server.
+
+        :param command: Command line to execute on the remote server.
+        :type command: str
+        :param pattern: keep the lines matching this awk (POSIX extended)
+                        regexp.
+        :type pattern: str
+        :param exclude: drop the lines matching this awk regexp.
+        :type exclude: str
+        :param where: keep the lines where this awk condition is true, like
+                      ``'$3 > 100'``.
+        :type where: str
+        :param separator: awk field separator, default to blanks.
+        :type separator: str
+        :param limit: maximum number of lines sent back, all of them if
+                      ``None``.
+        :type limit: int
+        :return: tuple (number of selected lines, list of the first
+                 ``limit`` selected lines).
+
+        :raises ProbeSSH.SSHCommandFailed: if the selection failed.
+        """
+        program = MATCHING_AWK.format(
+            selection=self._selection(pattern, exclude, where),
+            limit=-1 if limit is None else int(limit))
+        output = self._awk(command, program, pattern, exclude,
+                           separator=separator)
+        try:
+            return int(output[-1]), output[:-1]
+        except (ValueError, IndexError):
+            raise self.SSHCommandFailed(
+                'Unexpected result of the selection: {0}\n'
+                'Command: {1}'.format(output, command))
+
+    @staticmethod
+    def _selection(pattern=None, exclude=None, where=None):
+        """Return the awk condition selecting the lines."""
+        conditions = []
+        if pattern is not None:
+            conditions.append('$0 ~ ENVIRON["AWK_PATTERN"]')
+        if exclude is not None:
+            conditions.append('$0 !~ ENVIRON["AWK_EXCLUDE"]')
+        if where:
+            conditions.append('({0})'.format(where))
+        return ' && '.join(conditions)
+
+    def _awk(self, command, program, pattern=None, exclude=None,
+             separator=None):
+        """Run the command piped to the awk program, return its output."""
+        # Regexps are given in the environment, awk does not interpret their
+        # escapes there
+        environment = ''
+        if pattern is not None:
+            environment += 'AWK_PATTERN={0} '.format(pipes.quote(pattern))
+        if exclude is not None:
+            environment += 'AWK_EXCLUDE={0} '.format(pipes.quote(exclude))
+        if separator is not None:
+            program = '-F {0} {1}'.format(pipes.quote(separator),
+                                          pipes.quote(program))
+        else:
+            program = pipes.quote(program)
+
+        result = self.execute('({0}) | {1}awk {2}'.format(command, environment,
+                                                          program))
+        if result.errors:
+            logger.debug('Errors of the remote command: %s',
+                         '\n'.join(result.errors))
+        if result.status != 0:
+            raise self.SSHCommandFailed(
+                'Problem during the aggregation of the command output !\n'
+                'Command: {0}\n'
+                'Errors: {1}'.format(command, '\n'.join(result.errors)))
+        return result.output
+
+
+def _number(text):
+    """Convert a number printed by awk."""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
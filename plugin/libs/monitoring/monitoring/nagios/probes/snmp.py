@@ -21,28 +21,56 @@
 
 """SNMP probe module."""
 
+import time
+import zlib
+import pickle
 import logging as log
 from pprint import pformat
-from UserDict import IterableUserDict
 
 from pysnmp.entity.rfc3413.oneliner import cmdgen
 
 from monitoring.nagios.probes import Probe
+from monitoring.nagios.probes.snmpusm import prime_generator, \
+    export_generator
+from monitoring.nagios.cache import CacheError
 from monitoring.nagios.exceptions import NagiosUnknown
 from monitoring.nagios.utilities import find_key_from_value
 
 
 logger = log.getLogger('monitoring.nagios.probes')
 
+# SNMP error status of a response that does not fit in a message, and of a
+# SNMPv1 GET of an OID that does not exist
+TOO_BIG = 1
+NO_SUCH_NAME = 2
+
+# SNMPv3 errors telling that the agent no longer matches the cached USM data
+# (new engine ID, engine restarted, new keys). Reports of the agent give the
+# RFC 3414 names, pysnmp checks of the response give its own error
+# indications, which compare equal to their name.
+USM_ERRORS = ('unknownEngineID', 'notInTimeWindow', 'wrongDigest',
+              'unknownUserName', 'authenticationFailure',
+              'unknownSecurityName')
+
 
 class _OidValue(object):
-    """Class that represents a value from an OID."""
-    def __init__(self, varbind):
+    """
+    Class that represents a value from an OID.
+
+    ``row_index`` is the index of the value in its table, the part of the
+    OID after the queried ``prefix`` OID as a dotted string. It is the last
+    OID component if no prefix is given.
+    """
+    def __init__(self, varbind, prefix=None):
         oid, value = varbind
 
         self.index = oid[-1]
         self.oid = oid.prettyPrint()
         self.value = value
+        if prefix:
+            self.row_index = '.'.join(str(i) for i in oid[len(prefix):])
+        else:
+            self.row_index = str(self.index)
 
         logger.debug('-- Instance of OidValue created: %r', self)
 
@@ -83,10 +111,8 @@ class _SNMPQuery(object):
         logger.debug('-- Probing OID \'%s\': %s ...', name, oid)
 
         # Define SNMP command to use
-        if self.__snmpcmd == 'get':
-            snmpcmd = cmdgen.CommandGenerator().getCmd
-        elif self.__snmpcmd == 'getnext':
-            snmpcmd = cmdgen.CommandGenerator().nextCmd
+        if self.__snmpcmd == 'getnext':
+            snmpcmd = 'nextCmd'
         else:
             raise NagiosUnknown(
                 "Invalid SNMP command \'%s\' !" % self.__snmpcmd)
@@ -97,40 +123,146 @@ class _SNMPQuery(object):
             oid = _SNMPQuery.convert_oid_to_tuple(oid)
 
         try:
-            if self.__probe.snmp_version < 2:
-                auth_method = cmdgen.CommunityData('nagios-plugin',
-                                                   self.__probe.community,
-                                                   self.__probe.snmp_version)
-            else:
-                auth_method = cmdgen.UsmUserData(
-                    self.__probe.login,
-                    self.__probe.password,
-                    authProtocol=self.__probe.auth_protocol,
-                    privProtocol=self.__probe.priv_protocol,)
-
-            error_indication, _, _, varbinds = snmpcmd(
-                auth_method,
-                self.__probe.udp_transport, oid)
-            if error_indication is not None:
-                raise NagiosUnknown('SNMP query error: %s' % error_indication)
+            error_indication, _, _, varbinds = self.__probe.command(snmpcmd,
+                                                                   oid)
         except Exception as e:
-            raise NagiosUnknown('Unexpected error during SNMP %s query !\n'
-                                'OID: %s\n'
-                                'Message: %s' % (self.__snmpcmd.upper(),
-                                                 oid,
-                                                 e))
+            self.__probe.error('Unexpected error during SNMP %s query !\n'
+                               'OID: %s\n'
+                               'Message: %s' % (self.__snmpcmd.upper(),
+                                                oid,
+                                                e))
+        if error_indication is not None:
+            self.__probe.error('SNMP query error: %s' % error_indication)
 
         logger.debug('Returned varBinds:')
         logger.debug(pformat(varbinds, indent=4))
 
         return varbinds
 
-    def execute(self):
+    def __get(self):
+        """
+        Get all the OIDs in one GET request, split in smaller requests if the
+        agent answers that the response is too big.
+
+        Return the value of each OID name.
+        """
+        names = self.__oids.keys()
+        oids = [self.__oids[name] for name in names]
+        oids = [_SNMPQuery.convert_oid_to_tuple(oid)
+                if type(oid) is str else tuple(oid) for oid in oids]
+
+        results = {}
+        batches = [range(len(names))]
+        while batches:
+            batch = batches.pop()
+            logger.debug('-- Getting OIDs %s ...',
+                         ', '.join(names[i] for i in batch))
+            try:
+                error_indication, error_status, error_index, varbinds = \
+                    self.__probe.command('getCmd', *[oids[i] for i in batch])
+            except Exception as e:
+                self.__probe.error('Unexpected error during SNMP GET query !\n'
+                                   'OIDs: %s\n'
+                                   'Message: %s' % (
+                                       ', '.join(names[i] for i in batch), e))
+            if error_indication is not None:
+                self.__probe.error('SNMP query error: %s' % error_indication)
+
+            if error_status == TOO_BIG and len(batch) > 1:
+                # Get each half in its own request
+                half = len(batch) // 2
+                batches.extend((batch[half:], batch[:half]))
+                continue
+            elif error_status == NO_SUCH_NAME \
+                    and self.__probe.snmp_version == 0:
+                # SNMPv1 fails the whole request for one missing OID, pysnmp
+                # gives it a noSuchObject value: keep it and get the others
+                missing = int(error_index) - 1
+                results[names[batch[missing]]] = _OidValue(varbinds[missing])
+                del batch[missing]
+                if batch:
+                    batches.append(batch)
+                continue
+            elif error_status:
+                self.__probe.error('SNMP query error: %s at index %s' % (
+                    error_status.prettyPrint(), error_index))
+
+            logger.debug('Returned varBinds:')
+            logger.debug(pformat(varbinds, indent=4))
+
+            for i, varbind in zip(batch, varbinds):
+                results[names[i]] = _OidValue(varbind)
+
+        return results
+
+    def __walk(self, max_repetitions):
+        """
+        Walk all the OIDs together, with GETBULK requests if the SNMP
+        version supports them.
+
+        Return the values of each OID name, in the order of the walk.
+        """
+        names = self.__oids.keys()
+        prefixes = [self.__oids[name] for name in names]
+        prefixes = [_SNMPQuery.convert_oid_to_tuple(oid)
+                    if type(oid) is str else tuple(oid) for oid in prefixes]
+
+        logger.debug('-- Walking OIDs %s ...', ', '.join(names))
+
+        try:
+            if self.__probe.snmp_version == 0:
+                error_indication, error_status, error_index, varbindtable = \
+                    self.__probe.command('nextCmd', *prefixes)
+            else:
+                error_indication, error_status, error_index, varbindtable = \
+                    self.__probe.command('bulkCmd', 0, max_repetitions,
+                                         *prefixes)
+        except Exception as e:
+            self.__probe.error('Unexpected error during SNMP WALK query !\n'
+                               'OIDs: %s\n'
+                               'Message: %s' % (', '.join(names), e))
+        if error_indication is not None:
+            self.__probe.error('SNMP query error: %s' % error_indication)
+        if error_status:
+            self.__probe.error('SNMP query error: %s at index %s' % (
+                error_status.prettyPrint(), error_index))
+
+        # Keep the values that are still in the subtree of their column, the
+        # walk goes on while any column has values
+        results = {}
+        for varbinds in varbindtable:
+            for name, prefix, varbind in zip(names, prefixes, varbinds):
+                oid = varbind[0]
+                if tuple(oid[:len(prefix)]) != prefix \
+                        or len(oid) == len(prefix):
+                    continue
+                values = results.setdefault(name, [])
+                if values and values[-1].oid == oid.prettyPrint():
+                    continue
+                values.append(_OidValue(varbind, prefix))
+
+        logger.debug('Walked %s.', ', '.join(
+            '%d %s' % (len(values), name)
+            for name, values in results.iteritems()))
+
+        return results
+
+    def execute(self, max_repetitions=25):
         """Execute a SNMP query on OIDs and return the resulted (formatted)
         varBinds."""
         logger.debug('')
         logger.debug('=== BEGIN SNMP %s QUERY ===', self.__snmpcmd.upper())
 
+        if self.__snmpcmd == 'walk':
+            results = self.__walk(max_repetitions)
+            logger.debug('=== END SNMP QUERY ===')
+            return results
+
+        if self.__snmpcmd == 'get':
+            results = self.__get()
+            logger.debug('=== END SNMP QUERY ===')
+            return results
+
         # Prepare OIDs to fetch
         varbindstable = []
         results = {}
@@ -172,38 +304,172 @@ class _SNMPQuery(object):
         return ".".join(oid_str)
 
 
-class _SNMPTable(IterableUserDict):
-    """Construct a SNMP table. This is not a full table like in MIBs."""
-    def __init__(self, probe, columns):
-        logger.debug('=== BEGIN NEW SNMP TABLE===')
+class SNMPTable(object):
+    """
+    Rows of SNMP table columns, joined on their index.
+
+    The rows are made from the values of ``columns``, a list of names of
+    ``results`` that are columns of the same table. The ``lookups`` add
+    values of other tables to the rows, like the name of the entities from
+    ``entPhysicalName``. They are a dict ``{name: key}`` with ``key`` that
+    gives the index of the row in the other table:
+
+    - ``None``: the same index as the row,
+    - the name of a column of the row whose value is the index,
+    - or a callable that returns the index from the row.
+
+    The joins are done with dicts, so building the table is linear with the
+    number of values.
+
+    :param results: values of each OID name, as returned by
+                    :meth:`ProbeSNMP.walk`.
+    :type results: dict
+    :param columns: names of the table columns.
+    :type columns: list
+    :param lookups: names and keys of values of other tables.
+    :type lookups: dict
+
+    **Example**::
+
+     table = plugin.snmp.table(
+         {'status': '1.3.6.1.4.1.9.9.91.1.1.1.1.5'},
+         lookups={'name': ('1.3.6.1.2.1.47.1.1.1.1.7', None)})
+     for row in table:
+         print row.index, row['name'].pretty(), row['status'].value
+    """
+    def __init__(self, results, columns, lookups=None):
+        lookups = lookups or {}
+
+        #: Values of each name by row index.
+        self.columns = {}
+        for name in list(columns) + lookups.keys():
+            self.columns[name] = dict((value.row_index, value)
+                                      for value in results.get(name, []))
+
+        indexes = set()
+        for name in columns:
+            indexes.update(self.columns[name])
+
+        self.rows = []
+        for index in sorted(indexes, key=_index_key):
+            row = SNMPTableRow(index)
+            for name in columns:
+                row[name] = self.columns[name].get(index)
+            for name, key in lookups.iteritems():
+                row[name] = self.columns[name].get(self._lookup_index(row,
+                                                                      key))
+            self.rows.append(row)
+
+        logger.debug('SNMP table of %d rows: %s', len(self.rows),
+                     ', '.join(list(columns) + lookups.keys()))
+
+    @staticmethod
+    def _lookup_index(row, key):
+        """Return the index of ``row`` in a lookup table."""
+        if key is None:
+            return row.index
+        elif callable(key):
+            return key(row)
+        value = row.get(key)
+        return value.pretty() if value is not None else None
+
+    def evaluate(self, value, warning, critical, rows=None):
+        """
+        Test the rows against thresholds, all at once.
+
+        A row is ``critical`` if its value is above the critical threshold,
+        ``warning`` if it is above the warning threshold, ``ok`` otherwise.
+
+        :param value: the name of the column to test, or a callable that
+                      returns the value of a row.
+        :param warning: the warning threshold, or a callable that returns it
+                        for a row.
+        :param critical: the critical threshold, or a callable that returns
+                         it for a row.
+        :param rows: the rows to test, default to all the rows.
+        :returns: a list of ``(status, row, value)``, in the order of the
+                  rows.
+        """
+        if not callable(value):
+            column = value
+            value = lambda row: row[column].value
+        warn = warning if callable(warning) else lambda row: warning
+        crit = critical if callable(critical) else lambda row: critical
+
+        results = []
+        for row in self.rows if rows is None else rows:
+            row_value = value(row)
+            if row_value > crit(row):
+                status = 'critical'
+            elif row_value > warn(row):
+                status = 'warning'
+            else:
+                status = 'ok'
+            results.append((status, row, row_value))
+        return results
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.rows)
 
-        # This is the SNMP probe that handle SNMP communication
-        self.__probe = probe
 
-        # Get indexes and oid values
-        indexes = self.__probe.getnext(
-            {'indexes': columns.pop('indexes')})['indexes']
+class SNMPTableRow(dict):
+    """A row of a :class:`SNMPTable`, ``{name: _OidValue or None}``."""
+    def __init__(self, index):
+        super(SNMPTableRow, self).__init__()
+        #: Index of the row, as a dotted string.
+        self.index = index
 
-        # Append index to all OIDs
-        values = dict.fromkeys(columns, list())
-        for _, index in indexes:
-            cols = {}
-            for name, oid in columns.viewitems():
-                o = '%s.%s' % (oid, index)
-                cols[name] = o
-            # Query values
-            results = self.__probe.get(cols)
-            for k, v in results.viewitems():
-                values[k].append(v)
-                print values
+    def __repr__(self):
+        return '{0}({1!r}, {2})'.format(self.__class__.__name__, self.index,
+                                        dict.__repr__(self))
 
-        IterableUserDict.__init__(self, values)
 
-        logger.debug('=== BEGIN NEW SNMP TABLE===')
+def _index_key(index):
+    """Sort key of a dotted row index."""
+    return tuple(int(i) for i in index.split('.') if i.isdigit())
 
 
 class ProbeSNMP(Probe):
-    """Class ProbeSNMP."""
+    """
+    Class ProbeSNMP.
+
+    By default, SNMP errors stop the plugin with an UNKNOWN status. Set
+    ``raise_errors`` to ``True`` to get a :exc:`ProbeSNMP.SNMPError`
+    exception instead, for example to query several hosts and report the
+    ones that do not answer.
+
+    ``timeout`` is the number of seconds to wait for an answer to a request,
+    sent again ``retries`` times before giving up.
+
+    All the queries of the probe use the same pysnmp engine. With SNMPv3,
+    the passwords are hashed and the engine of the agent is discovered once
+    per probe, or never if ``usm_cache`` is a
+    :class:`monitoring.nagios.probes.snmpusm.UsmCache` that knows the agent
+    already.
+
+    If ``cache`` is an instance of
+    :class:`monitoring.nagios.cache.ResponseCache`, :meth:`get`,
+    :meth:`walk` and :meth:`table` are served from a snapshot of the device
+    shared by all its checks. The snapshot holds the OIDs of every check
+    that used it: when it is outdated, the next check polls all of them at
+    once and the other checks read their values from the cache until the
+    TTL expires. This replaces the walks of the same tables by each check
+    with one poll per device and TTL.
+    """
+    class SNMPError(Exception):
+        """Exception raised on SNMP errors if ``raise_errors`` is set."""
+        def __init__(self, message):
+            self.message = message
+
+        def __str__(self):
+            return self.message
+
     def __init__(self,
                  hostaddress='',
                  port=161,
@@ -212,7 +478,12 @@ class ProbeSNMP(Probe):
                  login=None,
                  password=None,
                  auth_protocol=cmdgen.usmHMACMD5AuthProtocol,
-                 priv_protocol=cmdgen.usmDESPrivProtocol):
+                 priv_protocol=cmdgen.usmDESPrivProtocol,
+                 raise_errors=False,
+                 cache=None,
+                 timeout=1,
+                 retries=5,
+                 usm_cache=None):
         super(ProbeSNMP, self).__init__()
 
         self.hostaddress = hostaddress
@@ -223,29 +494,115 @@ class ProbeSNMP(Probe):
         self.password = password
         self.auth_protocol = auth_protocol
         self.priv_protocol = priv_protocol
+        self.raise_errors = raise_errors
+        self.cache = cache
+        self.usm_cache = usm_cache
+        self._auth_data = None
+        self._generator = None
+        self._asyn_generator = None
+        self._usm_primed = False
 
         try:
             logger.debug('Establishing SNMP connection to \'%s:%d\'...',
                          self.hostaddress, self.port)
             self.udp_transport = cmdgen.UdpTransportTarget(
-                (self.hostaddress, self.port))
+                (self.hostaddress, self.port), timeout=timeout,
+                retries=retries)
         except Exception as e:
-            raise NagiosUnknown('Cannot establish a SNMP connection !\n'
-                                'Host: %s\n'
-                                'Port: %d\n'
-                                'Login: %s\n'
-                                'Password: %s\n'
-                                'Message: %s' % (self.hostaddress,
-                                                 self.port,
-                                                 self.login,
-                                                 self.password,
-                                                 e))
+            self.error('Cannot establish a SNMP connection !\n'
+                       'Host: %s\n'
+                       'Port: %d\n'
+                       'Login: %s\n'
+                       'Password: %s\n'
+                       'Message: %s' % (self.hostaddress,
+                                        self.port,
+                                        self.login,
+                                        self.password,
+                                        e))
 
         if 'ProbeSNMP' == self.__class__.__name__:
             logger.debug('=== END PROBE INIT ===')
 
+    def error(self, message):
+        """
+        Handle a SNMP error: raise :exc:`ProbeSNMP.SNMPError` if
+        ``raise_errors`` is set, exit with an UNKNOWN status otherwise.
+        """
+        if self.raise_errors:
+            raise self.SNMPError(message)
+        raise NagiosUnknown(message)
+
+    def auth_data(self):
+        """Return the pysnmp authentication data of the probe."""
+        if self._auth_data is not None:
+            return self._auth_data
+
+        if self.snmp_version < 2:
+            # The security name is made from the community, so that engines
+            # shared by several probes keep the communities apart
+            self._auth_data = cmdgen.CommunityData(self.community,
+                                                   mpModel=self.snmp_version)
+        else:
+            self._auth_data = cmdgen.UsmUserData(
+                self.login,
+                self.password,
+                authProtocol=self.auth_protocol,
+                privProtocol=self.priv_protocol)
+        return self._auth_data
+
+    def command_generator(self, use_usm_cache=True):
+        """Return the pysnmp command generator used by all the queries."""
+        if self._generator is None:
+            self._asyn_generator = cmdgen.AsynCommandGenerator()
+            self._generator = cmdgen.CommandGenerator(
+                asynCmdGen=self._asyn_generator)
+
+            if self.snmp_version == 2 and self.usm_cache is not None \
+                    and use_usm_cache:
+                entry = self.usm_cache.load(self)
+                if entry is not None:
+                    self._usm_primed = prime_generator(self._asyn_generator,
+                                                       self, entry)
+        return self._generator
+
+    def command(self, name, *args, **kwargs):
+        """
+        Run the pysnmp command ``name`` (``getCmd``, ``nextCmd``,
+        ``bulkCmd``) on the agent, and return its result.
+
+        With SNMPv3, the cached USM data of the agent are updated, or
+        forgotten if the agent rejected them (see :data:`USM_ERRORS`).
+        """
+        generator = self.command_generator()
+        result = getattr(generator, name)(self.auth_data(),
+                                          self.udp_transport,
+                                          *args, **kwargs)
+        if self.snmp_version < 2 or self.usm_cache is None:
+            return result
+
+        if result[0] in USM_ERRORS and self._usm_primed:
+            # The agent may have a new engine ID or new keys
+            logger.debug('SNMP error with cached USM data of %s (%s), '
+                         'discovering it again.', self.hostaddress, result[0])
+            self.usm_cache.invalidate(self)
+            self._generator = None
+            self._usm_primed = False
+            generator = self.command_generator(use_usm_cache=False)
+            result = getattr(generator, name)(self.auth_data(),
+                                              self.udp_transport,
+                                              *args, **kwargs)
+
+        if result[0] is None and not self._usm_primed:
+            entry = export_generator(self._asyn_generator, self)
+            if entry is not None:
+                self.usm_cache.store(self, entry)
+                self._usm_primed = True
+        return result
+
     def get(self, oidstable):
         """Query a SNMP OID using Get command."""
+        if self.cache is not None:
+            return self._snapshot_query('get', oidstable)
         query = _SNMPQuery(self, oidstable)
         return query.execute()
 
@@ -254,11 +611,139 @@ class ProbeSNMP(Probe):
         query = _SNMPQuery(self, oidstable, snmpcmd='getnext')
         return query.execute()
 
-    def table(self, columns):
+    def walk(self, oidstable, max_repetitions=25):
+        """
+        Query SNMP OIDs like :meth:`getnext`, but walk all of them together
+        in the same requests, ``max_repetitions`` rows at once with SNMP v2c
+        and v3.
+
+        :returns: a dict with the list of values of each OID name. Names of
+                  OIDs without any value are missing.
+        """
+        if self.cache is not None:
+            return self._snapshot_query('walk', oidstable, max_repetitions)
+        query = _SNMPQuery(self, oidstable, snmpcmd='walk')
+        return query.execute(max_repetitions)
+
+    def table(self, columns, lookups=None, max_repetitions=25):
         """
         Query SNMP OIDs and format results like a table.
 
-        NOT YET IMPLEMENTED.
+        All the OIDs are fetched with one :meth:`walk`.
+
+        :param columns: dict ``{name: oid}`` of the columns of the table.
+        :param lookups: dict ``{name: (oid, key)}`` of the values to join from
+                        other tables, see :class:`SNMPTable` for ``key``.
+        :returns: a :class:`SNMPTable`.
+        """
+        lookups = lookups or {}
+        oids = dict(columns)
+        oids.update((name, oid) for name, (oid, _) in lookups.iteritems())
+        results = self.walk(oids, max_repetitions)
+        return SNMPTable(results, columns.keys(),
+                         dict((name, key)
+                              for name, (_, key) in lookups.iteritems()))
+
+    def snapshot_url(self):
+        """Return the key of the device snapshot in the cache."""
+        if self.snmp_version < 2:
+            user = self.community
+        else:
+            user = self.login
+        return 'snmp://{0}@{1}:{2}/{3}'.format(user, self.hostaddress,
+                                               self.port, self.snmp_version)
+
+    def _snapshot_query(self, snmpcmd, oidstable, max_repetitions=25):
+        """
+        Return the values of ``oidstable`` from the device snapshot, like
+        :meth:`get` or :meth:`walk` would.
         """
-        raise NotImplementedError('Method table() of ProbeSNMP instances '
-                                  'will be implemented in next release !')
+        oids = dict((name, _snapshot_oid(oid))
+                    for name, oid in oidstable.iteritems())
+        url = self.snapshot_url()
+
+        try:
+            snapshot = self._load_snapshot(url)
+            if not self._snapshot_covers(snapshot, snmpcmd, oids.values()):
+                with self.cache.lock(url):
+                    # Another check may have polled it while we waited
+                    snapshot = self._load_snapshot(url)
+                    if not self._snapshot_covers(snapshot, snmpcmd,
+                                                 oids.values()):
+                        snapshot = self._poll_snapshot(url, snapshot,
+                                                       snmpcmd, oids.values(),
+                                                       max_repetitions)
+        except CacheError as e:
+            self.error('SNMP snapshot cache error: %s' % e)
+
+        values = snapshot[snmpcmd]
+        return dict((name, values[oid]) for name, oid in oids.iteritems()
+                    if values.get(oid))
+
+    def _load_snapshot(self, url):
+        """Return the snapshot of the device, outdated or not, or ``None``."""
+        cached = self.cache.lookup(url)
+        if cached is None:
+            return None
+        try:
+            return pickle.loads(zlib.decompress(cached.content))
+        except (EOFError, zlib.error, pickle.UnpicklingError):
+            logger.debug('Ignoring unreadable SNMP snapshot of %s.', url)
+            return None
+
+    def _snapshot_is_fresh(self, snapshot):
+        return snapshot is not None \
+            and 0 <= time.time() - snapshot['polled'] < self.cache.ttl
+
+    def _snapshot_covers(self, snapshot, snmpcmd, oids):
+        """Tell if ``snapshot`` is fresh and has the values of ``oids``."""
+        return self._snapshot_is_fresh(snapshot) \
+            and all(oid in snapshot[snmpcmd] for oid in oids)
+
+    def _poll_snapshot(self, url, snapshot, snmpcmd, oids, max_repetitions):
+        """
+        Poll the OIDs missing in the snapshot of the device and store it.
+
+        An outdated snapshot is polled again as a whole, with the OIDs of all
+        the checks that used it. A fresh one only gets the new OIDs and keeps
+        its poll time, so that no value is older than the TTL.
+        """
+        if snapshot is None:
+            snapshot = {'polled': 0, 'get': {}, 'walk': {}}
+
+        if self._snapshot_is_fresh(snapshot):
+            wanted = {'get': set(), 'walk': set()}
+        else:
+            wanted = {
+                'get': set(snapshot['get']),
+                'walk': set(snapshot['walk']),
+            }
+            snapshot = {'polled': time.time(), 'get': {}, 'walk': {}}
+        wanted[snmpcmd].update(oid for oid in oids
+                               if oid not in snapshot[snmpcmd])
+
+        logger.debug('Polling SNMP snapshot of %s: %d OIDs, %d tables.', url,
+                     len(wanted['get']), len(wanted['walk']))
+
+        if wanted['get']:
+            values = _SNMPQuery(self, dict((oid, oid)
+                                           for oid in wanted['get'])).execute()
+            snapshot['get'].update((oid, values.get(oid))
+                                   for oid in wanted['get'])
+        if wanted['walk']:
+            values = _SNMPQuery(self, dict((oid, oid)
+                                           for oid in wanted['walk']),
+                                snmpcmd='walk').execute(max_repetitions)
+            snapshot['walk'].update((oid, values.get(oid, []))
+                                    for oid in wanted['walk'])
+
+        self.cache.store(url, zlib.compress(pickle.dumps(
+            snapshot, pickle.HIGHEST_PROTOCOL)))
+        return snapshot
+
+
+def _snapshot_oid(oid):
+    """Return an OID as a dotted string, the key of its snapshot values."""
+    if isinstance(oid, basestring):
+        return oid.strip('.')
+    return _SNMPQuery.convert_tuple_to_oid(oid)
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Asynchronous SNMP engine, to poll many devices at once.
+
+:class:`monitoring.nagios.probes.snmp.ProbeSNMP` waits for the answer of each
+request before sending the next one. :class:`SNMPEngine` keeps many requests
+in flight on many devices: it uses one pysnmp engine and one UDP socket for
+all of them, so the SNMPv3 keys of a user are derived once for the whole run.
+
+The targets are :class:`ProbeSNMP` instances, that give the address, the
+credentials, the timeout and the retries of each device. The results are the
+same :class:`_OidValue` objects as the ones returned by :meth:`ProbeSNMP.get`
+and :meth:`ProbeSNMP.walk`.
+
+**Example**::
+
+ engine = SNMPEngine(max_pending_per_target=2)
+ for hostname in hostnames:
+     probe = ProbeSNMP(hostname, community='public', snmp_version=1,
+                       raise_errors=True)
+     engine.walk(probe, {'names': '1.3.6.1.2.1.47.1.1.1.1.7'})
+
+ for request in engine.run(timeout=60):
+     if request.error:
+         print request.probe.hostaddress, request.error
+     else:
+         print request.probe.hostaddress, len(request.results['names'])
+"""
+
+import time
+import asyncore
+import logging as log
+from collections import deque
+
+from pyasn1.type import univ
+from pysnmp.carrier.asynsock.dispatch import AsynsockDispatcher
+from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+from monitoring.nagios.probes.snmp import _OidValue, _SNMPQuery, \
+    NO_SUCH_NAME
+
+logger = log.getLogger('monitoring.nagios.probes.snmpengine')
+
+
+class SNMPRequest(object):
+    """
+    A GET or a walk of some OIDs of a target, run by a :class:`SNMPEngine`.
+
+    .. attribute:: SNMPRequest.probe
+
+        The :class:`ProbeSNMP` of the target.
+
+    .. attribute:: SNMPRequest.results
+
+        The values of each OID name, like :meth:`ProbeSNMP.get` or
+        :meth:`ProbeSNMP.walk` would return them.
+
+    .. attribute:: SNMPRequest.error
+
+        The error message if the request failed, else ``None``.
+
+    .. attribute:: SNMPRequest.elapsed
+
+        Number of seconds from the first PDU sent to the last answer.
+    """
+    def __init__(self, probe, snmpcmd, oidstable, max_repetitions=25,
+                 callback=None):
+        self.probe = probe
+        self.snmpcmd = snmpcmd
+        self.max_repetitions = max_repetitions
+        self.callback = callback
+        self.results = {}
+        self.error = None
+        self.done = False
+        self.started = None
+        self.elapsed = None
+
+        self.names = oidstable.keys()
+        self.prefixes = [_SNMPQuery.convert_oid_to_tuple(oid.strip('.'))
+                         if isinstance(oid, basestring) else tuple(oid)
+                         for oid in oidstable.values()]
+
+        #: Indexes of the OIDs still to query, and where to query them from.
+        self.active = range(len(self.names))
+        self.positions = list(self.prefixes)
+
+    @property
+    def target(self):
+        """Key of the target for the rate limits."""
+        return self.probe.hostaddress, self.probe.port
+
+    def result(self):
+        """
+        Return :attr:`results`, or handle the error like the probe does, see
+        :meth:`ProbeSNMP.error`.
+        """
+        if self.error:
+            self.probe.error(self.error)
+        return self.results
+
+    def _finish(self, error=None):
+        self.done = True
+        self.error = error
+        if self.started is not None:
+            self.elapsed = time.time() - self.started
+        logger.debug('%s of %s finished: %s', self.snmpcmd.upper(),
+                     self.probe.hostaddress, error or 'ok')
+        if self.callback is not None:
+            self.callback(self)
+
+    def _add_values(self, varbinds):
+        """Map the values of a GET response to the OID names."""
+        for name, varbind in zip(self.names, varbinds):
+            self.results[name] = _OidValue(varbind)
+
+    def _add_rows(self, varbindtable):
+        """
+        Add the rows of a GETNEXT / GETBULK response to the walked values,
+        and move the walk forward.
+        """
+        finished = set()
+        for row in varbindtable:
+            for column, varbind in zip(self.active, row):
+                if column in finished:
+                    continue
+                oid, value = varbind
+                prefix = self.prefixes[column]
+                if isinstance(value, univ.Null) \
+                        or tuple(oid[:len(prefix)]) != prefix \
+                        or len(oid) == len(prefix) \
+                        or tuple(oid) <= tuple(self.positions[column]):
+                    finished.add(column)
+                    continue
+                self.results.setdefault(self.names[column], []).append(
+                    _OidValue(varbind, prefix))
+                self.positions[column] = tuple(oid)
+        self.active = [column for column in self.active
+                       if column not in finished]
+
+    def __repr__(self):
+        return '<{0} {1} {2} {3}>'.format(self.__class__.__name__,
+                                          self.snmpcmd.upper(),
+                                          self.probe.hostaddress,
+                                          ', '.join(self.names))
+
+
+class SNMPEngine(object):
+    """
+    Run SNMP requests on many targets concurrently.
+
+    Requests are queued with :meth:`get` and :meth:`walk`, and sent by
+    :meth:`run`. Every PDU goes through the rate limits:
+
+    :param max_pending: maximum number of requests in flight.
+    :type max_pending: int
+    :param max_pending_per_target: maximum number of requests in flight to
+                                   the same target.
+    :type max_pending_per_target: int
+    :param interval: minimum number of seconds between two requests sent to
+                     the same target.
+    :type interval: float
+    :param resolution: number of seconds between two checks of the
+                       timeouts and the queue.
+    :type resolution: float
+    """
+    def __init__(self, max_pending=1000, max_pending_per_target=1,
+                 interval=0, resolution=0.05):
+        self.max_pending = max_pending
+        self.max_pending_per_target = max_pending_per_target
+        self.interval = interval
+        self.resolution = resolution
+
+        # One engine and one dispatcher for all the targets
+        self.generator = cmdgen.AsynCommandGenerator()
+        self.dispatcher = AsynsockDispatcher()
+        self.dispatcher.setTimerResolution(resolution)
+        self.generator.snmpEngine.registerTransportDispatcher(self.dispatcher)
+
+        self.requests = []
+        self._queue = deque()
+        self._pending = 0
+        self._pending_by_target = {}
+        self._last_sent = {}
+        self._users = {}
+
+    def get(self, probe, oidstable, callback=None):
+        """
+        Queue a GET of ``oidstable`` on the target of ``probe``.
+
+        :param callback: called with the :class:`SNMPRequest` when it is
+                         finished.
+        :returns: a :class:`SNMPRequest`.
+        """
+        return self._add(SNMPRequest(probe, 'get', oidstable,
+                                     callback=callback))
+
+    def walk(self, probe, oidstable, max_repetitions=25, callback=None):
+        """
+        Queue a walk of ``oidstable`` on the target of ``probe``, see
+        :meth:`ProbeSNMP.walk`.
+
+        :param callback: called with the :class:`SNMPRequest` when it is
+                         finished.
+        :returns: a :class:`SNMPRequest`.
+        """
+        return self._add(SNMPRequest(probe, 'walk', oidstable,
+                                     max_repetitions, callback))
+
+    def run(self, timeout=None):
+        """
+        Send the queued requests and wait for all of them.
+
+        :param timeout: maximum number of seconds to run, the requests still
+                        running are failed after it.
+        :returns: the list of the :class:`SNMPRequest`, in the order they
+                  were queued.
+        """
+        deadline = time.time() + timeout if timeout else None
+        logger.debug('Running %d SNMP requests...', len(self._queue))
+
+        self._send_queued()
+        while self._queue or self._pending:
+            if deadline is not None and time.time() >= deadline:
+                self._expire()
+                break
+            asyncore.poll(self.resolution, self.dispatcher.getSocketMap())
+            self.dispatcher.handleTimerTick(time.time())
+            self._send_queued()
+
+        requests, self.requests = self.requests, []
+        return requests
+
+    def close(self):
+        """Close the socket and the engine."""
+        self.generator.uncfgCmdGen()
+        self.dispatcher.closeDispatcher()
+
+    # Internals
+    def _add(self, request):
+        self.requests.append(request)
+        self._queue.append(request)
+        return request
+
+    def _send_queued(self):
+        """Send the queued requests allowed by the rate limits."""
+        now = time.time()
+        waiting = deque()
+        while self._queue and self._pending < self.max_pending:
+            request = self._queue.popleft()
+            target = request.target
+            if self._pending_by_target.get(target, 0) \
+                    >= self.max_pending_per_target \
+                    or now - self._last_sent.get(target, 0) < self.interval:
+                waiting.append(request)
+                continue
+            self._send(request)
+        waiting.extend(self._queue)
+        self._queue = waiting
+
+    def _send(self, request):
+        """Send the next PDU of ``request``."""
+        probe = request.probe
+        oids = [request.positions[column] for column in request.active]
+        callback = (self._on_response, request)
+        if request.started is None:
+            request.started = time.time()
+
+        if probe.snmp_version == 2:
+            # pysnmp knows the USM users by name only
+            keys = (probe.password, probe.auth_protocol, probe.priv_protocol)
+            if self._users.setdefault(probe.login, keys) != keys:
+                request._finish('SNMPv3 user %s is already used with other '
+                                'keys in this engine !' % probe.login)
+                return
+
+        try:
+            if request.snmpcmd == 'get':
+                self.generator.getCmd(probe.auth_data(), probe.udp_transport,
+                                      oids, callback)
+            elif probe.snmp_version == 0:
+                self.generator.nextCmd(probe.auth_data(),
+                                       probe.udp_transport, oids, callback)
+            else:
+                self.generator.bulkCmd(probe.auth_data(),
+                                       probe.udp_transport, 0,
+                                       request.max_repetitions, oids,
+                                       callback)
+        except Exception as e:
+            request._finish('Unexpected error during SNMP %s query !\n'
+                            'Message: %s' % (request.snmpcmd.upper(), e))
+            return
+
+        target = request.target
+        self._pending += 1
+        self._pending_by_target[target] = \
+            self._pending_by_target.get(target, 0) + 1
+        self._last_sent[target] = time.time()
+
+    def _on_response(self, handle, error_indication, error_status,
+                     error_index, varbinds, request):
+        if request.done:
+            # Expired by run()
+            return
+
+        target = request.target
+        self._pending -= 1
+        self._pending_by_target[target] -= 1
+        if not self._pending_by_target[target]:
+            del self._pending_by_target[target]
+
+        if error_indication is not None:
+            request._finish('SNMP query error: %s' % error_indication)
+        elif request.snmpcmd == 'get':
+            if error_status:
+                request._finish('SNMP query error: %s at index %s' % (
+                    error_status.prettyPrint(), error_index))
+            else:
+                request._add_values(varbinds)
+                request._finish()
+        else:
+            if error_status == NO_SUCH_NAME and request.probe.snmp_version == 0:
+                # End of the MIB for this column, walk the other ones
+                del request.active[int(error_index) - 1]
+            elif error_status:
+                request._finish('SNMP query error: %s at index %s' % (
+                    error_status.prettyPrint(), error_index))
+                return
+            else:
+                request._add_rows(varbinds)
+
+            if request.active:
+                self._queue.append(request)
+            else:
+                request._finish()
+
+    def _expire(self):
+        """Fail the requests that did not finish before the deadline."""
+        for request in self.requests:
+            if not request.done:
+                request._finish('SNMP query error: No SNMP response '
+                                'received before the deadline')
+        self._queue.clear()
+        self._pending = 0
+        self._pending_by_target.clear()
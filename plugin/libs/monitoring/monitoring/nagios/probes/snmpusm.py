@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Cache of the SNMPv3 security data of the agents, shared by all the checks.
+
+Before its first SNMPv3 request to an agent, pysnmp hashes the passwords of
+the user (a digest of one megabyte of data each) and discovers the engine ID
+and clock of the agent with an extra request. :class:`UsmCache` keeps, for
+each agent and user, the engine ID, the keys of the user localized for this
+engine and the engine clock, so that the next checks send their request
+right away.
+
+Only the localized keys are stored: they are only valid for this agent,
+unlike the passwords. The files are readable by their owner only, and their
+names are digests that also depend on the password, so that a new password
+does not use the keys of the old one.
+"""
+
+import os
+import json
+import time
+import errno
+import hashlib
+import logging as log
+
+from pyasn1.type import univ
+
+from monitoring.nagios.cache import CacheError, default_cache_directory, \
+    _atomic_write, _remove
+
+logger = log.getLogger('monitoring.nagios.probes.snmpusm')
+
+
+class UsmCache(object):
+    """
+    On-disk cache of the SNMPv3 engine IDs, localized keys and clocks.
+
+    :param directory: where to store the cache files. Default to the ``usm``
+                      folder of
+                      :func:`monitoring.nagios.cache.default_cache_directory`.
+    :type directory: str
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(default_cache_directory(),
+                                                   'usm')
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            os.chmod(self.directory, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not os.path.isdir(self.directory):
+                raise CacheError("Unable to create the USM cache folder "
+                                 "{0}: {1}".format(self.directory, e))
+
+    def load(self, probe):
+        """Return the cached data of the agent and user of ``probe``."""
+        try:
+            with open(self._path(probe)) as entry:
+                return json.load(entry)
+        except (IOError, ValueError):
+            return None
+
+    def store(self, probe, entry):
+        """Store the data of the agent and user of ``probe``."""
+        try:
+            _atomic_write(self._path(probe), json.dumps(entry))
+        except CacheError as e:
+            logger.debug('Cannot store the USM data of %s: %s',
+                         probe.hostaddress, e)
+
+    def invalidate(self, probe):
+        """Forget the data of the agent and user of ``probe``."""
+        _remove(self._path(probe))
+
+    def _path(self, probe):
+        key = repr((probe.hostaddress, probe.port, probe.login,
+                    tuple(probe.auth_protocol), tuple(probe.priv_protocol),
+                    probe.password))
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest())
+
+
+def prime_generator(generator, probe, entry):
+    """
+    Give the cached data of an agent to a pysnmp ``AsynCommandGenerator``,
+    before it sends any request to the agent.
+
+    :returns: ``True`` if the generator will use it.
+    """
+    known_auths = getattr(generator, '_AsynCommandGenerator__knownAuths',
+                          None)
+    if known_auths is None:
+        return False
+
+    snmp_engine = generator.snmpEngine
+    mib = snmp_engine.msgAndPduDsp.mibInstrumController
+    auth = probe.auth_data()
+    engine_id = univ.OctetString(hexValue=entry['engine_id'])
+
+    # The user with the keys localized for the engine of the agent, instead
+    # of the passwords that pysnmp would hash
+    usm_user_entry, = mib.mibBuilder.importSymbols('SNMP-USER-BASED-SM-MIB',
+                                                   'usmUserEntry')
+    usm_key_entry, = mib.mibBuilder.importSymbols('PYSNMP-USM-MIB',
+                                                  'pysnmpUsmKeyEntry')
+    zero_dot_zero, = mib.mibBuilder.importSymbols('SNMPv2-SMI',
+                                                  'zeroDotZero')
+    index = usm_user_entry.getInstIdFromIndices(engine_id,
+                                                auth.securityName)
+    mib.writeVars(((usm_user_entry.name + (13,) + index, 'destroy'),))
+    mib.writeVars(((usm_user_entry.name + (13,) + index, 'createAndGo'),
+                   (usm_user_entry.name + (3,) + index, auth.securityName),
+                   (usm_user_entry.name + (4,) + index, zero_dot_zero.name),
+                   (usm_user_entry.name + (5,) + index, auth.authProtocol),
+                   (usm_user_entry.name + (8,) + index, auth.privProtocol)))
+    keys = [(usm_key_entry.name + (column,) + index, key.decode('hex'))
+            for column, key in ((1, entry['auth_key']),
+                                (2, entry['priv_key'])) if key]
+    if keys:
+        mib.writeVars(keys)
+    known_auths[auth.securityName] = auth
+
+    # The engine ID, no discovery request
+    transport = probe.udp_transport
+    mp_model = snmp_engine.messageProcessingSubsystems[3]
+    mp_model._SnmpV3MessageProcessingModel__engineIDs[
+        (transport.transportDomain, transport.transportAddr)] = {
+            'securityEngineID': engine_id,
+            'contextEngineId': univ.OctetString(
+                hexValue=entry['context_engine_id']),
+            'contextName': univ.OctetString(entry['context_name']),
+    }
+
+    # The clock of the agent, moved forward by the time spent in the cache
+    engine_time = entry['engine_time'] + int(time.time() - entry['stored'])
+    snmp_engine.securityModels[3]._SnmpUSMSecurityModel__timeline[
+        engine_id] = (entry['engine_boots'], engine_time, engine_time,
+                      int(time.time()))
+
+    logger.debug('Using cached USM data of %s, engine ID %s.',
+                 probe.hostaddress, entry['engine_id'])
+    return True
+
+
+def export_generator(generator, probe):
+    """
+    Return the data of an agent known by a pysnmp ``AsynCommandGenerator``
+    after a successful request, or ``None``.
+    """
+    snmp_engine = generator.snmpEngine
+    transport = probe.udp_transport
+    try:
+        peer = snmp_engine.messageProcessingSubsystems[3]\
+            ._SnmpV3MessageProcessingModel__engineIDs[
+                (transport.transportDomain, transport.transportAddr)]
+        engine_id = peer['securityEngineID']
+        boots, engine_time = snmp_engine.securityModels[3]\
+            ._SnmpUSMSecurityModel__timeline[engine_id][:2]
+    except (AttributeError, KeyError):
+        return None
+
+    mib = snmp_engine.msgAndPduDsp.mibInstrumController
+    usm_key_entry, = mib.mibBuilder.importSymbols('PYSNMP-USM-MIB',
+                                                  'pysnmpUsmKeyEntry')
+    usm_user_entry, = mib.mibBuilder.importSymbols('SNMP-USER-BASED-SM-MIB',
+                                                   'usmUserEntry')
+    index = usm_user_entry.getInstIdFromIndices(engine_id,
+                                                probe.auth_data().securityName)
+    auth_key = usm_key_entry.getNode(usm_key_entry.name + (1,) + index).syntax
+    priv_key = usm_key_entry.getNode(usm_key_entry.name + (2,) + index).syntax
+
+    return {
+        'engine_id': _hex(engine_id),
+        'context_engine_id': _hex(peer['contextEngineId']),
+        'context_name': str(peer['contextName']),
+        'auth_key': _hex(auth_key),
+        'priv_key': _hex(priv_key),
+        'engine_boots': int(boots),
+        'engine_time': int(engine_time),
+        'stored': time.time(),
+    }
+
+
+def _hex(value):
+    """Return an octet string as hex, keys without value as ``''``."""
+    if not value.hasValue():
+        return ''
+    return value.asOctets().encode('hex')
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the shared response cache."""
+
+import os
+import unittest
+import shutil
+import tempfile
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.cache import ResponseCache, CacheError, \
+    compact_xml_tree
+
+
+class FakeResponse(object):
+    """Minimal ``requests.Response`` used by :class:`FakeSession`."""
+    encoding = 'utf-8'
+
+    def __init__(self, status_code, content='', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    """Record requests and serve a fixed document with an ETag."""
+    def __init__(self, content, etag='"v1"'):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.content, {'ETag': self.etag})
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test caching and revalidation of responses."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.session = FakeSession('<alerts><event name="a"/></alerts>')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fresh_response_from_cache(self):
+        """Test a fresh response does not hit the server twice."""
+        cache = ResponseCache(self.directory, ttl=60, session=self.session)
+        first = cache.get('http://host/nemo.xml')
+        second = cache.get('http://host/nemo.xml')
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, self.session.content)
+        self.assertEqual(1, len(self.session.requests))
+
+    def test_revalidation_not_modified(self):
+        """Test an expired response is revalidated with its ETag."""
+        cache = ResponseCache(self.directory, ttl=0, session=self.session)
+        cache.get('http://host/nemo.xml')
+        response = cache.get('http://host/nemo.xml')
+        self.assertTrue(response.from_cache)
+        self.assertEqual('"v1"', self.session.requests[-1]['If-None-Match'])
+        self.assertEqual(response.content, self.session.content)
+
+    def test_content_changed(self):
+        """Test a changed document replaces the cached one."""
+        cache = ResponseCache(self.directory, ttl=0, session=self.session)
+        cache.get('http://host/nemo.xml', parser=compact_xml_tree)
+        self.session.content = '<alerts/>'
+        self.session.etag = '"v2"'
+        response = cache.get('http://host/nemo.xml', parser=compact_xml_tree)
+        self.assertFalse(response.from_cache)
+        self.assertEqual(('alerts', {}, None, ()), response.parsed)
+
+    def test_parsed_tree(self):
+        """Test the parsed form is stored along the content."""
+        cache = ResponseCache(self.directory, ttl=60, session=self.session)
+        first = cache.get('http://host/nemo.xml', parser=compact_xml_tree)
+        second = cache.get('http://host/nemo.xml', parser=compact_xml_tree)
+        self.assertEqual(first.parsed, second.parsed)
+        self.assertEqual(('event', {'name': 'a'}, None, ()),
+                         second.parsed[3][0])
+
+    def test_request_arguments_in_key(self):
+        """Test other credentials or parameters do not share the entry."""
+        cache = ResponseCache(self.directory, ttl=60, session=self.session)
+        cache.get('http://host/nemo.xml', auth=('a', 'x'))
+        self.session.content = '<alerts/>'
+        other = cache.get('http://host/nemo.xml', auth=('b', 'y'))
+        query = cache.get('http://host/nemo.xml', auth=('a', 'x'),
+                          params={'q': '1'})
+        same = cache.get('http://host/nemo.xml', auth=('a', 'x'),
+                         timeout=5)
+        self.assertFalse(other.from_cache)
+        self.assertFalse(query.from_cache)
+        self.assertTrue(same.from_cache)
+        self.assertEqual('<alerts><event name="a"/></alerts>', same.content)
+        self.assertEqual(3, len(self.session.requests))
+
+    def test_parsers_do_not_collide(self):
+        """Test two lambdas get their own parsed tree."""
+        cache = ResponseCache(self.directory, ttl=60, session=self.session)
+        first = cache.get('http://host/nemo.xml', parser=lambda c: len(c))
+        second = cache.get('http://host/nemo.xml', parser=lambda c: c[:8])
+        self.assertEqual(len(self.session.content), first.parsed)
+        self.assertEqual('<alerts>', second.parsed)
+
+    def test_unusable_directory(self):
+        """Test an unusable cache folder raises CacheError."""
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        self.assertRaises(CacheError, ResponseCache, path)
+
+        cache = ResponseCache(self.directory, session=self.session)
+        shutil.rmtree(self.directory)
+        self.assertRaises(CacheError, cache.get, 'http://host/nemo.xml')
+        os.mkdir(self.directory)
+
+    def test_store_and_lookup(self):
+        """Test storing a document fetched by other means than HTTP."""
+        cache = ResponseCache(self.directory, ttl=60, session=self.session)
+        self.assertIsNone(cache.lookup('ftp://host/alerts.xml'))
+        with cache.lock('ftp://host/alerts.xml'):
+            cache.store('ftp://host/alerts.xml', '<alerts/>',
+                        validators=('20121113155604', '9'))
+        cached = cache.lookup('ftp://host/alerts.xml', fresh=True)
+        self.assertEqual('<alerts/>', cached.content)
+        self.assertEqual(('20121113155604', '9'), cached.validators)
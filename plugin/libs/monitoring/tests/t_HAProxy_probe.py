@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the HAProxy probe."""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.haproxy import ProbeHAProxy, HAProxyStats
+from monitoring.nagios.cache import ResponseCache
+
+HEADER = '# pxname,svname,qcur,qmax,scur,smax,slim,stot,bin,bout,dreq,' \
+         'dresp,ereq,econ,eresp,wretr,wredis,status,weight,act,bck,' \
+         'chkfail,chkdown,lastchg,downtime,qlimit,pid,iid,sid,throttle,' \
+         'lbtot,tracked,type,rate,rate_lim,rate_max,check_status,\n'
+
+STATS = HEADER + \
+    'stats,FRONTEND,,,1,2,2000,40,5000,60000,0,0,0,,,,,OPEN,,,,,,,,,1,1,' \
+    '0,,,,0,0,0,1,,\n' \
+    'www,FRONTEND,,,12,30,2000,1000,200000,3000000,0,0,3,,,,,OPEN,,,,,,,,,' \
+    '1,2,0,,,,0,4,0,20,,\n' \
+    'www,web1,0,0,7,15,,600,120000,1800000,,0,,0,1,0,0,UP,1,1,0,0,0,3600,' \
+    '0,,1,2,1,,600,,2,2,,10,"L7OK",\n' \
+    'www,web2,0,0,5,15,,400,80000,1200000,,0,,2,0,0,0,DOWN,1,1,0,3,1,60,' \
+    '60,,1,2,2,,400,,2,2,,10,"L4CON, timeout",\n' \
+    'www,BACKEND,0,0,12,30,200,1000,200000,3000000,0,0,,2,1,0,0,UP,2,2,0,' \
+    ',0,3600,0,,1,2,0,,1000,,1,4,,20,,\n'
+
+INFO = 'Name: HAProxy\nVersion: 1.5.8\nPid: 4242\nUptime: 0d 1h00m00s\n' \
+       'Uptime_sec: 3600\n\n'
+
+
+class StatsSocket(threading.Thread):
+    """Stats socket answering ``answer`` to each connection."""
+    def __init__(self, answer, path=None, connections=1):
+        super(StatsSocket, self).__init__()
+        self.daemon = True
+        self.answer = answer
+        self.connections = connections
+        self.received = []
+        if path is None:
+            self.sock = socket.socket()
+            self.sock.bind(('127.0.0.1', 0))
+            self.address = self.sock.getsockname()
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(path)
+            self.address = path
+        self.sock.listen(1)
+
+    def run(self):
+        try:
+            for _ in range(self.connections):
+                conn, _ = self.sock.accept()
+                self.received.append(conn.recv(1024))
+                conn.sendall(self.answer)
+                conn.close()
+        finally:
+            self.sock.close()
+
+
+class TestParse(unittest.TestCase):
+    def setUp(self):
+        self.stats = HAProxyStats.parse(INFO + STATS, taken=1000)
+
+    def test_info(self):
+        self.assertEqual(self.stats.info['Name'], 'HAProxy')
+        self.assertEqual(self.stats.info['Uptime_sec'], 3600)
+        self.assertEqual(self.stats.info['Uptime'], '0d 1h00m00s')
+
+    def test_records(self):
+        self.assertEqual(len(self.stats), 5)
+        web2 = self.stats.get('www', 'web2')
+        self.assertEqual(web2.kind, 'server')
+        self.assertEqual(web2.scur, 5)
+        self.assertEqual(web2.bin, 80000)
+        self.assertEqual(web2.status, 'DOWN')
+        self.assertEqual(web2.check_status, 'L4CON, timeout')
+        self.assertIsNone(web2.slim)
+        self.assertEqual(self.stats.get('www', 'FRONTEND').kind, 'frontend')
+        self.assertRaises(AttributeError, getattr, web2, 'unknown')
+
+    def test_select(self):
+        self.assertEqual([r.svname for r in self.stats.proxy('www')],
+                         ['FRONTEND', 'web1', 'web2', 'BACKEND'])
+        self.assertEqual([r.pxname for r in self.stats.select()],
+                         ['www'] * 4)
+        self.assertEqual([r.key for r in self.stats.select(kinds=['server'])],
+                         [('www', 'web1'), ('www', 'web2')])
+        self.assertEqual(self.stats.proxy('none'), [])
+
+    def test_no_statistics(self):
+        self.assertRaises(ValueError, HAProxyStats.parse,
+                          'Unknown command.\n')
+
+
+class TestRates(unittest.TestCase):
+    def setUp(self):
+        self.previous = HAProxyStats.parse(INFO + STATS, taken=1000)\
+            .counters()
+
+    def snapshot(self, replacements, uptime='3610', taken=1010):
+        content = INFO.replace('3600', uptime) + STATS
+        for old, new in replacements:
+            content = content.replace(old, new)
+        return HAProxyStats.parse(content, taken=taken)
+
+    def test_rates(self):
+        stats = self.snapshot([(',600,120000,1800000,', ',650,121000,1805000,')])
+        rates = stats.rates(self.previous)
+        self.assertEqual(rates[('www', 'web1')],
+                         {'stot': 5.0, 'bin': 100.0, 'bout': 500.0})
+        self.assertEqual(rates[('www', 'web2')],
+                         {'stot': 0.0, 'bin': 0.0, 'bout': 0.0})
+
+    def test_counter_reset(self):
+        stats = self.snapshot([(',600,120000,1800000,', ',10,120000,0,'),
+                               ('www,web2,', 'www,web3,')])
+        rates = stats.rates(self.previous)
+        self.assertEqual(rates[('www', 'web1')], {'bin': 0.0})
+        self.assertNotIn(('www', 'web3'), rates)
+
+    def test_restart(self):
+        self.assertEqual(self.snapshot([], uptime='10').rates(self.previous),
+                         {})
+        self.assertEqual(self.snapshot([], taken=1000).rates(self.previous),
+                         {})
+        self.assertEqual(self.snapshot([]).rates(None), {})
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unix_socket(self):
+        server = StatsSocket(INFO + STATS,
+                             os.path.join(self.directory, 'stats'))
+        server.start()
+        stats = ProbeHAProxy(socket=server.address).snapshot()
+        server.join(5)
+        self.assertEqual(server.received, ['show info;show stat\n'])
+        self.assertEqual(stats.info['Pid'], 4242)
+        self.assertEqual(stats.get('www', 'BACKEND').stot, 1000)
+
+    def test_cache(self):
+        server = StatsSocket(STATS)
+        server.start()
+        cache = ResponseCache(directory=self.directory, ttl=60)
+        first = ProbeHAProxy(socket=server.address, cache=cache).snapshot()
+        second = ProbeHAProxy(socket=server.address, cache=cache).snapshot()
+        server.join(5)
+        self.assertEqual(len(server.received), 1)
+        self.assertEqual(first.taken, second.taken)
+        self.assertEqual(second.get('www', 'web1').bout, 1800000)
+
+    def test_errors(self):
+        server = StatsSocket('Permission denied\n')
+        server.start()
+        probe = ProbeHAProxy(socket=server.address, raise_errors=True)
+        self.assertRaises(ProbeHAProxy.HAProxyError, probe.snapshot)
+        server.join(5)
+        self.assertRaises(ProbeHAProxy.HAProxyError, probe.snapshot)
+        self.assertRaises(SystemExit,
+                          ProbeHAProxy(socket=server.address).snapshot)
+
+    def test_source(self):
+        self.assertEqual(ProbeHAProxy(url='http://lb1:7777').source,
+                         'http://lb1:7777/;csv')
+        self.assertEqual(ProbeHAProxy(url='http://lb1/stats/;csv').source,
+                         'http://lb1/stats/;csv')
+        self.assertRaises(ValueError, ProbeHAProxy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the OFTP probe."""
+
+import socket
+import threading
+import unittest
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.oftp import ProbeOFTP, OFTPStreamParser, \
+    OFTPError, probe_all, ssid_command
+
+READY = '\x10\x00\x00\x17IODETTE FTP READY \r'
+
+
+class OFTPServer(threading.Thread):
+    """Local server sending ``replies``, one after each received chunk."""
+    def __init__(self, replies):
+        super(OFTPServer, self).__init__()
+        self.daemon = True
+        self.replies = replies
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+        self.received = []
+
+    def run(self):
+        conn, _ = self.sock.accept()
+        try:
+            for index, reply in enumerate(self.replies):
+                if index:
+                    self.received.append(conn.recv(1024))
+                conn.sendall(reply)
+            self.received.append(conn.recv(1024))
+        finally:
+            conn.close()
+            self.sock.close()
+
+
+class TestOFTPStreamParser(unittest.TestCase):
+    """Test the splitting of the exchange buffers."""
+    def test_framed_bytes_one_by_one(self):
+        """Test a framed command received byte per byte."""
+        parser = OFTPStreamParser()
+        buffers = []
+        for byte in READY * 2:
+            buffers.extend(parser.feed(byte))
+        self.assertEqual(buffers, ['IODETTE FTP READY \r'] * 2)
+        self.assertTrue(parser.framed)
+
+    def test_unframed(self):
+        """Test bare commands ended by a carriage return."""
+        parser = OFTPStreamParser()
+        self.assertEqual(parser.feed('IODETTE FTP RE'), [])
+        self.assertEqual(parser.feed('ADY \rX5'), ['IODETTE FTP READY \r'])
+        self.assertEqual(parser.frame('F00\r'), 'F00\r')
+
+    def test_invalid_header(self):
+        """Test a broken stream transmission header."""
+        parser = OFTPStreamParser()
+        parser.feed(READY)
+        with self.assertRaises(OFTPError):
+            parser.feed('\x20\x00\x00\x10')
+
+    def test_ssid_length(self):
+        """Test the start session command has the right length."""
+        self.assertEqual(len(ssid_command('ODETTE', 'secret')), 61)
+        self.assertEqual(len(ssid_command('ODETTE', 'secret', level=4)), 61)
+
+
+class TestOFTPProbe(unittest.TestCase):
+    """Test probing local OFTP servers."""
+    def test_ready(self):
+        """Test a server sending the ready message."""
+        server = OFTPServer([READY])
+        server.start()
+        result = ProbeOFTP('127.0.0.1', server.port, timeout=5).probe()
+        self.assertTrue(result.available)
+        self.assertIsNotNone(result.connect_time)
+        self.assertGreaterEqual(result.ready_time, result.connect_time)
+
+    def test_session_refused(self):
+        """Test a server refusing the start session."""
+        server = OFTPServer([READY, '\x10\x00\x00\x0bF04000\r'])
+        server.start()
+        result = ProbeOFTP('127.0.0.1', server.port, timeout=5,
+                           code='ODETTE', password='bad').probe()
+        server.join(5)
+        self.assertFalse(result.available)
+        self.assertIn('Invalid password', result.message)
+        self.assertEqual(server.received[0][4:5], 'X')
+
+    def test_concurrent_probes(self):
+        """Test several servers probed at once, one being silent."""
+        servers = [OFTPServer([READY]), OFTPServer([''])]
+        for server in servers:
+            server.start()
+        results = probe_all([ProbeOFTP('127.0.0.1', server.port, timeout=1)
+                             for server in servers])
+        self.assertEqual([r.available for r in results], [True, False])
+        self.assertIsNone(results[1].ready_time)
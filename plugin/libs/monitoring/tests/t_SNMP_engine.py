@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the asynchronous SNMP engine."""
+
+import bisect
+import socket
+import threading
+import unittest
+import sys
+
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.snmp import ProbeSNMP
+from monitoring.nagios.probes.snmpengine import SNMPEngine
+
+ENTITY_NAME = '1.3.6.1.2.1.47.1.1.1.1.7'
+CPU_USAGE = '1.3.6.1.4.1.9.9.109.1.1.1.1.8'
+UPTIME = '1.3.6.1.2.1.1.3.0'
+
+MIB = {
+    (1, 3, 6, 1, 2, 1, 1, 3, 0): 4200,
+    (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 7, 1): 'Chassis',
+    (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 7, 22): 'Outlet',
+    (1, 3, 6, 1, 2, 1, 47, 1, 1, 1, 1, 7, 30): 'CPU',
+    (1, 3, 6, 1, 4, 1, 9, 9, 109, 1, 1, 1, 1, 8, 1): 12,
+}
+
+
+class SNMPAgent(threading.Thread):
+    """
+    Local SNMP v1 / v2c agent answering from :data:`MIB`.
+
+    GET requests of more than ``max_varbinds`` OIDs fail with ``tooBig``.
+    """
+    def __init__(self, max_varbinds=None):
+        super(SNMPAgent, self).__init__()
+        self.daemon = True
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.oids = sorted(MIB)
+        self.requests = 0
+        self.max_varbinds = max_varbinds
+        self.sizes = []
+
+    def value(self, module, oid):
+        if oid not in MIB:
+            return module.NoSuchObject()
+        if isinstance(MIB[oid], int):
+            return module.Integer(MIB[oid])
+        return module.OctetString(MIB[oid])
+
+    def run(self):
+        while True:
+            message, address = self.sock.recvfrom(65535)
+            self.requests += 1
+            version = int(api.decodeMessageVersion(message))
+            module = api.protoModules[version]
+            request, _ = decoder.decode(message, asn1Spec=module.Message())
+            pdu = module.apiMessage.getPDU(request)
+            response = module.apiMessage.getResponse(request)
+            names = [tuple(oid)
+                     for oid, _ in module.apiPDU.getVarBinds(pdu)]
+            self.sizes.append(len(names))
+
+            varbinds = []
+            error_status = error_index = 0
+            if pdu.isSameTypeWith(module.GetRequestPDU()):
+                missing = [index for index, oid in enumerate(names)
+                           if oid not in MIB]
+                if self.max_varbinds and len(names) > self.max_varbinds:
+                    error_status = 1
+                elif missing and not version:
+                    # noSuchName
+                    error_status, error_index = 2, missing[0] + 1
+                    varbinds = [(oid, module.Null()) for oid in names]
+                else:
+                    varbinds = [(oid, self.value(module, oid))
+                                for oid in names]
+            else:
+                repetitions = 1
+                if version and pdu.isSameTypeWith(module.GetBulkRequestPDU()):
+                    repetitions = int(
+                        module.apiBulkPDU.getMaxRepetitions(pdu))
+                for _ in range(repetitions):
+                    for index, oid in enumerate(names):
+                        position = bisect.bisect_right(self.oids, oid)
+                        if position < len(self.oids):
+                            names[index] = self.oids[position]
+                            varbinds.append((names[index], self.value(
+                                module, names[index])))
+                        else:
+                            varbinds.append((oid, module.EndOfMibView()))
+
+            response_pdu = module.apiMessage.getPDU(response)
+            module.apiPDU.setErrorStatus(response_pdu, error_status)
+            module.apiPDU.setErrorIndex(response_pdu, error_index)
+            module.apiPDU.setVarBinds(response_pdu, varbinds)
+            self.sock.sendto(encoder.encode(response), address)
+
+
+class TestSNMPEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.agent = SNMPAgent()
+        cls.agent.start()
+
+    def probe(self, port=None):
+        return ProbeSNMP('127.0.0.1', port=port or self.agent.port,
+                         community='public', snmp_version=1,
+                         raise_errors=True, timeout=0.2, retries=1)
+
+    def test_walk_like_probe(self):
+        oids = {'names': ENTITY_NAME, 'cpu': CPU_USAGE}
+        engine = SNMPEngine()
+        request = engine.walk(self.probe(), oids, max_repetitions=2)
+        engine.run(timeout=10)
+        engine.close()
+
+        expected = self.probe().walk(oids)
+        self.assertIsNone(request.error)
+        for name in oids:
+            self.assertEqual([(value.oid, value.pretty(), value.row_index)
+                              for value in request.results[name]],
+                             [(value.oid, value.pretty(), value.row_index)
+                              for value in expected[name]])
+
+    def test_get_and_callback(self):
+        finished = []
+        engine = SNMPEngine()
+        engine.get(self.probe(), {'uptime': UPTIME},
+                   callback=finished.append)
+        requests = engine.run(timeout=10)
+        engine.close()
+
+        self.assertEqual(finished, requests)
+        self.assertEqual(requests[0].result()['uptime'].pretty(), '4200')
+
+    def test_target_without_answer(self):
+        silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        silent.bind(('127.0.0.1', 0))
+        engine = SNMPEngine()
+        requests = [
+            engine.walk(self.probe(silent.getsockname()[1]),
+                        {'names': ENTITY_NAME}),
+            engine.walk(self.probe(), {'names': ENTITY_NAME}),
+        ]
+        engine.run(timeout=10)
+        engine.close()
+        silent.close()
+
+        self.assertIn('No SNMP response', requests[0].error)
+        self.assertRaises(ProbeSNMP.SNMPError, requests[0].result)
+        self.assertEqual(len(requests[1].results['names']), 3)
+
+    def test_many_requests_per_target(self):
+        engine = SNMPEngine(max_pending_per_target=2)
+        for _ in range(20):
+            engine.get(self.probe(), {'uptime': UPTIME})
+        requests = engine.run(timeout=10)
+        engine.close()
+
+        self.assertEqual([request.error for request in requests],
+                         [None] * 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the SNMP GET of several OIDs."""
+
+import unittest
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.snmp import ProbeSNMP
+from t_SNMP_engine import SNMPAgent, UPTIME
+
+OIDS = {
+    'uptime': UPTIME,
+    'chassis': '1.3.6.1.2.1.47.1.1.1.1.7.1',
+    'outlet': '1.3.6.1.2.1.47.1.1.1.1.7.22',
+    'cpu': '1.3.6.1.2.1.47.1.1.1.1.7.30',
+    'cpu_usage': '1.3.6.1.4.1.9.9.109.1.1.1.1.8.1',
+}
+
+
+class TestBatchedGet(unittest.TestCase):
+    def get(self, oids, snmp_version=1, max_varbinds=None):
+        self.agent = SNMPAgent(max_varbinds)
+        self.agent.start()
+        probe = ProbeSNMP('127.0.0.1', port=self.agent.port,
+                          community='public', snmp_version=snmp_version,
+                          raise_errors=True, timeout=0.2, retries=1)
+        return dict((name, value.pretty())
+                    for name, value in probe.get(oids).iteritems())
+
+    def test_one_request(self):
+        results = self.get(OIDS)
+        self.assertEqual(self.agent.sizes, [5])
+        self.assertEqual(results['uptime'], '4200')
+        self.assertEqual(results['cpu'], 'CPU')
+        self.assertEqual(results['cpu_usage'], '12')
+
+    def test_too_big(self):
+        results = self.get(OIDS, max_varbinds=2)
+        self.assertEqual(self.agent.sizes, [5, 2, 3, 1, 2])
+        self.assertEqual(results, self.get(OIDS))
+
+    def test_missing_oid(self):
+        oids = dict(OIDS, missing='1.3.6.1.2.1.1.99.0')
+        for snmp_version in (0, 1):
+            results = self.get(oids, snmp_version)
+            self.assertIn('No Such Object', results['missing'])
+            self.assertEqual(results['cpu'], 'CPU')
+
+    def test_same_oid(self):
+        results = self.get({'uptime': UPTIME, 'sysuptime': UPTIME})
+        self.assertEqual(results, {'uptime': '4200', 'sysuptime': '4200'})
+
+
+if __name__ == '__main__':
+    unittest.main()
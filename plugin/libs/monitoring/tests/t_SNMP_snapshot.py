@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the SNMP device snapshot."""
+
+import unittest
+import shutil
+import tempfile
+import time
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.cache import ResponseCache
+from monitoring.nagios.probes import snmp
+from monitoring.nagios.probes.snmp import ProbeSNMP
+
+ENTITY_NAME = '1.3.6.1.2.1.47.1.1.1.1.7'
+CPU_USAGE = '1.3.6.1.4.1.9.9.109.1.1.1.1.8'
+UPTIME = '1.3.6.1.2.1.1.3.0'
+
+
+class FakeQuery(object):
+    """Record the SNMP queries instead of sending them."""
+    queries = []
+
+    def __init__(self, probe, oidstable, snmpcmd='get'):
+        self.oids = oidstable
+        self.snmpcmd = snmpcmd
+
+    def execute(self, max_repetitions=25):
+        self.queries.append((self.snmpcmd, sorted(self.oids.values())))
+        if self.snmpcmd == 'walk':
+            return dict((name, ['{0}.1'.format(oid)])
+                        for name, oid in self.oids.iteritems())
+        return dict((name, oid) for name, oid in self.oids.iteritems())
+
+
+class TestSNMPSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.query = snmp._SNMPQuery
+        snmp._SNMPQuery = FakeQuery
+        FakeQuery.queries = []
+
+    def tearDown(self):
+        snmp._SNMPQuery = self.query
+        shutil.rmtree(self.directory)
+
+    def probe(self, ttl=60):
+        return ProbeSNMP('127.0.0.1', community='public',
+                         cache=ResponseCache(self.directory, ttl=ttl))
+
+    def test_checks_share_the_snapshot(self):
+        self.probe().walk({'names': ENTITY_NAME})
+        result = self.probe().walk({'cpu': CPU_USAGE,
+                                    'names': ENTITY_NAME})
+        self.assertEqual(result['names'], ['{0}.1'.format(ENTITY_NAME)])
+        self.probe().walk({'cpu': CPU_USAGE})
+
+        # Only the missing column is polled for the second check
+        self.assertEqual(FakeQuery.queries, [('walk', [ENTITY_NAME]),
+                                             ('walk', [CPU_USAGE])])
+
+    def test_outdated_snapshot_polls_all_oids(self):
+        self.probe().walk({'names': ENTITY_NAME})
+        self.probe().get({'uptime': UPTIME})
+        time.sleep(1.1)
+
+        result = self.probe(ttl=1).walk({'cpu': CPU_USAGE})
+        self.assertEqual(result, {'cpu': ['{0}.1'.format(CPU_USAGE)]})
+        self.assertEqual(FakeQuery.queries[-2:], [
+            ('get', [UPTIME]),
+            ('walk', sorted([ENTITY_NAME, CPU_USAGE]))])
+
+    def test_snapshot_by_device(self):
+        self.probe().walk({'names': ENTITY_NAME})
+        ProbeSNMP('127.0.0.2', community='public',
+                  cache=ResponseCache(self.directory)).walk(
+            {'names': ENTITY_NAME})
+        self.assertEqual(len(FakeQuery.queries), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the SNMP table joins."""
+
+import unittest
+import sys
+
+from pysnmp.proto import rfc1902
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.snmp import _OidValue, SNMPTable
+
+TEMP_VALUE = '1.3.6.1.4.1.9.9.91.1.1.1.1.4'
+TEMP_TYPE = '1.3.6.1.4.1.9.9.91.1.1.1.1.1'
+ENTITY_NAME = '1.3.6.1.2.1.47.1.1.1.1.7'
+
+
+def walked(prefix, values):
+    """Build the walk results of a column from ``{index: value}``."""
+    prefix = rfc1902.ObjectName(prefix)
+    results = []
+    for index, value in sorted(values.items()):
+        if isinstance(value, int):
+            value = rfc1902.Integer(value)
+        else:
+            value = rfc1902.OctetString(value)
+        results.append(_OidValue((prefix + (index,), value), prefix))
+    return results
+
+
+class SNMPTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.results = {
+            'temp_values': walked(TEMP_VALUE, {22: 45, 23: 61, 24: 30,
+                                               101: 90}),
+            'temp_types': walked(TEMP_TYPE, {22: 8, 23: 8, 24: 12, 101: 8}),
+            'names': walked(ENTITY_NAME, {22: 'Outlet', 23: 'Inlet',
+                                          24: 'Fan'}),
+        }
+
+    def test_join_on_index(self):
+        table = SNMPTable(self.results, ['temp_values', 'temp_types'],
+                          {'names': None})
+        self.assertEqual([row.index for row in table],
+                         ['22', '23', '24', '101'])
+        self.assertEqual(table.rows[1]['names'].pretty(), 'Inlet')
+        self.assertEqual(int(table.rows[1]['temp_types'].value), 8)
+        self.assertIsNone(table.rows[3]['names'])
+
+    def test_lookup_by_column_value(self):
+        self.results['pointers'] = walked('1.3.6.1.4.1.9.9.109.1.1.1.1.2',
+                                          {1: 22, 2: 24})
+        table = SNMPTable(self.results, ['pointers'], {'names': 'pointers'})
+        self.assertEqual([row['names'].pretty() for row in table],
+                         ['Outlet', 'Fan'])
+
+    def test_evaluate(self):
+        table = SNMPTable(self.results, ['temp_values', 'temp_types'])
+        rows = [row for row in table if int(row['temp_types'].value) == 8]
+        results = table.evaluate(lambda row: int(row['temp_values'].value),
+                                 45, 60, rows=rows)
+        self.assertEqual([(status, row.index, value)
+                          for status, row, value in results],
+                         [('ok', '22', 45), ('critical', '23', 61),
+                          ('critical', '101', 90)])
+
+    def test_evaluate_thresholds_by_row(self):
+        table = SNMPTable(self.results, ['temp_values'])
+        warning = lambda row: 80 if row.index == '101' else 40
+        statuses = [status for status, _, _ in
+                    table.evaluate('temp_values', warning, 95)]
+        self.assertEqual(statuses, ['warning', 'warning', 'ok', 'warning'])
+
+
+if __name__ == '__main__':
+    unittest.main()
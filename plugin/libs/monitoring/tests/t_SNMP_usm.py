@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the cache of the SNMPv3 security data."""
+
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+import sys
+
+sys.path.insert(0, "..")
+from pysnmp.entity.rfc3413.oneliner import cmdgen
+
+from monitoring.nagios.probes import ProbeSNMP
+from monitoring.nagios.probes.snmpusm import UsmCache, prime_generator, \
+    export_generator
+
+ENTRY = {
+    'engine_id': '8000000001020304',
+    'context_engine_id': '8000000001020304',
+    'context_name': '',
+    'auth_key': '79bf916ef2969ccfa5b30a677a6420bb',
+    'priv_key': '',
+    'engine_boots': 2,
+    'engine_time': 100,
+    'stored': 0,
+}
+
+
+def make_probe(password='authpassword1'):
+    return ProbeSNMP('127.0.0.1', snmp_version=2, login='nagios',
+                     password=password,
+                     auth_protocol=cmdgen.usmHMACMD5AuthProtocol,
+                     raise_errors=True)
+
+
+class TestUsmCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = UsmCache(os.path.join(self.directory, 'usm'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store_load_invalidate(self):
+        probe = make_probe()
+        self.assertIsNone(self.cache.load(probe))
+        self.cache.store(probe, ENTRY)
+        self.assertEqual(self.cache.load(probe), ENTRY)
+        self.cache.invalidate(probe)
+        self.assertIsNone(self.cache.load(probe))
+
+    def test_private_files(self):
+        probe = make_probe()
+        self.cache.store(probe, ENTRY)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache.directory).st_mode),
+                         0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache._path(probe))
+                                      .st_mode), 0o600)
+
+    def test_new_password(self):
+        self.cache.store(make_probe(), ENTRY)
+        self.assertIsNone(self.cache.load(make_probe('authpassword2')))
+
+
+class TestPrimeGenerator(unittest.TestCase):
+    def test_round_trip(self):
+        probe = make_probe()
+        generator = cmdgen.AsynCommandGenerator()
+        self.assertTrue(prime_generator(generator, probe, ENTRY))
+
+        # pysnmp must not hash the passwords again
+        generator.cfgCmdGen(probe.auth_data(), probe.udp_transport)
+
+        entry = export_generator(generator, probe)
+        for key in ('engine_id', 'context_engine_id', 'auth_key', 'priv_key',
+                    'engine_boots'):
+            self.assertEqual(entry[key], ENTRY[key])
+        self.assertGreater(entry['engine_time'], ENTRY['engine_time'])
+
+    def test_unknown_agent(self):
+        probe = make_probe()
+        generator = cmdgen.AsynCommandGenerator()
+        self.assertIsNone(export_generator(generator, probe))
+
+
+class FakeGenerator(object):
+    """Command generator answering the given error indications in turn."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+    def getCmd(self, *args, **kwargs):
+        return self.errors.pop(0), 0, 0, []
+
+
+class TestCommand(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = UsmCache(os.path.join(self.directory, 'usm'))
+        self.probe = make_probe()
+        self.probe.usm_cache = self.cache
+        self.cache.store(self.probe, ENTRY)
+        self.probe._usm_primed = True
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_command(self, *errors):
+        generator = FakeGenerator(*errors)
+        self.probe.command_generator = lambda use_usm_cache=True: generator
+        result = self.probe.command('getCmd')
+        return result[0], generator.errors
+
+    def test_timeout_keeps_cache(self):
+        self.assertEqual(self.run_command('requestTimedOut', None),
+                         ('requestTimedOut', [None]))
+        self.assertEqual(self.cache.load(self.probe), ENTRY)
+
+    def test_usm_error_discovers_again(self):
+        self.assertEqual(self.run_command('notInTimeWindow',
+                                          'requestTimedOut'),
+                         ('requestTimedOut', []))
+        self.assertIsNone(self.cache.load(self.probe))
+
+
+if __name__ == '__main__':
+    unittest.main()
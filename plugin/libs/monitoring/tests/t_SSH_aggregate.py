@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Test module for the remote aggregation helpers of the SSH probe."""
+
+import pipes
+import string
+import subprocess
+import unittest
+import sys
+
+sys.path.insert(0, "..")
+from monitoring.nagios.probes.secureshell import ProbeSSH, Aggregate
+
+MOUNTS = r"""rootfs / rootfs rw 0 0
+/dev/sda1 / ext4 rw,relatime 0 0
+/dev/sr0 /media/cdrom iso9660 ro,nosuid 0 0
+/dev/sdb1 /data ext4 ro,relatime 0 0
+/dev/sdc1 /data.backup xfs ro 0 0
+tmpfs /run tmpfs rw,size=1024k 0 0
+"""
+
+
+class LocalResult(object):
+    """Result of a command run by :class:`LocalProbe`."""
+    def __init__(self, command):
+        process = subprocess.Popen(['sh', '-c', command],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        output, errors = process.communicate()
+        self.output = map(string.strip, output.splitlines())
+        self.errors = map(string.strip, errors.splitlines())
+        self.status = process.returncode
+
+
+class LocalProbe(ProbeSSH):
+    """SSH probe running its commands with the local shell."""
+    def __init__(self):
+        self.commands = []
+
+    def execute(self, command, timeout=None):
+        self.commands.append(command)
+        return LocalResult(command)
+
+
+class TestAggregation(unittest.TestCase):
+    def setUp(self):
+        self.ssh = LocalProbe()
+        self.mounts = "printf '%s' {0}".format(pipes.quote(MOUNTS))
+
+    def test_matching_lines(self):
+        count, lines = self.ssh.matching_lines(
+            self.mounts, where='$3 !~ /iso9660/ && $4 ~ /(^|,)ro($|,)/')
+        self.assertEqual(count, 2)
+        self.assertEqual([line.split()[1] for line in lines],
+                         ['/data', '/data.backup'])
+
+    def test_limit_and_pattern(self):
+        count, lines = self.ssh.matching_lines(self.mounts,
+                                               pattern=r' /data\.', limit=1)
+        self.assertEqual((count, len(lines)), (1, 1))
+        count, lines = self.ssh.matching_lines(self.mounts, exclude='^/dev',
+                                               limit=1)
+        self.assertEqual((count, lines), (2, ['rootfs / rootfs rw 0 0']))
+        self.assertEqual(self.ssh.count_lines(self.mounts, pattern='ro,'), 2)
+        self.assertEqual(self.ssh.count_lines('true'), 0)
+
+    def test_count_by(self):
+        self.assertEqual(self.ssh.count_by(self.mounts, '$3'),
+                         {'rootfs': 1, 'ext4': 2, 'iso9660': 1, 'xfs': 1,
+                          'tmpfs': 1})
+        self.assertEqual(self.ssh.count_by('true', '$1'), {})
+
+    def test_aggregate(self):
+        values = "printf 'a:2\\nb:10\\na:5\\na:3000000000\\n'"
+        results = self.ssh.aggregate(values, key='$1', value='$2',
+                                     separator=':')
+        self.assertEqual(results, {'a': Aggregate(3, 3000000007, 2,
+                                                  3000000000),
+                                   'b': Aggregate(1, 10, 10, 10)})
+        self.assertEqual(self.ssh.aggregate(self.mounts)[''].count, 6)
+
+    def test_failed(self):
+        self.assertRaises(ProbeSSH.SSHCommandFailed, self.ssh.aggregate,
+                          'true', key='$(')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,15 +22,29 @@
 
 """
 This plugin check AD 2012 application using a XML interface.
+
+In ``multi`` mode, several metrics are checked against one download of the
+XML. Each ``--spec`` is ``MODE,TAG,LABEL[,KEY=VALUE...]`` with the keys
+``warning``, ``critical`` and ``unit`` (``decimal`` and ``memory`` modes) or
+``regexp`` (``dns`` mode, must be the last one), for example::
+
+    check_ad_xml.py -H dc01 multi \\
+        -s 'decimal,processortime,CPU,warning=80,critical=90,unit=%' \\
+        -s 'dns,dnstest,DNS,regexp=.*Failed'
+
+The results are returned together with all the perfdata, or submitted as
+passive check results with ``--command-file``, the label being the service
+description.
 """
 
 from __future__ import division
 
 import logging
-import operator
 import argparse
 import re
+import time
 import traceback
+from collections import namedtuple
 
 from decimal import Decimal, localcontext
 
@@ -38,6 +52,118 @@ from monitoring.nagios.plugin import NagiosPluginHTTP, argument
 
 logger = logging.getLogger('plugin')
 
+MODES = ('decimal', 'dns', 'memory', 'session')
+
+# Worst first, to sort the results of the multi mode
+STATUSES = ('critical', 'warning', 'unknown', 'ok')
+STATUS_CODES = {'ok': 0, 'warning': 1, 'critical': 2, 'unknown': 3}
+
+PASSIVE_RESULT = '[{0}] PROCESS_SERVICE_CHECK_RESULT;{1};{2};{3};{4}\n'
+
+
+class MetricSpec(namedtuple('MetricSpec', 'mode tag label unit warning '
+                                          'critical regexp')):
+    """What to check in the XML and how."""
+    __slots__ = ()
+
+
+class Result(namedtuple('Result', 'label status output longoutput perfdata')):
+    """Result of a :class:`MetricSpec`, ``status`` is a Nagios status name."""
+    __slots__ = ()
+
+
+class MetricError(Exception):
+    """Raised when a metric cannot be evaluated."""
+    def __init__(self, message, longoutput=None):
+        super(MetricError, self).__init__(message)
+        self.message = message
+        self.longoutput = longoutput or []
+
+
+def parse_spec(value):
+    """
+    Argument type for ``MODE,TAG,LABEL[,KEY=VALUE...]`` specs.
+
+    >>> parse_spec('decimal,ProcessorTime,CPU,critical=90,unit=%')
+    MetricSpec(mode='decimal', tag='processortime', label='CPU', unit='%', \
+warning=None, critical=<...NagiosThreshold object at ...>, regexp=None)
+    """
+    fields = value.split(',', 3)
+    if len(fields) < 3:
+        raise argparse.ArgumentTypeError(
+            'invalid spec {0!r}, expected MODE,TAG,LABEL[,KEY=VALUE...]'.format(
+                value))
+    mode, tag, label = [field.strip() for field in fields[:3]]
+    if mode not in MODES:
+        raise argparse.ArgumentTypeError(
+            'invalid mode {0!r} in spec {1!r}, choose from {2}'.format(
+                mode, value, ', '.join(MODES)))
+
+    options = {'unit': '', 'warning': None, 'critical': None, 'regexp': None}
+    rest = fields[3] if len(fields) > 3 else ''
+    while rest:
+        key, _, rest = rest.partition('=')
+        key = key.strip()
+        # The regexp may contain commas, it takes the end of the spec
+        if key == 'regexp':
+            option, rest = rest, ''
+        else:
+            option, _, rest = rest.partition(',')
+        if key not in options:
+            raise argparse.ArgumentTypeError(
+                'invalid key {0!r} in spec {1!r}'.format(key, value))
+        try:
+            if key in ('warning', 'critical'):
+                option = argument.NagiosThreshold(option)
+            elif key == 'regexp':
+                option = re.compile(option)
+        except Exception as e:
+            raise argparse.ArgumentTypeError(
+                'invalid {0} in spec {1!r}: {2}'.format(key, value, e))
+        options[key] = option
+
+    if mode == 'dns' and options['regexp'] is None:
+        raise argparse.ArgumentTypeError(
+            'missing regexp in dns spec {0!r}'.format(value))
+
+    return MetricSpec(mode, tag.lower(), label, **options)
+
+
+class TagIndex(object):
+    """
+    Direct lookups of the tags below the server tag.
+
+    The first descendant of each name is indexed in one pass over the tree
+    and the dotted paths are split once, so that a path like ``a.b`` gives
+    the same tag as ``server_tag.a.b`` without searching the whole tree for
+    each metric.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.first = {}
+        self.paths = {}
+        for element in root.descendants:
+            name = getattr(element, 'name', None)
+            if name and name not in self.first:
+                self.first[name] = element
+
+    def compile(self, path):
+        """Return the names of the dotted ``path``."""
+        names = self.paths.get(path)
+        if names is None:
+            names = self.paths[path] = path.split('.')
+        return names
+
+    def find(self, path):
+        """Return the tag at the dotted ``path``, or ``None``."""
+        names = self.compile(path)
+        element = self.first.get(names[0])
+        for name in names[1:]:
+            if element is None:
+                break
+            element = element.find(name)
+        return element
+
 
 # Define new args
 class PluginAd2012(NagiosPluginHTTP):
@@ -49,14 +175,8 @@ class PluginAd2012(NagiosPluginHTTP):
         try:
             self.__http_response = self.http.get(self.options.path)
             self.__xml = self.__http_response.xml()
-            self.status = None
             self.server_tag = self.__xml.find_all('server')[0]
-            self.shortoutput_pattern = '{label}: {value} {unit} {threshold}'
-            self.shortoutput_vars = {
-                'label': self.options.label,
-                'unit': self.options.unit,
-                'threshold': '',
-            }
+            self.tags = TagIndex(self.server_tag)
         except Exception:
             self.shortoutput = "Something unexpected happend " \
                 "when init the class. Please investigate..."
@@ -141,25 +261,178 @@ class PluginAd2012(NagiosPluginHTTP):
             description='Use this mode to detect if there are logon sessions.',
             parents=[common_arguments])
 
+        # Several metrics
+        mode_multi = checkmodes.add_parser(
+            'multi',
+            description='Check several metrics from one download of the XML.')
+        mode_multi.add_argument('-s', '--spec',
+                                dest='specs',
+                                action='append',
+                                type=parse_spec,
+                                default=[],
+                                help='Metric to check, as MODE,TAG,LABEL'
+                                     '[,KEY=VALUE...]. Repeat it for each '
+                                     'metric.')
+        mode_multi.add_argument('-f', '--spec-file',
+                                dest='spec_file',
+                                help='File with one spec per line, empty '
+                                     'lines and lines starting with # are '
+                                     'ignored.')
+        mode_multi.add_argument('--no_perfdata',
+                                action='store_true',
+                                help='Disable performance data.',
+                                required=False)
+        mode_multi.add_argument('--command-file',
+                                dest='command_file',
+                                help='Submit the results as passive check '
+                                     'results to this Nagios command file.')
+        mode_multi.add_argument('--passive-host',
+                                dest='passive_host',
+                                help='Host name of the passive check results,'
+                                     ' default to the -H value.')
+
+    def verify_plugin_arguments(self):
+        super(PluginAd2012, self).verify_plugin_arguments()
+
+        if self.options.mode != 'multi':
+            return
+
+        if self.options.spec_file:
+            try:
+                with open(self.options.spec_file) as spec_file:
+                    for line in spec_file:
+                        line = line.strip()
+                        if line and not line.startswith('#'):
+                            self.options.specs.append(parse_spec(line))
+            except (IOError, argparse.ArgumentTypeError) as e:
+                self.unknown('Cannot read the spec file {0} !\n{1}'.format(
+                    self.options.spec_file, e))
+
+        if not self.options.specs:
+            self.unknown('No metric to check ! (option -s or -f)')
+
     def checkmode_decimal(self):
         """
         Fetch a tag value as a decimal and compare against thresholds.
         """
+        self.check_single()
+
+    def checkmode_memory(self):
+        """
+        Compute the used memory of the given value against the server total
+        memory.
+        """
+        self.check_single()
+
+    def checkmode_session(self):
+        """
+        Test there are logon sessions.
+        """
+        self.check_single()
+
+    def checkmode_dns(self):
+        """
+        Fetch DNS status in XML.
+        """
+        self.check_single()
+
+    def checkmode_multi(self):
+        """
+        Check all the specs and give the results to Nagios, as passive check
+        results if a command file is given.
+        """
+        results = [self.evaluate_spec(spec) for spec in self.options.specs]
+        counts = dict((status, 0) for status in STATUSES)
+        for result in results:
+            counts[result.status] += 1
+
+        for result in sorted(results,
+                             key=lambda r: STATUSES.index(r.status)):
+            output = result.output
+            if not output.startswith(result.label):
+                output = '{0}: {1}'.format(result.label, output)
+            self.longoutput.append('{0}: {1}'.format(result.status.upper(),
+                                                     output))
+
+        if self.options.command_file:
+            self.submit_passive_results(results)
+            self.shortoutput = '{0} results submitted to {1}'.format(
+                len(results), self.options.command_file)
+            self.ok(self.output(long_output_limit=None))
+
+        for result in results:
+            self.perfdata.extend(result.perfdata)
+
+        problems = ', '.join('{0} {1}'.format(counts[status], status)
+                             for status in STATUSES[:-1] if counts[status])
+        if problems:
+            self.shortoutput = '{0} of {1} metrics: {2}'.format(
+                len(results) - counts['ok'], len(results), problems)
+        else:
+            self.shortoutput = 'All {0} metrics are OK'.format(len(results))
+
+        status = next(status for status in STATUSES if counts[status])
+        getattr(self, status)(self.output(long_output_limit=None))
+
+    def check_single(self):
+        """Check the metric given by the options of the single modes."""
+        spec = MetricSpec(self.options.mode,
+                          self.options.tag,
+                          self.options.label,
+                          self.options.unit,
+                          getattr(self.options, 'warning', None),
+                          getattr(self.options, 'critical', None),
+                          getattr(self.options, 'regexp', None))
+        try:
+            result = self.evaluate(spec)
+        except MetricError as e:
+            self.shortoutput = e.message
+            self.longoutput = e.longoutput
+            self.unknown(self.output())
+
+        self.shortoutput = result.output
+        self.longoutput.extend(result.longoutput)
+        self.perfdata.extend(result.perfdata)
+
+        # Done
+        getattr(self, result.status)(self.output())
+
+    def evaluate(self, spec):
+        """
+        Evaluate ``spec`` with the ``evaluate_<mode>`` method.
+
+        :raises MetricError: if the metric cannot be evaluated.
+        :returns: a :class:`Result`.
+        """
+        return getattr(self, 'evaluate_{}'.format(spec.mode))(spec)
+
+    def evaluate_spec(self, spec):
+        """Like :meth:`evaluate` but errors give an unknown result."""
+        try:
+            return self.evaluate(spec)
+        except MetricError as e:
+            logger.debug('Error with {0}: {1}'.format(spec, e.longoutput))
+            return Result(spec.label, 'unknown',
+                          '{0}: {1}'.format(spec.label, e.message), [], [])
+
+    def evaluate_decimal(self, spec):
+        """Fetch a tag value as a decimal and compare against thresholds."""
         with localcontext() as ctx:
             ctx.prec = 3
 
             try:
-                value = Decimal(self.get_tag_content(self.options.tag))
+                value = Decimal(self.get_tag_content(spec.tag))
+            except MetricError:
+                raise
             except Exception:
-                self.shortoutput = "Something unexpected happend in " \
-                    "checkmode_decimal. Please investigate..."
-                self.longoutput = traceback.format_exc().splitlines()
-                self.unknown(self.output())
+                raise MetricError(
+                    "Something unexpected happend in "
+                    "checkmode_decimal. Please investigate...",
+                    traceback.format_exc().splitlines())
 
-        self.shortoutput_vars['value'] = value
-        self.test_and_exit(value)
+        return self.test_thresholds(spec, value)
 
-    def checkmode_memory(self):
+    def evaluate_memory(self, spec):
         """
         Compute the used memory of the given value against the server total
         memory.
@@ -168,129 +441,119 @@ class PluginAd2012(NagiosPluginHTTP):
             # Use a context precision of 3 for all decimal operations
             ctx.prec = 3
             try:
-                mem_used = Decimal(self.get_tag_content(self.options.tag)) / \
-                    1024
+                mem_used = Decimal(self.get_tag_content(spec.tag)) / 1024
                 total_physical_memory = Decimal(
                     self.get_tag_content('totalvisiblememorysize'))
                 used_mem_percent = Decimal(
                     (mem_used / total_physical_memory) * 100)
+            except MetricError:
+                raise
             except Exception:
-                self.shortoutput = "Something unexpected happend in " \
-                    "checkmode_decimal. Please investigate..."
-                self.longoutput = traceback.format_exc().splitlines()
-                self.unknown(self.output())
+                raise MetricError(
+                    "Something unexpected happend in "
+                    "checkmode_memory. Please investigate...",
+                    traceback.format_exc().splitlines())
 
-        self.shortoutput_vars['value'] = used_mem_percent
+        return self.test_thresholds(spec, used_mem_percent)
 
-        self.test_and_exit(used_mem_percent)
-
-    def checkmode_session(self):
-        """
-        Test there are logon sessions.
-        """
-
-        tag_content = self.get_tag_content(self.options.tag)
-        self.shortoutput_pattern = '{message}'
-        self.shortoutput_vars = {
-            'message': ''
-        }
-        self.status = self.ok
+    def evaluate_session(self, spec):
+        """Test there are logon sessions."""
+        tag_content = self.get_tag_content(spec.tag)
 
         if "No Connection" in tag_content:
-            self.shortoutput_vars['message'] = "No active logon session."
-        else:
-            self.shortoutput_vars['message'] = "Active logon sessions found."
-            self.longoutput.append(tag_content)
-
-        self.terminate()
-
-    def checkmode_dns(self):
-        """
-        Fetch DNS status in XML.
-        """
-        value = self.get_tag_content(self.options.tag)
+            return Result(spec.label, 'ok', "No active logon session.",
+                          [], [])
+        return Result(spec.label, 'ok', "Active logon sessions found.",
+                      [tag_content], [])
+
+    def evaluate_dns(self, spec):
+        """Fetch DNS status in XML and match it against the regexp."""
+        value = self.get_tag_content(spec.tag)
         value = value.strip('\n')
-        self.shortoutput_vars['value'] = value
-        self.test_regexp_and_exit(self.options.regexp, value)
+        status = 'critical' if spec.regexp.match(value) else 'ok'
+        return Result(spec.label, status,
+                      '{0}: {1} {2} '.format(spec.label, value, spec.unit),
+                      [], [])
 
     def get_tag_content(self, tag):
         """
         Get the content of a tag from the XML.
 
         :param tag: the tag name as a dotted notation for children.
+        :raises MetricError: if the tag is missing or empty.
         :returns: the content of a tag as a string.
         """
-        attrgetter = operator.attrgetter(tag)
+        element = self.tags.find(tag)
+        if element is None:
+            raise MetricError('Cannot determinate {0} value !'.format(tag),
+                              ['No tag {0} in the XML !'.format(tag)])
 
-        try:
-            tag_data = attrgetter(self.server_tag).text
-            if not isinstance(tag_data, basestring) or not len(tag_data):
-                raise AttributeError('The tag data is empty !')
+        tag_data = element.text
+        if not isinstance(tag_data, basestring) or not len(tag_data):
+            raise MetricError('Cannot determinate {0} value !'.format(tag),
+                              ['The tag data is empty !'])
 
-            logger.debug('Tag: {0}'.format(tag))
-            logger.debug('Tag Raw Data: {0}'.format(tag_data))
+        logger.debug('Tag: {0}'.format(tag))
+        logger.debug('Tag Raw Data: {0}'.format(tag_data))
 
-            return tag_data
-        except AttributeError as e:
-            self.shortoutput = 'Cannot determinate {0} value !'.format(tag)
-            self.longoutput = [str(e)]
-            self.unknown(self.output())
+        return tag_data
 
-    def test_and_exit(self, value):
+    def test_thresholds(self, spec, value):
         """
-        Test ``value`` against standard Nagios thresholds and exit with status
-        to Nagios.
+        Test ``value`` against standard Nagios thresholds.
 
         :param value: a decimal value to test.
         :type value: decimal
+        :returns: a :class:`Result`.
         """
         # Compare with the given thresholds and give the Nagios satus
-        if self.options.critical is not None \
-           and self.options.critical.test(value):
-            self.status = self.critical
-            self.shortoutput_vars['threshold'] = "({})".format(
-                self.options.critical)
-        elif self.options.warning is not None \
-                and self.options.warning.test(value):
-            self.status = self.warning
-            self.shortoutput_vars['threshold'] = "({})".format(
-                self.options.warning)
+        threshold = ''
+        if spec.critical is not None and spec.critical.test(value):
+            status = 'critical'
+            threshold = "({})".format(spec.critical)
+        elif spec.warning is not None and spec.warning.test(value):
+            status = 'warning'
+            threshold = "({})".format(spec.warning)
         else:
-            self.status = self.ok
+            status = 'ok'
 
         # Add performance data
+        perfdata = []
         if not self.options.no_perfdata:
-            self.perfdata.append(
-                "'{0}'={1}{2};;;0;".format(self.options.label,
-                                           value,
-                                           self.options.unit))
+            perfdata.append("'{0}'={1}{2};;;0;".format(spec.label,
+                                                       value,
+                                                       spec.unit))
+
+        return Result(spec.label, status,
+                      '{0}: {1} {2} {3}'.format(spec.label, value, spec.unit,
+                                                threshold),
+                      [], perfdata)
+
+    def submit_passive_results(self, results):
+        """Write ``results`` as passive check results to the command file."""
+        host = self.options.passive_host or self.options.hostname
+        timestamp = int(time.time())
+        commands = []
+        for result in results:
+            output = result.output
+            if result.longoutput:
+                output += '\n' + '\n'.join(result.longoutput)
+            if result.perfdata:
+                output += ' | ' + ' '.join(result.perfdata)
+            # Nagios reads one command per line, newlines are escaped
+            output = output.replace('\n', '\\n')
+            commands.append(PASSIVE_RESULT.format(
+                timestamp, host, result.label, STATUS_CODES[result.status],
+                output))
 
-        # Done
-        self.terminate()
-
-    def test_regexp_and_exit(self, regexp, value):
-        """
-        Test on ``regexp`` and ``value``. Returns status to Nagios.
-        """
-        if regexp.match(value):
-            self.status = self.critical
-        else:
-            self.status = self.ok
-        # Done
-        self.terminate()
-
-    def terminate(self):
-        """Terminate the plugin execution and give result to Nagios."""
-        if self.status:
-            # Format output
-            self.shortoutput = self.shortoutput_pattern.format(
-                **self.shortoutput_vars)
-            self.status(self.output())
-        else:
-            self.unknown('Unexpected error during plugin execution, please '
-                         'investigate with debug mode on.')
+        try:
+            with open(self.options.command_file, 'a') as command_file:
+                command_file.write(''.join(commands))
+        except IOError as e:
+            self.unknown('Cannot write to the command file {0} !\n{1}'.format(
+                self.options.command_file, e))
 
-plugin = PluginAd2012(version='1.1.0', description='Checks for AD 2012.')
+plugin = PluginAd2012(version='1.2.0', description='Checks for AD 2012.')
 
 # Run the right check mode
 try:
@@ -19,10 +19,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #===============================================================================
 
-__version__ = '0.2.4'
+__version__ = '0.3.0'
 
 import hashlib
 import logging as log
+import os
+import pipes
 from pprint import pformat
 import re
 from datetime import datetime, timedelta
@@ -31,6 +33,20 @@ from monitoring.nagios.plugin import NagiosPluginSSH
 
 logger = log.getLogger('plugin')
 
+# Number of file names kept in retention to be shown in output
+FILES_SAMPLE = 20
+
+# Python regexp escapes that have an ERE equivalent
+ERE_ESCAPES = {
+    'd': '[0-9]',
+    'D': '[^0-9]',
+    'w': '[A-Za-z0-9_]',
+    'W': '[^A-Za-z0-9_]',
+    's': '[[:space:]]',
+    'S': '[^[:space:]]',
+}
+
+
 def format_time_from_arg(time_string):
     """
     Format a time string from args and return a datetime.
@@ -45,6 +61,54 @@ def format_time_from_arg(time_string):
     return check_time
 
 
+def regexp_to_ere(pattern):
+    r"""
+    Translate a Python regexp to a POSIX extended regexp for grep -E.
+
+    Only used to filter files on the remote server, the Python regexp is
+    still applied on the result. Return None if the pattern uses syntax that
+    cannot be translated (groups extensions, backreferences, anchors like
+    \b...).
+
+    >>> regexp_to_ere(r'^data_\d{8}\.csv$')
+    '^data_[0-9]{8}\\.csv$'
+    >>> regexp_to_ere(r'(?i)data') is None
+    True
+    """
+    ere = []
+    in_class = False
+    chars = iter(pattern)
+    for char in chars:
+        if in_class:
+            # Escapes have no meaning in ERE bracket expressions
+            if char == '\\':
+                return None
+            in_class = char != ']' or ere[-1] == '['
+            ere.append(char)
+        elif char == '[':
+            in_class = True
+            ere.append(char)
+        elif char == '\\':
+            escaped = next(chars, '')
+            if escaped in ERE_ESCAPES:
+                ere.append(ERE_ESCAPES[escaped])
+            elif escaped and not escaped.isalnum():
+                ere.append('\\' + escaped)
+            else:
+                return None
+        elif char == '?' and ere and ere[-1] in ('(', '*', '+', '?', '}'):
+            # Extensions (?...) and lazy quantifiers
+            return None
+        else:
+            ere.append(char)
+    return ''.join(ere)
+
+
+def fingerprint(filename):
+    """Return a 64 bits fingerprint of a file name."""
+    return int(hashlib.md5(filename).hexdigest()[:16], 16)
+
+
 class PluginCheckFileExistence(NagiosPluginSSH):
     """
     Plugin customization class.
@@ -57,12 +121,19 @@ class PluginCheckFileExistence(NagiosPluginSSH):
         # this plugin.
         pickle_pattern = '%s_%s_%s' % (self.options.hostname, self.options.regexp.pattern, self.options.directory)
         self.picklefile_pattern = hashlib.md5(pickle_pattern).hexdigest()
+        self.picklefile = '{0}/{1}_{2}.pkl'.format(self._picklefile_path,
+                                                   self._picklefile_name,
+                                                   self.picklefile_pattern)
 
         self.has_check_period = False
         self.in_check_period = False
+
+        # Files already seen are kept as fingerprints, with only a few names
+        # for the output.
         self.flags = {
             'DoneForToday': False,
             'NotYetPresent': None,
+            'Seen': set(),
             'Files': [],
         }
 
@@ -93,7 +164,6 @@ class PluginCheckFileExistence(NagiosPluginSSH):
                                        dest='etime',
                                        type=format_time_from_arg,
                                        help='Check end time. Do not check for files above this time.')
-
     def verify_plugin_arguments(self):
         super(PluginCheckFileExistence, self).verify_plugin_arguments()
 
@@ -121,7 +191,38 @@ class PluginCheckFileExistence(NagiosPluginSSH):
         elif (self.options.stime and not self.options.etime) or (not self.options.stime and self.options.etime):
             self.unknown('Missing start/end time information, check syntax !')
 
-    def search_files(self, files):
+    def load_flags(self):
+        """Load the flags of the check period."""
+        # Before 0.3.0 all the services of a host shared the default retention
+        # file, so its flags cannot be told apart: it is removed.
+        legacy = '{0}/{1}_p.pkl'.format(self._picklefile_path,
+                                        self._picklefile_name)
+        try:
+            os.remove(legacy)
+            logger.debug('Removed old retention file %s.', legacy)
+        except OSError:
+            pass
+
+        try:
+            return self.load_data()
+        except IOError:
+            return self.flags
+
+    def search_files(self):
+        """
+        List files matching the regexp in the directory. Names are filtered on
+        the remote server when the regexp can be translated for grep.
+        """
+        directory = pipes.quote(self.options.directory)
+        ere = regexp_to_ere(self.options.regexp.pattern)
+        if ere is not None:
+            command = 'find {0} -maxdepth 1 | grep -E -e {1}'.format(
+                directory, pipes.quote(ere))
+        else:
+            command = 'find {0} -maxdepth 1'.format(directory)
+        logger.debug('Remote command: %s' % command)
+        files = self.ssh.execute(command).output
+
         found = []
         regexp = self.options.regexp
         for file in files:
@@ -134,14 +235,6 @@ class PluginCheckFileExistence(NagiosPluginSSH):
 plugin = PluginCheckFileExistence(description='Check on remote server if some files are present using SSH.',
                          version=__version__)
 
-# Look for files on the remote server.
-files = plugin.ssh.list_files(plugin.options.directory)
-logger.debug('Retrieve files list:')
-logger.debug(pformat(files))
-
-# Search files using the regexp
-found_files = plugin.search_files(files)
-
 # Should we check if plugin must be executed ?
 status = None
 message = ''
@@ -149,34 +242,41 @@ if plugin.has_check_period:
     # Check period defined
 
     # Load previous state
-    try:
-        flags = plugin.load_data()
-    except IOError:
-        flags = plugin.flags
+    flags = plugin.load_flags()
 
     if plugin.in_check_period:
         if flags['DoneForToday']:
+            # Nothing to list anymore today
             status = plugin.ok
             message =   '%d files have already been checked today.\n'\
                         'The following files have been found:\n'\
-                        '%s' % (len(flags['Files']), '\n'.join(flags['Files']))
+                        '%s' % (len(flags['Seen']), '\n'.join(flags['Files']))
         else:
-            if found_files:
-                if len(found_files) >= plugin.options.count:
-                    flags['Files'] = found_files
+            # Look for files on the remote server, files received in previous
+            # checks of the period are counted even if they are gone.
+            for found_file in plugin.search_files():
+                file_id = fingerprint(found_file)
+                if file_id not in flags['Seen']:
+                    flags['Seen'].add(file_id)
+                    if len(flags['Files']) < FILES_SAMPLE:
+                        flags['Files'].append(found_file)
+            nfiles = len(flags['Seen'])
+
+            if nfiles:
+                if nfiles >= plugin.options.count:
                     flags['DoneForToday'] = True
                     flags['NotYetPresent'] = None
                     status = plugin.ok
                     message =   '%d files with regexp \"%s\" have been found in \"%s\".\n'\
                                 'The following files have been found:\n'\
-                                '%s' % (len(found_files),
+                                '%s' % (nfiles,
                                         plugin.options.regexp.pattern,
                                         plugin.options.directory,
-                                        '\n'.join(found_files))
+                                        '\n'.join(flags['Files']))
                 else:
                     status = plugin.critical
                     message = 'Only %d files with regexp \"%s\" have been found in \"%s\".'\
-                              'Should be at least %d.\n' % (len(found_files),
+                              'Should be at least %d.\n' % (nfiles,
                                                             plugin.options.regexp.pattern,
                                                             plugin.options.directory,
                                                             plugin.options.count)
@@ -196,6 +296,8 @@ if plugin.has_check_period:
             minutes, seconds = divmod(remainder, 60)
 
             flags['DoneForToday'] = False
+            flags['Seen'] = set()
+            flags['Files'] = []
             status = plugin.ok
             message = 'Nothing to do. Will start to do something in %s hours, %s mins and %s secs.' % (hours,
                                                                                                        minutes,
@@ -207,6 +309,7 @@ if plugin.has_check_period:
     plugin.save_data(flags)
 else:
     # No check period, run all the time
+    found_files = plugin.search_files()
     if found_files:
         if len(found_files) >= plugin.options.count:
             status = plugin.ok
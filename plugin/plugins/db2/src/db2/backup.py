@@ -53,24 +53,18 @@ class CheckBackup(BasePlugin):
         # Final status exit for the plugin
         status = None
 
-        cmd = \
-            """echo \"db2 """ \
-            """\\"SELECT unique(END_TIME) FROM SYSIBMADM.DB_HISTORY """ \
-            """WHERE COMMENT like \'%ONLINE%\' and SQLCODE is null """ \
-            """order by end_time desc\\"\" """ \
-            """| sudo -u {0} -i """ \
-            """| sed -n \'/--/{{n; p;}}\' """ \
-            """| sed \'s/[ ][ ]*//g\'""".format(self.options.db2_user)
-
-        output = self.run_command(cmd)
-
-        # Travel output cmd by line
+        # Only the last online backup is checked
+        end_times = sorted(set(backup.end_time
+                               for backup in self.records('history')
+                               if backup.online and backup.end_time),
+                           reverse=True)[:1]
+
+        # Travel backups
         cmpt = 0
-        for line in output:
-            self.logger.debug(line)
+        for end_time in end_times:
+            self.logger.debug(end_time)
 
             status = self.ok
-            end_time = datetime.strptime(line.strip(), '%Y%m%d%H%M%S')
 
             delta_time = now - end_time
             hours, remains = divmod(int(delta_time.total_seconds()), 3600)
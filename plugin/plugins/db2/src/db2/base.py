@@ -25,6 +25,9 @@ import logging
 import traceback
 
 from monitoring.nagios.plugin import NagiosPluginSSH
+from monitoring.nagios.cache import ResponseCache, CacheError
+
+from .snapshot import build_script, parse_snapshot, SnapshotError
 
 
 class BasePlugin(NagiosPluginSSH):
@@ -32,6 +35,7 @@ class BasePlugin(NagiosPluginSSH):
     def __init__(self, *args, **kwargs):
         super(BasePlugin, self).__init__(*args, **kwargs)
         self.logger = logging.getLogger('plugin.db2')
+        self._snapshot = None
 
     def run(self):
         """Run the plugin."""
@@ -53,6 +57,62 @@ class BasePlugin(NagiosPluginSSH):
                                         dest="db2_user",
                                         help="Db2 user use, an string",
                                         required=True)
+        self.parser.add_argument('--cache-ttl',
+                                 dest='cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help='Share the DB2 snapshot between checks '
+                                      'of the instance for this number of '
+                                      'seconds (default to 0, no cache)')
+
+    def records(self, section):
+        """
+        Return the records of a section of the DB2 snapshot, see
+        :mod:`db2.snapshot`.
+        """
+        try:
+            return self.snapshot(section).records(section)
+        except SnapshotError as e:
+            self.unknown(str(e))
+
+    def snapshot(self, section):
+        """
+        Collect the DB2 snapshot in one SSH command.
+
+        Without cache, only ``section`` is collected. With a cache, all the
+        sections are, so that the other checks of the instance can use it.
+        """
+        if self._snapshot is not None:
+            return self._snapshot
+
+        if not self.options.cache_ttl:
+            self._snapshot = parse_snapshot("\n".join(
+                self.run_command(build_script(self.options.db2_user,
+                                              [section]))))
+            return self._snapshot
+
+        url = 'db2://{0}/{1}'.format(self.options.hostname,
+                                     self.options.db2_user)
+        try:
+            cache = ResponseCache(ttl=self.options.cache_ttl)
+            cached = cache.lookup(url, fresh=True, parser=parse_snapshot)
+            if cached is None:
+                with cache.lock(url):
+                    # Another check may have collected it while we waited
+                    cached = cache.lookup(url, fresh=True,
+                                          parser=parse_snapshot)
+                    if cached is None:
+                        content = "\n".join(self.run_command(
+                            build_script(self.options.db2_user)))
+                        cached = cache.store(url, content,
+                                             parser=parse_snapshot)
+            self.logger.debug("DB2 snapshot from cache: {0}".format(
+                cached.from_cache))
+        except CacheError as e:
+            self.unknown("Cannot use the DB2 snapshot cache: {0}".format(e))
+
+        self._snapshot = cached.parsed
+        return self._snapshot
 
     def run_command(self, cmd):
         """
@@ -45,32 +45,15 @@ class CheckDatabaseLog(BasePlugin):
         # Final status exit for the plugin
         status = None
 
-        # Returns 3 fields:
-        # "log used %" "Total log used/MB" "Total log available/MB"
-        cmd = \
-            """echo "db2 \\"SELECT CASE (TOTAL_LOG_AVAILABLE) """\
-            """WHEN -1 THEN DEC(-1,5,2) """\
-            """ELSE DEC(100 * (FLOAT(TOTAL_LOG_USED)/""" \
-            """FLOAT(TOTAL_LOG_USED + TOTAL_LOG_AVAILABLE)), 5,2) END, """\
-            """TOTAL_LOG_USED / 1024/1024, """ \
-            """CASE (TOTAL_LOG_AVAILABLE) """ \
-            """WHEN -1 THEN -1 """ \
-            """ELSE TOTAL_LOG_AVAILABLE / 1024/1024 END """ \
-            """FROM SYSIBMADM.SNAPDB \\"" """ \
-            """| sudo -u {0} -i """ \
-            """| sed -n '/--/{{n; p;}}' """ \
-            """| sed 's/[ ][ ]*/ /g'""".format(self.options.db2_user)
-
-        output = self.run_command(cmd)
-
-        # Travel output cmd by line
+        # Only the first database member is checked
         cmpt = 0
-        for line in output:
-            self.logger.debug("line : {0}".format(line))
+        for usage in self.records('log')[:1]:
+            self.logger.debug("usage : {0}".format(usage))
 
             status = self.ok
-            log_use, total_log_use, total_log_available = line.split()
-            log_used = float(log_use)
+            log_used = usage.used_percent
+            total_log_use = usage.used_mb
+            total_log_available = usage.available_mb
 
             self.shortoutput = "Database Log Used {} % ( {} / {} MB)".format(
                 log_used, total_log_use, total_log_available)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+DB2 snapshot collection.
+
+All the data needed by the DB2 plugins is collected by one remote shell,
+running as the instance owner, that queries the ``SYSIBMADM`` administrative
+views with delimited output. The result is parsed into typed records, grouped
+by section, so that it can be shared between the checks of one instance with
+:class:`monitoring.nagios.cache.ResponseCache`.
+"""
+
+import re
+from collections import namedtuple
+from datetime import datetime
+
+DB2_TIME_FORMAT = '%Y%m%d%H%M%S'
+
+DEVICE_TYPES = {
+    'A': 'TSM',
+    'C': 'Client',
+    'D': 'Disk',
+    'F': 'Snapshot',
+    'O': 'Vendor_device',
+    'S': 'Server',
+    'T': 'Tape',
+}
+
+# Successful backups and online operations recorded in the history file
+HISTORY_QUERY = \
+    "SELECT operation || '|' || start_time || '|' || " \
+    "COALESCE(end_time, '') || '|' || RTRIM(CHAR(seqnum)) || '|' || " \
+    "COALESCE(devicetype, '') || '|' || " \
+    "CASE WHEN comment LIKE '%ONLINE%' THEN 'Y' ELSE 'N' END || '|' || " \
+    "COALESCE(location, '') " \
+    "FROM SYSIBMADM.DB_HISTORY " \
+    "WHERE sqlcode IS NULL AND (operation = 'B' OR comment LIKE '%ONLINE%') " \
+    "ORDER BY end_time DESC"
+
+# Log usage of each database member, in bytes
+LOG_QUERY = \
+    "SELECT RTRIM(CHAR(total_log_used)) || '|' || " \
+    "RTRIM(CHAR(total_log_available)) " \
+    "FROM SYSIBMADM.SNAPDB"
+
+FCMCLI = './sqllib/acs/fcmcli'
+
+# Section name -> shell command run by the instance owner
+SECTIONS = [
+    ('history', 'db2 -x "{0}" 2>&1'.format(HISTORY_QUERY)),
+    ('log', 'db2 -x "{0}" 2>&1'.format(LOG_QUERY)),
+    ('vtl', 'if [ -x {0} ]; then {0} -f inquire_detail 2>&1 | grep BACKUP; '
+            'else echo "{0} not found"; (exit 127); fi'.format(FCMCLI)),
+]
+
+SECTION_MARK = '@@section '
+STATUS_MARK = '@@status '
+
+
+class SnapshotError(Exception):
+    """Raised when a section of the snapshot could not be collected."""
+    pass
+
+
+class Backup(namedtuple('Backup', 'operation start_time end_time seqnum '
+                                  'device_type location online')):
+    """A successful operation of the DB2 history file."""
+    __slots__ = ()
+
+    @property
+    def device(self):
+        """Name of the backup device type."""
+        return DEVICE_TYPES.get(self.device_type, 'Unknown')
+
+
+class LogUsage(namedtuple('LogUsage', 'used available')):
+    """Log space used and available in bytes, available is -1 if infinite."""
+    __slots__ = ()
+
+    @property
+    def used_percent(self):
+        if self.available == -1 or not self.used + self.available:
+            return -1.0
+        return round(100.0 * self.used / (self.used + self.available), 2)
+
+    @property
+    def used_mb(self):
+        return self.used // 1048576
+
+    @property
+    def available_mb(self):
+        if self.available == -1:
+            return -1
+        return self.available // 1048576
+
+
+class VTLBackup(namedtuple('VTLBackup', 'state snapshot_time offload_time '
+                                        'targetset')):
+    """A FlashCopy Manager backup offloaded to tape."""
+    __slots__ = ()
+
+    @property
+    def failed(self):
+        return self.state == 'TAPE_BACKUP_FAILED'
+
+
+class Section(namedtuple('Section', 'records error')):
+    """Records of one section, or the error message if it failed."""
+    __slots__ = ()
+
+
+class Snapshot(object):
+    """
+    All the sections collected in one remote execution.
+
+    :param sections: dict of section name -> :class:`Section`.
+    """
+    def __init__(self, sections):
+        self.sections = sections
+
+    def records(self, name):
+        """
+        Return the records of the section ``name``.
+
+        :raises SnapshotError: if the section is missing or failed.
+        """
+        try:
+            section = self.sections[name]
+        except KeyError:
+            raise SnapshotError('Section {0} was not collected !'.format(name))
+        if section.error is not None:
+            raise SnapshotError(section.error)
+        return section.records
+
+
+def build_script(db2_user, sections=None):
+    """
+    Return the command collecting ``sections`` (all by default) in one
+    ``sudo`` session of ``db2_user``.
+    """
+    sections = sections or [name for name, _ in SECTIONS]
+    lines = ['sudo -u {0} -i <<\'__DB2_SNAPSHOT__\''.format(db2_user)]
+    for name, command in SECTIONS:
+        if name in sections:
+            lines.append("echo '{0}{1}'".format(SECTION_MARK, name))
+            lines.append(command)
+            lines.append('echo "{0}$?"'.format(STATUS_MARK))
+    lines.append('__DB2_SNAPSHOT__')
+    return '\n'.join(lines)
+
+
+def _history(lines):
+    backups = []
+    for line in lines:
+        if '|' not in line:
+            continue
+        operation, start, end, seqnum, device_type, online, location = \
+            line.split('|', 6)
+        backups.append(Backup(
+            operation,
+            datetime.strptime(start.strip(), DB2_TIME_FORMAT),
+            datetime.strptime(end.strip(), DB2_TIME_FORMAT)
+            if end.strip() else None,
+            int(seqnum),
+            device_type.strip(),
+            location.strip(),
+            online == 'Y'))
+    return backups
+
+
+def _log(lines):
+    return [LogUsage(*[int(value) for value in line.split('|')])
+            for line in lines if '|' in line]
+
+
+def _vtl(lines):
+    # Records span several lines, each record starts with a '#' line
+    records = '%'.join(lines).replace('%#', '\n#').replace('%', ' ')
+    backups = []
+    for record in records.splitlines():
+        state = re.search(r'TAPE_BACKUP_(COMPLETE|FAILED)', record)
+        if not state:
+            continue
+        fields = record.split()
+        backups.append(VTLBackup(
+            state.group(0),
+            datetime.strptime(fields[2], DB2_TIME_FORMAT),
+            datetime.strptime(fields[3], DB2_TIME_FORMAT),
+            fields[6]))
+    return backups
+
+
+_PARSERS = {
+    'history': _history,
+    'log': _log,
+    'vtl': _vtl,
+}
+
+
+def parse_snapshot(content):
+    """
+    Parse the output of the :func:`build_script` command.
+
+    A section fails if its command returned an error (DB2 CLP return codes 4
+    and 8) or if its output cannot be parsed; the other ones are still usable.
+
+    :returns: a :class:`Snapshot`.
+    """
+    raw = {}
+    name = None
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith(SECTION_MARK):
+            name = line[len(SECTION_MARK):]
+            raw[name] = [[], None]
+        elif name is None:
+            continue
+        elif line.startswith(STATUS_MARK):
+            raw[name][1] = int(line[len(STATUS_MARK):])
+            name = None
+        elif line:
+            raw[name][0].append(line)
+
+    sections = {}
+    for name, (lines, status) in raw.iteritems():
+        if status is None or status >= 4:
+            sections[name] = Section(None, 'Error collecting {0} (return '
+                                           'code {1}):\n{2}'.format(
+                                               name, status, '\n'.join(lines)))
+            continue
+        try:
+            sections[name] = Section(_PARSERS[name](lines), None)
+        except (ValueError, IndexError) as e:
+            sections[name] = Section(None, 'Cannot parse {0} output: {1}\n'
+                                           '{2}'.format(name, e,
+                                                        '\n'.join(lines)))
+    return Snapshot(sections)
@@ -24,6 +24,7 @@ from datetime import datetime
 from monitoring.nagios.plugin import argument
 
 from .base import BasePlugin
+from .snapshot import DB2_TIME_FORMAT
 
 
 class CheckTSMBackup(BasePlugin):
@@ -58,58 +59,32 @@ class CheckTSMBackup(BasePlugin):
         # Final status exit for the plugin
         status = None
 
-        cmd = \
-            """echo \"db2 \\"SELECT start_time,end_time,seqnum,location, """ \
-            """case """ \
-            """when devicetype = 'A' then 'TSM' """ \
-            """when devicetype = 'C' then 'Client' """ \
-            """when devicetype = 'D' then 'Disk' """ \
-            """when devicetype = 'F' then 'Snapshot' """ \
-            """when devicetype = 'O' then 'Vendor_device' """ \
-            """when devicetype = 'S' then 'Server' """ \
-            """when devicetype = 'T' then 'Tape' """ \
-            """else 'Unknown' """ \
-            """end as OPERATION_TYPE FROM SYSIBMADM.DB_HISTORY """ \
-            """WHERE operation='B' and devicetype = '{1}' """ \
-            """and sqlcode is null """ \
-            """order by seqnum,start_time desc fetch first row only\\"" """ \
-            """| sudo -u {0} -i """ \
-            """| sed -n '/--/{{n; p;}}' """ \
-            """| sed 's/[ ][ ]*/ /g' """ \
-            """| sed 's/^\\s*$/NO_DATA/g'""".format(self.options.db2_user,
-                                                    self.options.backup_type)
-
-        output = self.run_command(cmd)
-
-        if 'NO_DATA' in output:
+        # Last backup of the first stream on this device type
+        backups = sorted([backup for backup in self.records('history')
+                          if backup.operation == 'B' and
+                          backup.device_type == self.options.backup_type],
+                         key=lambda backup: backup.start_time, reverse=True)
+        backups.sort(key=lambda backup: backup.seqnum)
+
+        if not backups:
             self.critical("No backup has been found ! ")
 
-        # Travel output cmd by line
+        # Travel backups
         cmpt = 0
-        for line in output:
-            self.logger.debug(line)
+        for backup in backups[:1]:
+            self.logger.debug(backup)
 
             status = self.ok
 
-            try:
-                db2_start_time, db2_end_time, db2_seqnum, \
-                    db2_location, db2_operation_type = line.split()
-            except ValueError as e:
-                self.unknown('The number of fields is incorrectly !'
-                             '\nException message: {}'.format(e))
-            try:
-                end_time = datetime.strptime(db2_end_time.strip(),
-                                             '%Y%m%d%H%M%S')
-            except ValueError as e:
-                self.unknown('End datetime is incorrectly formatted !'
-                             '\nException message: {}'.format(e))
-
-            try:
-                start_time = datetime.strptime(db2_start_time.strip(),
-                                               '%Y%m%d%H%M%S')
-            except ValueError as e:
-                self.unknown('Start datetime is incorrectly formatted !'
-                             '\nException message: {}'.format(e))
+            start_time = backup.start_time
+            end_time = backup.end_time
+            if end_time is None:
+                self.unknown('End datetime of the backup is missing !')
+            db2_start_time = start_time.strftime(DB2_TIME_FORMAT)
+            db2_end_time = end_time.strftime(DB2_TIME_FORMAT)
+            db2_seqnum = backup.seqnum
+            db2_location = backup.location
+            db2_operation_type = backup.device
 
             self.logger.debug("start_time : {}".format(start_time))
 
@@ -23,6 +23,7 @@ from datetime import datetime
 from time import time, mktime
 
 from .base import BasePlugin
+from .snapshot import DB2_TIME_FORMAT
 
 
 class CheckVTLBackup(BasePlugin):
@@ -57,58 +58,37 @@ class CheckVTLBackup(BasePlugin):
         self.logger.debug("now_time: {}".format(now_time))
         self.logger.debug("now_sec: {}".format(now_sec))
 
-        cmd = \
-            """echo $(echo""" \
-            """ "./sqllib/acs/fcmcli -f inquire_detail" """ \
-            """| sudo -u {0} -i""" \
-            """| grep BACKUP""" \
-            """| tr "\\n" "\\%" """ \
-            """| sed -e "s/\%\#/\\\\\\n\#/g" -e "s/ *\% */ /g")""" \
-            """| grep -E "TAPE_BACKUP_COMPLETE|TAPE_BACKUP_FAILED" """.format(
-                self.options.db2_user)
-        self.logger.debug("cmd: {0}".format(cmd))
-
-        try:
-            output = self.run_command(cmd)
-        except ValueError as e:
-            self.unknown('The command is error!'
-                         '\nException message: {}'.format(e))
-
-        self.logger.debug("output: {}".format(output))
+        backups = self.records('vtl')
+        self.logger.debug("backups: {}".format(backups))
+        if not backups:
+            self.unknown('No TSM VTL backup found in fcmcli output !')
 
         # To check if there is a backup failed.
         tag = 0
-        if "TAPE_BACKUP_FAILED" in "".join(output):
+        if any(backup.failed for backup in backups):
             tag = 1
 
-        # Get the first line as the new new one.
-        temp_time = "".join(output).split()[2]
-        temp_time_sec = mktime(datetime.timetuple(
-            datetime.strptime(temp_time, '%Y%m%d%H%M%S')))
+        # Get the first backup as the new new one.
+        temp_time_sec = mktime(backups[0].snapshot_time.timetuple())
         temp_sec = now_sec - temp_time_sec
 
-        for line in output:
-            self.logger.debug("line: {}".format(line))
+        for backup in backups:
+            self.logger.debug("backup: {}".format(backup))
 
-            try:
-                warn_time = line.split()[2]
-                crit_time = line.split()[3]
-                targetset = line.split()[6]
-                self.logger.debug("warn_time: {}".format(warn_time))
-                self.logger.debug("crit_time: {}".format(crit_time))
-                self.logger.debug("targetset: {}".format(targetset))
-
-            except ValueError as e:
-                self.unknown('The warning and critical time is wrong!'
-                             '\nException message: {}'.format(e))
+            warn_time = backup.snapshot_time.strftime(DB2_TIME_FORMAT)
+            crit_time = backup.offload_time.strftime(DB2_TIME_FORMAT)
+            targetset = backup.targetset
+            self.logger.debug("warn_time: {}".format(warn_time))
+            self.logger.debug("crit_time: {}".format(crit_time))
+            self.logger.debug("targetset: {}".format(targetset))
 
             # If there is a backup failed, the result is critical.
-            if "TAPE_BACKUP_FAILED" in line:
+            if backup.failed:
                 name = "TAPE_BACKUP_FAILED"
                 status = self.critical
                 self.shortoutput = "TSM VTL Backup status is critical."
 
-            elif "TAPE_BACKUP_COMPLETE" in line:
+            else:
                 name = "TAPE_BACKUP_COMPLETE"
                 # If there is a backup failed, the result is critical.
                 if tag:
@@ -118,41 +98,34 @@ class CheckVTLBackup(BasePlugin):
                 else:
                     status = self.ok
                     self.shortoutput = "TSM VTL Backup status is OK."
-                    try:
-                        warn_time_sec = mktime(datetime.timetuple(
-                            datetime.strptime(warn_time, '%Y%m%d%H%M%S')))
-                        crit_time_sec = mktime(datetime.timetuple(
-                            datetime.strptime(crit_time, '%Y%m%d%H%M%S')))
-                        self.logger.debug("warn_time_sec:{}".format(
-                            warn_time_sec))
-                        self.logger.debug("crit_time_sec:{}".format(
-                            crit_time_sec))
-
-                        warn_sec = now_sec - warn_time_sec
-                        crit_sec = now_sec - crit_time_sec
-                        self.logger.debug("warn_sec: {}".format(warn_sec))
-                        self.logger.debug("crit_sec: {}".format(crit_sec))
-
-                        if warn_sec <= temp_sec:
-                            temp_sec = warn_sec
-                            self.logger.debug("temp_sec: {}".format(temp_sec))
-
-                            # Check threshold
-                            if self.options.warning:
-                                if warn_sec >= self.options.warning:
-                                    status = self.warning
-                                    self.shortoutput = "TSM VTL Backup status \
-                                        is warning."
-
-                            if self.options.critical:
-                                if crit_sec >= self.options.critical:
-                                    status = self.critical
-                                    self.shortoutput = "TSM VTL Backup status \
-                                        is critical."
-
-                    except ValueError as e:
-                        self.unknown('The warning and critical value is wrong!'
-                                     '\nException message: {}'.format(e))
+                    warn_time_sec = mktime(backup.snapshot_time.timetuple())
+                    crit_time_sec = mktime(backup.offload_time.timetuple())
+                    self.logger.debug("warn_time_sec:{}".format(
+                        warn_time_sec))
+                    self.logger.debug("crit_time_sec:{}".format(
+                        crit_time_sec))
+
+                    warn_sec = now_sec - warn_time_sec
+                    crit_sec = now_sec - crit_time_sec
+                    self.logger.debug("warn_sec: {}".format(warn_sec))
+                    self.logger.debug("crit_sec: {}".format(crit_sec))
+
+                    if warn_sec <= temp_sec:
+                        temp_sec = warn_sec
+                        self.logger.debug("temp_sec: {}".format(temp_sec))
+
+                        # Check threshold
+                        if self.options.warning:
+                            if warn_sec >= self.options.warning:
+                                status = self.warning
+                                self.shortoutput = \
+                                    "TSM VTL Backup status is warning."
+
+                        if self.options.critical:
+                            if crit_sec >= self.options.critical:
+                                status = self.critical
+                                self.shortoutput = \
+                                    "TSM VTL Backup status is critical."
 
             self.longoutput.append(
                 "{0}: Consistency group {1},"
@@ -0,0 +1,74 @@
+"""Test the check against canned ElasticSearch API responses."""
+
+import imp
+import os
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+check_elasticsearch = imp.load_source(
+    'check_elasticsearch', os.path.join(TESTS_DIR, '../check_elasticsearch'))
+
+from nagioscheck import Status
+
+HEALTH = {
+    'cluster_name': 'test',
+    'status': 'green',
+    'number_of_nodes': 1,
+    'number_of_data_nodes': 1,
+    'active_shards': 0,
+    'relocating_shards': 0,
+    'initializing_shards': 0,
+    'unassigned_shards': 0,
+}
+
+
+class FakeClient(check_elasticsearch.ESClient):
+    """ESClient answering canned responses by path, without query string."""
+    responses = {}
+
+    def get_json(self, path):
+        return self.responses[path.split('?')[0]]
+
+    def iter_lines(self, path, chunk_size=65536):
+        return iter(self.responses[path.split('?')[0]])
+
+
+class Options(object):
+    failure_domain = None
+    host = None
+    master_nodes = None
+    port = None
+
+
+class ElasticSearchCheckTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = check_elasticsearch.ESClient
+        check_elasticsearch.ESClient = FakeClient
+
+    def tearDown(self):
+        check_elasticsearch.ESClient = self.client
+
+    def check(self, responses):
+        FakeClient.responses = responses
+        with self.assertRaises(Status) as status:
+            check_elasticsearch.ElasticSearchCheck().check(Options(), [])
+        return status.exception
+
+    def test_empty_cluster(self):
+        """Test a cluster without indices, omitted by filtered responses."""
+        status = self.check({
+            '/': {'version': {'number': '1.7.3'}},
+            '/_cluster/health': HEALTH,
+            '/_cluster/state/nodes,metadata': {
+                'nodes': {'n1': {'name': 'node'}}},
+            '/_cat/shards': [],
+            '/_nodes/_local/stats': {
+                'nodes': {'n1': {'indices': {'docs': {'count': 0},
+                                             'store': {'size_in_bytes': 0}}}}},
+        })
+        self.assertEqual(status.status, Status.EXIT_OK)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,8 +22,12 @@
 import logging
 import datetime
 from urllib2 import urlopen, HTTPError
+from StringIO import StringIO
+
+from requests.exceptions import RequestException
 
 from monitoring.nagios.plugin import NagiosPlugin
+from monitoring.nagios.cache import ResponseCache, CacheError
 
 
 logger = logging.getLogger("plugin.exalead.base")
@@ -55,10 +59,23 @@ class ExaleadBase(NagiosPlugin):
                                         dest='baseport',
                                         default='10000',
                                         help='Base port of Exalead instance')
+        self.parser.add_argument('--cache-ttl',
+                                 dest='cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help='Share the status XML between checks '
+                                      'for this number of seconds (default '
+                                      'to 0, no cache)')
 
     def getXMLData(self):
         logger.debug('Get XML data:')
         logger.debug("\tURL: {0}".format(self.url))
+        if self.options.cache_ttl:
+            try:
+                cache = ResponseCache(ttl=self.options.cache_ttl)
+                return StringIO(cache.get(self.url).content)
+            except (RequestException, CacheError) as error:
+                raise self.unknown('Error fetching URL: {0}'.format(error))
         try:
             url = urlopen(self.url)
         except HTTPError as error:
@@ -31,48 +31,73 @@ class XMLTable(BaseXML):
     """
     Represents as a table the XML results from Powershell XML export cmdlet.
 
+    The column names and the values are read in one pass over the XML and
+    kept in a flat list, row after row. The dict of a row is only built when
+    it is needed.
+
     :param xml: XML file handle or string.
     :type xml: str, unicode, file
     """
+    name_attribute = 'propertyName'
+    value_attribute = 'propertyValue'
+
     def __init__(self, xml):
         super(XMLTable, self).__init__(xml)
-        if self.columns and self._entries:
-            self._table = self._build_table()
-        else:
-            raise XMLValidityError('No tabular data found !')
-
-    @property
-    def columns(self):
-        """Returns the list of available column names in the table."""
-        return [c.string for c in self.xml.find_all('s', n='propertyName')]
 
-    @property
-    def _entries(self):
-        """Returns the list of all entries in the table."""
-        return [e.string for e in self.xml.find_all('s', n='propertyValue')]
+        #: List of available column names in the table.
+        self.columns = []
+        self._entries = []
+        self._extract()
 
-    def _build_table(self):
-        """
-        Build the table.
-
-        Each entries is a dict with ``{column: value}``.
-        """
-        table = []
-        index = 0
-        entry = {}
-        num_cols = len(self.columns)
+        if not self.columns or not self._entries:
+            raise XMLValidityError('No tabular data found !')
 
-        for value in self._entries:
-            column = self.columns[index]
+        # Incomplete last row is ignored
+        self._num_rows = len(self._entries) // len(self.columns)
+        self._rows = [None] * self._num_rows
 
-            entry.update({column: value})
-            index = (index + 1) % num_cols
+        # Position of each column in a row, the last one wins for duplicate
+        # names, like when updating the row dict
+        self._positions = dict((column, position) for position, column
+                               in enumerate(self.columns))
 
-            if index == 0:
-                table.append(entry)
-                entry = {}
+        # Per column, row numbers of each distinct value
+        self._indexes = {}
 
-        return table
+    def _extract(self):
+        """Read column names and values in document order."""
+        names = (self.name_attribute, self.value_attribute)
+        for tag in self.xml.find_all('s', n=names):
+            if tag['n'] == self.name_attribute:
+                self.columns.append(tag.string)
+            else:
+                self._entries.append(tag.string)
+
+    def row(self, number):
+        """Returns the entry dict ``{column: value}`` of row ``number``."""
+        entry = self._rows[number]
+        if entry is None:
+            start = number * len(self.columns)
+            entry = dict(zip(self.columns,
+                             self._entries[start:start + len(self.columns)]))
+            self._rows[number] = entry
+        return entry
+
+    def column_values(self, column):
+        """Returns the list of values of ``column``, one per row."""
+        position = self._positions[column]
+        num_cols = len(self.columns)
+        return self._entries[position:self._num_rows * num_cols:num_cols]
+
+    def _index(self, column):
+        """Returns the ``{value: [row numbers]}`` index of ``column``."""
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for number, value in enumerate(self.column_values(column)):
+                index.setdefault(value, []).append(number)
+            self._indexes[column] = index
+        return index
 
     def match(self, column, regex, invert=False):
         """
@@ -82,6 +107,8 @@ class XMLTable(BaseXML):
             # Returns all entries dict where the result is not a success.
             match('Result', r'^Success$', invert=True)
 
+        The regex is tested once per distinct value of the column.
+
         :returns: a list of the dict entries found.
         """
         try:
@@ -89,20 +116,20 @@ class XMLTable(BaseXML):
         except re.error:
             raise
 
-        results = []
-        for result in self:
-            if pattern.match(result[column]):
-                if not invert:
-                    results.append(result)
-            else:
-                if invert:
-                    results.append(result)
-        return results
+        numbers = []
+        for value, rows in self._index(column).iteritems():
+            if bool(pattern.match(value)) != invert:
+                numbers.extend(rows)
+        return [self.row(number) for number in sorted(numbers)]
+
+    def __len__(self):
+        """Number of entries."""
+        return self._num_rows
 
     def __iter__(self):
         """Iterate over entries."""
-        return self._table.__iter__()
+        return (self.row(number) for number in xrange(self._num_rows))
 
     def __repr__(self):
         """Object representation as text."""
-        return repr(self._table)
+        return repr(list(self))
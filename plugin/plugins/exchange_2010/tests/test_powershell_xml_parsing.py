@@ -69,4 +69,50 @@ class PowershellXMLTestCase(unittest.TestCase):
         with self.assertRaisesRegexp(XMLValidityError,
                                      r'^No serialized object.*'):
             powershell.XMLSerializedTable(open(os.path.join(TESTS_DIR,
-                                                            'sample.xml')))
\ No newline at end of file
+                                                            'sample.xml')))
+
+
+class PowershellXMLTableTestCase(unittest.TestCase):
+    xml = """<Objs Version="1.1.0.1" xmlns="test">
+<S>1404834106,01814</S>
+<Obj RefId="0"><MS>
+<S N="propertyName">Scenario</S>
+<S N="propertyName">Result</S>
+<S N="propertyValue">Logon</S>
+<S N="propertyValue">Success</S>
+<S N="propertyValue">Mailbox</S>
+<S N="propertyValue">Failure</S>
+<S N="propertyValue">Search</S>
+<S N="propertyValue">Success</S>
+<S N="propertyValue">Incomplete</S>
+</MS></Obj>
+</Objs>"""
+
+    def setUp(self):
+        self.table = powershell.XMLTable(self.xml)
+
+    def test_columns(self):
+        """Test the column names are read in document order."""
+        self.assertEqual(self.table.columns, ['Scenario', 'Result'])
+
+    def test_rows(self):
+        """Test each row is a dict and the incomplete row is ignored."""
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(list(self.table),
+                         [{'Scenario': 'Logon', 'Result': 'Success'},
+                          {'Scenario': 'Mailbox', 'Result': 'Failure'},
+                          {'Scenario': 'Search', 'Result': 'Success'}])
+
+    def test_column_values(self):
+        """Test the values of a column."""
+        self.assertEqual(self.table.column_values('Scenario'),
+                         ['Logon', 'Mailbox', 'Search'])
+
+    def test_match(self):
+        """Test matching rows are returned in table order."""
+        self.assertEqual(
+            [e['Scenario'] for e in self.table.match('Result', r'^Success$')],
+            ['Logon', 'Search'])
+        self.assertEqual(
+            self.table.match('Result', r'^Success$', invert=True),
+            [{'Scenario': 'Mailbox', 'Result': 'Failure'}])
@@ -29,6 +29,7 @@ Perform Unit tests.
 import sys
 import os
 import unittest
+from datetime import datetime
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
 
@@ -38,6 +39,8 @@ from generic.parser.exceptions import RawValueNameError
 from generic.parser.json import JSONParser
 from generic.parser.json.exceptions import InvalidJSONData
 
+from generic.ftp import parse_mlsd_line, parse_list_line
+
 
 class ParserTest(unittest.TestCase):
     def setUp(self):
@@ -91,6 +94,44 @@ class JSONParserTest(unittest.TestCase):
         with self.assertRaises(TypeError):
             json_parser = JSONParser(self.json_invalid_raw_value)
 
+
+class FTPListingTest(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2015, 6, 1, 12, 0)
+
+    def test_mlsd_file(self):
+        entry = parse_mlsd_line(
+            "type=file;size=1024;modify=20150115100000.123; data 1.xml", "/in")
+        self.assertEqual("/in/data 1.xml", entry.path)
+        self.assertEqual(1024, entry.size)
+        self.assertEqual(datetime(2015, 1, 15, 10, 0), entry.modified)
+        self.assertFalse(entry.is_dir)
+
+    def test_mlsd_skip_current_dir(self):
+        self.assertIsNone(parse_mlsd_line("type=cdir;modify=20150115100000; "
+                                          "/in", "/in"))
+
+    def test_list_unix_recent(self):
+        entry = parse_list_line("-rw-r--r--   1 ftp ftp  12 Dec 31 23:00 a.txt",
+                                "/in", self.now)
+        self.assertEqual("a.txt", entry.name)
+        self.assertEqual(datetime(2014, 12, 31, 23, 0), entry.modified)
+
+    def test_list_unix_dir_with_year(self):
+        entry = parse_list_line("drwxr-xr-x   2 ftp ftp 4096 Jan 15  2014 old",
+                                "/in/", self.now)
+        self.assertEqual("/in/old", entry.path)
+        self.assertTrue(entry.is_dir)
+
+    def test_list_dos_file(self):
+        entry = parse_list_line("01-15-15  02:30PM               1234 b.xml",
+                                "/in", self.now)
+        self.assertEqual(1234, entry.size)
+        self.assertEqual(datetime(2015, 1, 15, 14, 30), entry.modified)
+
+    def test_list_unparsable(self):
+        self.assertIsNone(parse_list_line("total 42", "/in", self.now))
+
 if __name__ == '__main__':
     print "Performing tests...\n".upper()
     unittest.main(verbosity=2)
\ No newline at end of file
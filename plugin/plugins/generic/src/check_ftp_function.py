@@ -23,11 +23,14 @@
 
 import os
 import sys
-# import re
+import re
 import logging
 import argparse
 # import pickle
 import ftplib
+from datetime import timedelta
+
+from generic.ftp import FTPScanner
 
 
 class Nagios(object):
@@ -154,16 +157,21 @@ class Ftp(Nagios):
         super(Ftp, self).__init__(*args, **kwargs)
         self.logger.debug("Init Ftp")
 
+    def login(self):
+        """Return a new connection to ftp server, raise ftplib errors."""
+        ftp = ftplib.FTP()
+        ftp.connect(host=self.args.host,
+                    port=self.args.port,
+                    timeout=self.args.timeout)
+        ftp.login(user=self.args.user,
+                  passwd=self.args.password,
+                  acct=self.args.acct)
+        return ftp
+
     def connect(self):
         """Connect to ftp server."""
         try:
-            self.ftp = ftplib.FTP()
-            self.ftp.connect(host=self.args.host,
-                             port=self.args.port,
-                             timeout=self.args.timeout)
-            self.ftp.login(user=self.args.user,
-                           passwd=self.args.password,
-                           acct=self.args.acct)
+            self.ftp = self.login()
             return self.ftp
         except ftplib.Error as e:
             self.unknown("Can not connect to the ftp: %s" % e)
@@ -227,12 +235,43 @@ class FileNumber(Ftp):
                                     dest='path')
         self.fn_parser.add_argument('-r', '--regex',
                                     required=False,
+                                    type=re.compile,
                                     help='RE for filename or extension',
                                     dest='regex')
+        # A value used to be required, it is still accepted
         self.fn_parser.add_argument('-R', '--recursive',
+                                    nargs='?',
+                                    const=True,
+                                    default=False,
                                     required=False,
                                     help='Recursive count file under path.',
                                     dest='recursive')
+        self.fn_parser.add_argument('--workers',
+                                    default=1,
+                                    type=int,
+                                    required=False,
+                                    help='Parallel ftp connections used for '
+                                         'recursive count, default 1',
+                                    dest='workers')
+        self.fn_parser.add_argument('--min-age',
+                                    type=int,
+                                    required=False,
+                                    help='Only count files older than this '
+                                         'number of minutes.',
+                                    dest='min_age')
+        self.fn_parser.add_argument('--max-age',
+                                    type=int,
+                                    required=False,
+                                    help='Only count files younger than this '
+                                         'number of minutes.',
+                                    dest='max_age')
+        self.fn_parser.add_argument('--list-limit',
+                                    default=20,
+                                    type=int,
+                                    required=False,
+                                    help='Number of files shown in long '
+                                         'output, default 20',
+                                    dest='list_limit')
         self.fn_parser.add_argument('-w', '--warning',
                                     default=0,
                                     type=int,
@@ -248,23 +287,30 @@ class FileNumber(Ftp):
 
     def filenumber_handle(self):
         """Get the number of files in the folder"""
-        self.__results = []
-        self.__dirs = []
-        self.__files = []
-        self.__ftp = self.connect()
-        self.__ftp.dir(self.args.path, self.__results.append)
-        # self.logger.debug("dir results: {}".format(self.__results))
-        self.quit()
+        # Login errors of the additional connections must not end the check,
+        # the scanner goes on with the ones it has.
+        scanner = FTPScanner(self.login, workers=self.args.workers)
+        min_age = timedelta(minutes=self.args.min_age) \
+            if self.args.min_age is not None else None
+        max_age = timedelta(minutes=self.args.max_age) \
+            if self.args.max_age is not None else None
+
+        # Stream the entries, only keep the count and the first names
+        self.__result = 0
+        try:
+            for entry in scanner.scan(self.args.path,
+                                      recursive=self.args.recursive,
+                                      pattern=self.args.regex,
+                                      min_age=min_age,
+                                      max_age=max_age):
+                self.__result += 1
+                if self.__result <= self.args.list_limit:
+                    self.longoutput.append(entry.path)
+        except ftplib.all_errors as e:
+            self.unknown("Can not list {0}: {1}".format(self.args.path, e))
 
         status = self.ok
 
-        for data in self.__results:
-            if "<DIR>" in data:
-                self.__dirs.append(str(data.split()[3]))
-            else:
-                self.__files.append(str(data.split()[2]))
-
-        self.__result = len(self.__files)
         self.logger.debug("result: {}".format(self.__result))
 
         # Compare the vlaue.
@@ -276,7 +322,9 @@ class FileNumber(Ftp):
         # Output
         self.shortoutput = "Found {0} files in {1}.".format(self.__result,
                                                             self.args.path)
-        [self.longoutput.append(line) for line in self.__results if self.__results]
+        if self.__result > self.args.list_limit:
+            self.longoutput.append("(...showing only first {0} files...)".format(
+                self.args.list_limit))
         self.perfdata.append("{path}={result};{warn};{crit};0;".format(
             crit=self.args.critical,
             warn=self.args.warning,
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+FTP directory scanner.
+
+List remote directories with the machine-readable ``MLSD`` command when the
+server supports it, parsing ``LIST`` lines otherwise. Entries are streamed
+through the filters, optionally recursing in sub-directories with a small pool
+of parallel FTP connections.
+"""
+
+import re
+import ftplib
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+from Queue import Queue, Empty, Full
+
+logger = logging.getLogger('ftp')
+
+_MONTHS = dict((month, index + 1) for index, month in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+     'jul', 'aug', 'sep', 'oct', 'nov', 'dec']))
+
+# -rw-r--r--   1 owner group   1234 Jan 15 10:00 file name
+_UNIX_LIST = re.compile(r'^(?P<mode>[-dlbcps])\S*\s+\d+\s+\S+\s+\S+\s+'
+                        r'(?P<size>\d+)\s+(?P<month>\w{3})\s+(?P<day>\d+)\s+'
+                        r'(?:(?P<hour>\d+):(?P<minute>\d+)|(?P<year>\d{4}))\s'
+                        r'(?P<name>.+)$')
+
+# 01-15-15  10:00AM       <DIR>          name
+# 01-15-15  10:00AM                 1234 file name
+_DOS_LIST = re.compile(r'^(?P<month>\d+)-(?P<day>\d+)-(?P<year>\d+)\s+'
+                       r'(?P<hour>\d+):(?P<minute>\d+)(?P<ampm>[AP]M)?\s+'
+                       r'(?:(?P<dir><DIR>)|(?P<size>\d+))\s+(?P<name>.+)$',
+                       re.IGNORECASE)
+
+
+class FTPEntry(namedtuple('FTPEntry', 'path name type size modified')):
+    """
+    An entry of a remote directory.
+
+    ``type`` is either ``file`` or ``dir``, ``size`` is in bytes and
+    ``modified`` is a naive UTC :class:`datetime.datetime`. Both may be
+    ``None`` if the server does not tell.
+    """
+    __slots__ = ()
+
+    @property
+    def is_dir(self):
+        return self.type == 'dir'
+
+
+def _join(directory, name):
+    return '{0}/{1}'.format(directory.rstrip('/'), name)
+
+
+def parse_mlsd_line(line, directory):
+    """
+    Parse a ``MLSD`` line (RFC 3659) into a :class:`FTPEntry`.
+
+    >>> parse_mlsd_line('type=file;size=12;modify=20150115100000; a.txt', '/in')
+    FTPEntry(path='/in/a.txt', name='a.txt', type='file', size=12, \
+modified=datetime.datetime(2015, 1, 15, 10, 0))
+
+    :returns: the entry, or ``None`` for the ``.`` and ``..`` entries.
+    """
+    facts, _, name = line.partition(' ')
+    facts = dict(fact.lower().split('=', 1)
+                 for fact in facts.split(';') if '=' in fact)
+
+    entry_type = facts.get('type', 'file')
+    if entry_type in ('cdir', 'pdir') or name in ('.', '..'):
+        return None
+    if entry_type != 'dir':
+        entry_type = 'file'
+
+    size = facts.get('size')
+    modified = facts.get('modify')
+    if modified:
+        try:
+            modified = datetime.strptime(modified[:14], '%Y%m%d%H%M%S')
+        except ValueError:
+            modified = None
+
+    return FTPEntry(_join(directory, name), name, entry_type,
+                    int(size) if size else None, modified or None)
+
+
+def parse_list_line(line, directory, now=None):
+    """
+    Parse a human readable ``LIST`` line, Unix or DOS style.
+
+    >>> parse_list_line('01-15-15  10:00AM       <DIR>          logs', '/in')
+    FTPEntry(path='/in/logs', name='logs', type='dir', size=None, \
+modified=datetime.datetime(2015, 1, 15, 10, 0))
+
+    :returns: the entry, or ``None`` if the line cannot be parsed.
+    """
+    now = now or datetime.utcnow()
+
+    match = _UNIX_LIST.match(line)
+    if match:
+        fields = match.groupdict()
+        if fields['mode'] == 'l':
+            fields['name'] = fields['name'].split(' -> ')[0]
+        try:
+            month = _MONTHS[fields['month'].lower()]
+            if fields['year']:
+                modified = datetime(int(fields['year']), month,
+                                    int(fields['day']))
+            else:
+                modified = datetime(now.year, month, int(fields['day']),
+                                    int(fields['hour']),
+                                    int(fields['minute']))
+                # Recent files are shown without a year
+                if modified > now:
+                    modified = modified.replace(year=now.year - 1)
+        except (KeyError, ValueError):
+            modified = None
+        entry_type = 'dir' if fields['mode'] == 'd' else 'file'
+        size = int(fields['size'])
+    else:
+        match = _DOS_LIST.match(line)
+        if not match:
+            return None
+        fields = match.groupdict()
+        year = int(fields['year'])
+        if year < 100:
+            year += 2000 if year < 70 else 1900
+        hour = int(fields['hour']) % 12 if fields['ampm'] \
+            else int(fields['hour'])
+        if fields['ampm'] and fields['ampm'].upper() == 'PM':
+            hour += 12
+        try:
+            modified = datetime(year, int(fields['month']),
+                                int(fields['day']), hour,
+                                int(fields['minute']))
+        except ValueError:
+            modified = None
+        entry_type = 'dir' if fields['dir'] else 'file'
+        size = int(fields['size']) if fields['size'] else None
+
+    name = fields['name']
+    if name in ('.', '..'):
+        return None
+    return FTPEntry(_join(directory, name), name, entry_type, size, modified)
+
+
+class FTPScanner(object):
+    """
+    Scan remote directories and yield the files matching the filters.
+
+    :param connect: a callable that returns a new logged in
+                    :class:`ftplib.FTP` instance.
+    :param workers: number of parallel FTP connections used when scanning
+                    recursively. Default to 1. The first connection is
+                    opened by the caller, the others are given up if they
+                    cannot be opened (server limiting the connections...).
+    :type workers: int
+
+    **Example**::
+
+     scanner = FTPScanner(lambda: ftplib.FTP(host, user, passwd), workers=4)
+     for entry in scanner.scan('/in', recursive=True,
+                               pattern=re.compile(r'\\.xml$')):
+         print entry.path
+    """
+    queue_size = 10000
+
+    def __init__(self, connect, workers=1):
+        self.connect = connect
+        self.workers = max(1, workers)
+        self._use_mlsd = None
+
+    def scan(self, path, recursive=False, pattern=None, min_age=None,
+             max_age=None):
+        """
+        Generator of the files found in ``path``.
+
+        :param recursive: also scan sub-directories.
+        :param pattern: compiled regexp searched in the file names.
+        :param min_age: only files older than this timedelta.
+        :param max_age: only files younger than this timedelta.
+        """
+        now = datetime.utcnow()
+
+        def match(entry):
+            if entry.is_dir:
+                return False
+            if pattern is not None and not pattern.search(entry.name):
+                return False
+            if min_age is not None or max_age is not None:
+                if entry.modified is None:
+                    return False
+                age = now - entry.modified
+                if min_age is not None and age < min_age:
+                    return False
+                if max_age is not None and age > max_age:
+                    return False
+            return True
+
+        if recursive and self.workers > 1:
+            scan = self._scan_parallel(path, match)
+        else:
+            scan = self._scan_serial(path, recursive, match)
+        for entry in scan:
+            yield entry
+
+    def list(self, ftp, directory):
+        """Generator of all the entries of one remote ``directory``."""
+        if self._use_mlsd is None:
+            try:
+                self._use_mlsd = 'MLST' in ftp.sendcmd('FEAT').upper()
+            except ftplib.error_perm:
+                self._use_mlsd = False
+            logger.debug('MLSD is %ssupported.',
+                         '' if self._use_mlsd else 'not ')
+
+        if self._use_mlsd:
+            try:
+                for line in self._iter_lines(ftp, 'MLSD %s' % directory):
+                    entry = parse_mlsd_line(line, directory)
+                    if entry is not None:
+                        yield entry
+                return
+            except ftplib.error_perm as e:
+                if not str(e).startswith(('500', '502')):
+                    raise
+                logger.debug('MLSD refused, fallback to LIST: %s', e)
+                self._use_mlsd = False
+
+        now = datetime.utcnow()
+        for line in self._iter_lines(ftp, 'LIST %s' % directory):
+            entry = parse_list_line(line, directory, now)
+            if entry is not None:
+                yield entry
+
+    @staticmethod
+    def _iter_lines(ftp, command):
+        """Like :meth:`ftplib.FTP.retrlines` but as a generator."""
+        ftp.sendcmd('TYPE A')
+        conn = ftp.transfercmd(command)
+        fp = conn.makefile('rb')
+        try:
+            while True:
+                line = fp.readline()
+                if not line:
+                    break
+                yield line.rstrip('\r\n')
+        finally:
+            fp.close()
+            conn.close()
+        ftp.voidresp()
+
+    def _scan_serial(self, path, recursive, match):
+        ftp = self.connect()
+        try:
+            directories = [path]
+            while directories:
+                directory = directories.pop()
+                for entry in self.list(ftp, directory):
+                    if entry.is_dir:
+                        if recursive:
+                            directories.append(entry.path)
+                    elif match(entry):
+                        yield entry
+        finally:
+            _quit(ftp)
+
+    def _scan_parallel(self, path, match):
+        directories = Queue()
+        results = Queue(self.queue_size)
+        stop = threading.Event()
+        state = {'pending': 1}
+        lock = threading.Lock()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except Full:
+                    continue
+
+        def worker(ftp=None):
+            try:
+                ftp = ftp or self.connect()
+            except ftplib.all_errors as e:
+                logger.debug('Cannot open another FTP connection: %s', e)
+                return
+            try:
+                while not stop.is_set():
+                    try:
+                        directory = directories.get(timeout=0.1)
+                    except Empty:
+                        continue
+                    try:
+                        for entry in self.list(ftp, directory):
+                            if entry.is_dir:
+                                with lock:
+                                    state['pending'] += 1
+                                directories.put(entry.path)
+                            elif match(entry):
+                                put(entry)
+                    except ftplib.all_errors as e:
+                        put(e)
+                    finally:
+                        with lock:
+                            state['pending'] -= 1
+                            if not state['pending']:
+                                put(done)
+            finally:
+                _quit(ftp)
+
+        # First connection in the caller thread, to fail fast on login
+        directories.put(path)
+        threads = [threading.Thread(target=worker, args=(self.connect(),))]
+        threads.extend(threading.Thread(target=worker)
+                       for _ in range(self.workers - 1))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+
+def _quit(ftp):
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
@@ -6,6 +6,7 @@
 #
 # Usage: check_hacmp.py [-h] [--debug] [--version] -H HOSTNAME
 #                       [-g RG1 RG2 ...RGn] [-a RG]
+#                       [-n NODE1 NODE2 ...NODEn]
 #
 # Create: 23/11/2012
 # Author: BAILAT Patrick
@@ -14,13 +15,20 @@
 # Author: BAILAT Patrick
 # Object: check if SNMP query is empty
 #
+# Modify: 16/11/2015
+# Author: Canux CHENG
+# Object: build the resource group / node state matrix once, poll several
+#         cluster nodes concurrently and report when their views disagree.
+#
 ################################################################################
 
 import re
 import logging
+import threading
 import traceback
-from monitoring.nagios.plugin import NagiosPluginSNMP
 from collections import Counter
+from monitoring.nagios.plugin import NagiosPluginSNMP
+from monitoring.nagios.probes import ProbeSNMP
 import hacmp
 
 logger = logging.getLogger('plugin.hacmp')
@@ -41,6 +49,14 @@ class PluginHacmpRg(NagiosPluginSNMP):
                                         help="Check group of RG is on one node",
                                         required=False)
 
+        self.parser.add_argument('-n', '--nodes',
+                                 nargs='+',
+                                 dest="nodes",
+                                 default=[],
+                                 help="Other nodes of the cluster to query at "
+                                      "the same time, and compare their view "
+                                      "of the resource groups")
+
     def verify_plugin_arguments(self):
         super(PluginHacmpRg, self).verify_plugin_arguments()
 
@@ -49,27 +65,86 @@ class PluginHacmpRg(NagiosPluginSNMP):
             if len(self.options.rg) < 2:
                 self.unknown('argument -g should have two arguments at minimum !')
 
-# Object Resource
-class Resources(object):
-    all=[]
-    nodes = []
-    collection = None
-
-    def __init__(self,node,name_rg):
-        self.node=node
-        self.name=name_rg
-        Resources.all.append(self)
-        Resources.nodes.append(self.node)
-        Resources.collection = Counter(Resources.nodes)
-
-    @staticmethod
-    def find_rg_node(rg):
-        for r in Resources.all:
-            if re.search(rg, r.name):
-                return (r.node,r.name)
+
+class ResourceGroups(object):
+    """
+    State of the resource groups seen by one node of the cluster.
+
+    ``states`` maps (resource group, node) to the state name, ``online`` maps
+    each resource group online somewhere to its node and ``load`` counts the
+    online resource groups per node.
+    """
+    def __init__(self, snmpquery):
+        rg_names = dict((r.index, r.pretty())
+                        for r in snmpquery.get('rg_name', []))
+        node_names = dict((n.index, n.pretty())
+                          for n in snmpquery.get('node_name', []))
+
+        self.names = [r.pretty() for r in snmpquery.get('rg_name', [])]
+        self.states = {}
+        self.online = {}
+        # rg_state is indexed by <rg index>.<node index>
+        for r in snmpquery.get('rg_state', []):
+            rg = rg_names.get(int(r.oid.rsplit('.', 2)[-2]))
+            node = node_names.get(r.index)
+            if rg is None or node is None:
+                logger.debug("Orphan state {0.oid} = {0.value}".format(r))
+                continue
+            status = state.get(int(r.value), 'unknown')
+            self.states[(rg, node)] = status
+            if status == 'online':
+                self.online.setdefault(rg, node)
+        self.load = Counter(self.online.itervalues())
+
+    def find_rg_node(self, pattern):
+        """Return (node, name) of the first online RG matching pattern."""
+        for name in self.names:
+            if name in self.online and re.search(pattern, name):
+                return self.online[name], name
+        return None, None
 
     def __repr__(self):
-        return "Resources<Name: {}, Node: {}>".format(self.name,self.node)
+        return "ResourceGroups<Online: {}>".format(self.online)
+
+
+def poll_nodes(probes):
+    """
+    Query all the probes in parallel.
+
+    Return a dict of address -> SNMP results, or the SNMP error if the node
+    did not answer.
+    """
+    results = {}
+
+    def worker(probe):
+        try:
+            results[probe.hostaddress] = probe.getnext(oids)
+        except ProbeSNMP.SNMPError as e:
+            results[probe.hostaddress] = e
+        except BaseException as e:
+            results[probe.hostaddress] = ProbeSNMP.SNMPError(
+                'Unexpected error: {0!r}'.format(e))
+
+    threads = [threading.Thread(target=worker, args=(probe,))
+               for probe in probes]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def disagreements(views):
+    """Yield (rg, node, {address: state}) where the views do not agree."""
+    cells = set()
+    for view in views.itervalues():
+        cells.update(view.states)
+    for rg, node in sorted(cells):
+        seen = dict((address, view.states.get((rg, node), 'missing'))
+                    for address, view in views.iteritems())
+        if len(set(seen.itervalues())) > 1:
+            yield rg, node, seen
 
 
 oids = {
@@ -100,40 +175,66 @@ state = {
 plugin = PluginHacmpRg(version=hacmp.__version__,
                        description="check statut of RG")
 
-snmpquery = plugin.snmp.getnext(oids)
+addresses = [plugin.options.hostname]
+addresses.extend(n for n in plugin.options.nodes if n not in addresses)
 
-plugin.shortoutput = "All Resource Groups are online"
+if len(addresses) == 1:
+    results = {plugin.options.hostname: plugin.snmp.getnext(oids)}
+else:
+    plugin.snmp.raise_errors = True
+    probes = [plugin.snmp]
+    try:
+        probes.extend(ProbeSNMP(hostaddress=address,
+                                port=plugin.snmp.port,
+                                community=plugin.snmp.community,
+                                snmp_version=plugin.snmp.snmp_version,
+                                login=plugin.snmp.login,
+                                password=plugin.snmp.password,
+                                auth_protocol=plugin.snmp.auth_protocol,
+                                priv_protocol=plugin.snmp.priv_protocol,
+                                raise_errors=True)
+                      for address in addresses[1:])
+    except ProbeSNMP.SNMPError as e:
+        plugin.unknown(str(e))
+    results = poll_nodes(probes)
 
-msg_err = "# ======= WARNING ========"
-cmp = 0
+failed = [address for address in addresses
+          if isinstance(results[address], ProbeSNMP.SNMPError)]
+for address in failed:
+    logger.debug("{0}: {1}".format(address, results[address]))
+if len(failed) == len(addresses):
+    plugin.unknown("No cluster node answered the SNMP query !\n{0}".format(
+        "\n".join("{0}: {1}".format(address, results[address])
+                  for address in addresses)))
 
 try:
-    # travel resource groups
-    for result in snmpquery['rg_name']:
-        logger.debug("oid {0.oid}, name {0.value}, index: {0.index}".format(result))
-
-        online = False
-        # travel resource group states
-        for r in snmpquery['rg_state']:
-            if r.oid.split('.')[-2] == str(result.index):
-                node = [n.value for n in snmpquery['node_name'] if n.index == r.index][0]
-                status = state[r.value]
-                if status == 'online':
-                    plugin.longoutput.insert(0, " {0.value} is {1} on {2}".format(result,status,node))
-                    online = True
-                    Resources(node, result.pretty())
-                    break
-                else:
-                    online = False
-
-        if online is False:
-            cmp += 1
-            msg_err += "{0} {1.value} is not online on any node".format('\n',result)
+    views = dict((address, ResourceGroups(results[address]))
+                 for address in addresses if address not in failed)
 except:
     plugin.shortoutput = 'There was a problem during the processing of SNMP query results !'
     plugin.longoutput = list(traceback.format_exc())
     plugin.unknown(plugin.output())
 
+# Answers are given from the view of the first node that answered
+address = [a for a in addresses if a not in failed][0]
+resources = views[address]
+logger.debug("{0}: {1}".format(address, resources))
+if not resources.names:
+    plugin.unknown("No Resource Group found by the SNMP query on {0} !".format(
+        address))
+
+plugin.shortoutput = "All Resource Groups are online"
+
+msg_err = "# ======= WARNING ========"
+cmp = 0
+for name in resources.names:
+    if name in resources.online:
+        plugin.longoutput.insert(0, " {0} is online on {1}".format(
+            name, resources.online[name]))
+    else:
+        cmp += 1
+        msg_err += "{0} {1} is not online on any node".format('\n', name)
+
 if cmp > 0:
     if plugin.longoutput: plugin.longoutput.insert(0,'# ========== OK ==========')
     plugin.longoutput.insert(0, msg_err)
@@ -141,20 +242,40 @@ if cmp > 0:
     plugin.warning(plugin.output())
 
 if plugin.options.rg_alone:
-    alone_node,alone_name = Resources.find_rg_node(plugin.options.rg_alone)
+    alone_node,alone_name = resources.find_rg_node(plugin.options.rg_alone)
 
-    if Resources.collection[alone_node] != 1:
+    if alone_node is None:
+        plugin.shortoutput = "No online Resource Group matches '{0}'".format(
+            plugin.options.rg_alone)
+        plugin.warning(plugin.output())
+    if resources.load[alone_node] != 1:
         plugin.shortoutput = "Resource Group '{0}' is not alone on {1}".format(alone_name,alone_node)
         plugin.warning(plugin.output())
 
 if plugin.options.rg:
     logger.debug(plugin.options.rg)
-    node_def = Resources.find_rg_node(plugin.options.rg[0])[0]
-    for r in plugin.options.rg:
-        if node_def != Resources.find_rg_node(r)[0]:
-            plugin.shortoutput = "Resource Groups {0} are not on same node".format(plugin.options.rg)
-            plugin.warning(plugin.output())
-
+    nodes = set(resources.find_rg_node(r)[0] for r in plugin.options.rg)
+    if len(nodes) != 1 or None in nodes:
+        plugin.shortoutput = "Resource Groups {0} are not on same node".format(plugin.options.rg)
+        plugin.warning(plugin.output())
 
+# Cluster nodes should all agree on the state of every resource group
+conflicts = list(disagreements(views))
+if conflicts or failed:
+    for rg, node, seen in conflicts:
+        plugin.longoutput.insert(0, " {0} on {1}: {2}".format(
+            rg, node, ", ".join("{0} on {1}".format(seen[a], a)
+                                for a in addresses if a in seen)))
+    for address in failed:
+        plugin.longoutput.insert(0, " {0} did not answer: {1}".format(
+            address, results[address]))
+    plugin.longoutput.insert(0, '# ==== CLUSTER NODES =====')
+    if conflicts:
+        plugin.shortoutput = "Cluster nodes disagree on {0} Resource Group " \
+                             "state(s)".format(len(conflicts))
+    else:
+        plugin.shortoutput = "{0} of {1} cluster nodes did not answer".format(
+            len(failed), len(addresses))
+    plugin.warning(plugin.output())
 
 plugin.ok(plugin.output())
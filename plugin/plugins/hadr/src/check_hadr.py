@@ -23,23 +23,18 @@
 """Check that HADR is available."""
 
 import logging
-from monitoring.nagios.plugin import NagiosPluginSSH
 import hadr
+from hadr.base import HadrPlugin
 
 logger = logging.getLogger('plugin.hadr')
 
 
 # define new args
-class PluginHadr(NagiosPluginSSH):
+class PluginHadr(HadrPlugin):
     """Custom plugin definition."""
     def define_plugin_arguments(self):
         super(PluginHadr, self).define_plugin_arguments()
 
-        self.required_args.add_argument('-d', '--db2user',
-                                        dest="db2_user",
-                                        help="Db2 user use, an string",
-                                        required=True)
-
         self.required_args.add_argument('-w', '--warn',
                                         type=int,
                                         dest='warning',
@@ -60,58 +55,38 @@ plugin = PluginHadr(version=hadr.__version__,
 plugin.shortoutput = "HADR is Connected"
 
 
-# Final status exit for the plugin
-status = None
-
-cmd = """echo 'db2 \"SELECT HADR_ROLE, \
-HADR_LOCAL_HOST, \
-HADR_CONNECT_STATUS, \
-HADR_REMOTE_HOST, \
-HADR_LOG_GAP, \
-HADR_STATE \
-FROM SYSIBMADM.SNAPHADR\"' \
-| sudo -u {0} -i \
-| sed -n '/--/{{n; p;}}' \
-| sed 's/[ ][ ]*/ /g'""".format(plugin.options.db2_user)
-
-logger.debug("cmd : {0}".format(cmd))
-
-try:
-    command = plugin.ssh.execute(cmd)
-except plugin.ssh.SSHCommandTimeout:
-    plugin.unknown("Plugin execution timed out in {} secs !".format(
-        plugin.options.timeout))
-
-output = command.output
-errors = command.errors
-
-if errors:
-    plugin.unknown("Errors found:\n{}".format("\n".join(errors)))
-
-# Travel output cmd by line
-cmpt = 0
+statuses = plugin.hadr_statuses()
 
-if not any(output):
-    plugin.unknown("Output is empty !")
+# Final status exit for the plugin
+status = plugin.ok
+severities = [plugin.ok, plugin.warning, plugin.critical]
 
-for line in output:
-    logger.debug(line)
+# Travel databases, the worst one gives the status
+cmpt = 0
+for hadr_status in statuses:
+    logger.debug(hadr_status)
 
-    status = plugin.ok
-    role, name, state, remote, log_gap, hadr_state = line.split()
+    database = hadr_status.database
+    state = hadr_status.connect_status
+    log_gap = hadr_status.log_gap
+    hadr_state = hadr_status.state
 
-    plugin.longoutput.append("Active Host: {0}  "
+    plugin.longoutput.append("Database: {7}{2}"
+                             "Active Host: {0}  "
                              "Role: {1}{2}"
                              "Remote Host: {3}{2}"
                              "State: {4}{2}"
                              "Log_Gap: {5}{2}"
-                             "HADR_State: {6}".format(name,
-                                                      role,
-                                                      '\n',
-                                                      remote,
-                                                      state,
-                                                      log_gap,
-                                                      hadr_state))
+                             "HADR_State: {6}{2}"
+                             "Sync_Mode: {8}".format(hadr_status.local_host,
+                                                     hadr_status.role,
+                                                     '\n',
+                                                     hadr_status.remote_host,
+                                                     state,
+                                                     log_gap,
+                                                     hadr_state,
+                                                     database,
+                                                     hadr_status.sync_mode))
 
     plugin.perfdata.append(
         'log_gap[{0}]={1}b;{2.warning};{2.critical};0;'.format(cmpt,
@@ -119,27 +94,31 @@ for line in output:
                                                                plugin.options))
     cmpt += 1
 
+    # Status of this database
     if state != "CONNECTED":
-        plugin.shortoutput = "HADR is {}".format(state)
-        plugin.critical(plugin.output())
-
-    if hadr_state != "PEER":
-        plugin.shortoutput = "Hadr state is {}".format(hadr_state)
-        plugin.warning(plugin.output())
-
-    # Log_gap
-    if plugin.options.warning:
-        if int(log_gap) >= plugin.options.warning:
-            status = plugin.warning
-            plugin.shortoutput = "Log_gap : {}   " \
-                                 "(threshold warn {})".format(
-                                     log_gap, plugin.options.warning)
-    if plugin.options.critical:
-        if int(log_gap) >= plugin.options.critical:
-            status = plugin.critical
-            plugin.shortoutput = "Log_gap : {}   " \
-                                 "(threshold crit {})".format(
-                                     log_gap, plugin.options.critical)
+        db_status = plugin.critical
+        message = "HADR of {} is {}".format(database, state)
+    elif plugin.options.critical and \
+            int(log_gap) >= plugin.options.critical:
+        db_status = plugin.critical
+        message = "Log_gap of {} : {}   " \
+                  "(threshold crit {})".format(database, log_gap,
+                                               plugin.options.critical)
+    elif hadr_state != "PEER":
+        db_status = plugin.warning
+        message = "Hadr state of {} is {}".format(database, hadr_state)
+    elif plugin.options.warning and int(log_gap) >= plugin.options.warning:
+        db_status = plugin.warning
+        message = "Log_gap of {} : {}   " \
+                  "(threshold warn {})".format(database, log_gap,
+                                               plugin.options.warning)
+    else:
+        continue
+
+    # Keep the message of the first database with the worst status
+    if severities.index(db_status) > severities.index(status):
+        status = db_status
+        plugin.shortoutput = message
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
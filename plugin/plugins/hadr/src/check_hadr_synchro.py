@@ -23,23 +23,18 @@
 """Check that HADR is in sync."""
 
 import logging
-from monitoring.nagios.plugin import NagiosPluginSSH
 import hadr
+from hadr.base import HadrPlugin
 
 logger = logging.getLogger('plugin.hadr')
 
 
 # define new args
-class PluginHadr(NagiosPluginSSH):
+class PluginHadr(HadrPlugin):
     """Custom plugin definition."""
     def define_plugin_arguments(self):
         super(PluginHadr, self).define_plugin_arguments()
 
-        self.required_args.add_argument('-d', '--db2user',
-                                        dest="db2_user",
-                                        help="Db2 user use, an string",
-                                        required=True)
-
         self.required_args.add_argument('-w', '--warn',
                                         type=int,
                                         dest='warning',
@@ -60,39 +55,23 @@ plugin = PluginHadr(version=hadr.__version__,
 plugin.shortoutput = "HADR is Synchro"
 
 
-# Final status exit for the plugin
-status = None
-
-
-cmd = """echo 'db2 \"SELECT cast(substr(HADR_PRIMARY_LOG_FILE,2,7) as INT) - \
-cast(substr(HADR_STANDBY_LOG_FILE,2,7) as INT) as \
-DIFF_LOG_BETWEEN_STDY_AND_PRIM \
-FROM SYSIBMADM.SNAPHADR\"' \
-| sudo -u {0} -i \
-| sed -n '/--/{{n; p;}}' \
-| sed 's/[ ][ ]*//g'""".format(plugin.options.db2_user)
+statuses = plugin.hadr_statuses()
 
-logger.debug("cmd : {0}".format(cmd))
-
-try:
-    command = plugin.ssh.execute(cmd)
-except plugin.ssh.SSHCommandTimeout:
-    plugin.unknown("Plugin execution timed out in {} secs !".format(
-        plugin.options.timeout))
-
-output = command.output
-errors = command.errors
-
-if errors:
-    plugin.unknown("Errors found:\n{}".format("\n".join(errors)))
+# Final status exit for the plugin
+status = plugin.ok
 
-# Travel output cmd by line
+# Travel databases, the worst one gives the status
 cmpt = 0
-for line in output:
-    logger.debug(line)
+for hadr_status in statuses:
+    logger.debug(hadr_status)
 
-    status = plugin.ok
-    diff_log = line.strip()
+    database = hadr_status.database
+    diff_log = hadr_status.log_diff
+    if diff_log is None:
+        plugin.unknown("Log files of {0} are unknown (primary: '{1}', "
+                       "standby: '{2}') !".format(
+                           database, hadr_status.primary_log_file,
+                           hadr_status.standby_log_file))
 
     logger.debug("diff_log : {}".format(diff_log))
 
@@ -102,18 +81,20 @@ for line in output:
     cmpt += 1
 
     # Check threshold
-    if plugin.options.warning:
-        if int(diff_log) >= plugin.options.warning:
+    if plugin.options.warning and status != plugin.critical:
+        if diff_log >= plugin.options.warning:
             status = plugin.warning
-            plugin.shortoutput = "DIFF LOG BETWEEN STDY AND PRIM : {}   " \
-                                 "(threshold warn {})".format(
-                                     diff_log, plugin.options.warning)
+            plugin.shortoutput = "DIFF LOG BETWEEN STDY AND PRIM OF {} : " \
+                                 "{}   (threshold warn {})".format(
+                                     database, diff_log,
+                                     plugin.options.warning)
     if plugin.options.critical:
-        if int(diff_log) >= plugin.options.critical:
+        if diff_log >= plugin.options.critical:
             status = plugin.critical
-            plugin.shortoutput = "DIFF LOG BETWEEN STDY AND PRIM : {}   " \
-                                 "(threshold crit {})".format(
-                                     diff_log, plugin.options.critical)
+            plugin.shortoutput = "DIFF LOG BETWEEN STDY AND PRIM OF {} : " \
+                                 "{}   (threshold crit {})".format(
+                                     database, diff_log,
+                                     plugin.options.critical)
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Base class for the HADR plugins."""
+
+import logging
+
+from monitoring.nagios.plugin import NagiosPluginSSH
+from monitoring.nagios.cache import ResponseCache, CacheError
+
+from .snapshot import build_script, parse_snapshot
+
+logger = logging.getLogger('plugin.hadr')
+
+
+class HadrPlugin(NagiosPluginSSH):
+    """
+    Base class for the HADR plugins.
+
+    :meth:`hadr_statuses` returns the HADR status of the databases to check,
+    collected in one SSH command for the whole instance.
+    """
+    def define_plugin_arguments(self):
+        super(HadrPlugin, self).define_plugin_arguments()
+
+        self.required_args.add_argument('-d', '--db2user',
+                                        dest="db2_user",
+                                        help="Db2 user use, an string",
+                                        required=True)
+
+        self.parser.add_argument('-D', '--database',
+                                 dest='databases',
+                                 action='append',
+                                 help='Database to check, repeat it for '
+                                      'several databases (default to all the '
+                                      'HADR databases of the instance)')
+
+        self.parser.add_argument('--cache-ttl',
+                                 dest='cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help='Share the HADR status of the instance '
+                                      'between checks for this number of '
+                                      'seconds (default to 0, no cache)')
+
+    def hadr_statuses(self):
+        """
+        Return the list of :class:`hadr.snapshot.HadrStatus` to check, sorted
+        by database.
+
+        Exit UNKNOWN if a requested database could not be queried, or if no
+        HADR database is found.
+        """
+        snapshot = self.collect()
+        wanted = set(db.upper() for db in self.options.databases or [])
+
+        def selected(database):
+            return not wanted or database.upper() in wanted
+
+        errors = [(database, error)
+                  for database, error in sorted(snapshot.errors.iteritems())
+                  if selected(database)]
+        for database, error in errors:
+            self.longoutput.append("Cannot query {0}: {1}".format(database,
+                                                                 error))
+        if wanted and errors:
+            self.unknown("Cannot get HADR status of {0} !\n{1}".format(
+                ", ".join(database for database, _ in errors),
+                "\n".join(self.longoutput)))
+
+        statuses = sorted([status for status in snapshot.statuses
+                           if selected(status.database)],
+                          key=lambda status: status.database)
+        if not statuses:
+            self.unknown("No HADR database found !\n{0}".format(
+                "\n".join(self.longoutput)))
+        return statuses
+
+    def collect(self):
+        """
+        Collect the HADR snapshot in one SSH command.
+
+        Without cache, only the requested databases are queried. With a cache,
+        all the databases of the instance are, so that the other checks of the
+        instance can use it.
+        """
+        if not self.options.cache_ttl:
+            return parse_snapshot(self.run_command(
+                build_script(self.options.db2_user, self.options.databases)))
+
+        url = 'hadr://{0}/{1}'.format(self.options.hostname,
+                                      self.options.db2_user)
+        try:
+            cache = ResponseCache(ttl=self.options.cache_ttl)
+            cached = cache.lookup(url, fresh=True, parser=parse_snapshot)
+            if cached is None:
+                with cache.lock(url):
+                    # Another check may have collected it while we waited
+                    cached = cache.lookup(url, fresh=True,
+                                          parser=parse_snapshot)
+                    if cached is None:
+                        cached = cache.store(
+                            url, self.run_command(
+                                build_script(self.options.db2_user)),
+                            parser=parse_snapshot)
+            logger.debug("HADR snapshot from cache: {0}".format(
+                cached.from_cache))
+        except CacheError as e:
+            self.unknown("Cannot use the HADR status cache: {0}".format(e))
+        return cached.parsed
+
+    def run_command(self, cmd):
+        """Run the command with SSH and return its output as a string."""
+        logger.debug("cmd : {0}".format(cmd))
+
+        try:
+            command = self.ssh.execute(cmd)
+        except self.ssh.SSHCommandTimeout:
+            self.unknown("Plugin execution timed out in {} secs !".format(
+                self.options.timeout))
+
+        output = command.output
+        errors = command.errors
+
+        if errors:
+            self.unknown("Errors found:\n{}".format("\n".join(errors)))
+        if not any(output):
+            self.unknown("Output is empty !")
+
+        return "\n".join(output)
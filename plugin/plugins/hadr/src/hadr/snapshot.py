@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+HADR status collection.
+
+The HADR status of all the databases of an instance is collected by one
+remote shell, running as the instance owner: it connects to each local
+database in turn and queries the ``MON_GET_HADR`` table function with
+delimited output. The result is parsed into :class:`HadrStatus` records so
+that it can be shared between the checks of the instance with
+:class:`monitoring.nagios.cache.ResponseCache`.
+"""
+
+from collections import namedtuple
+
+# One row per log stream and standby of the connected database
+HADR_QUERY = \
+    "SELECT hadr_role || '|' || hadr_syncmode || '|' || " \
+    "hadr_state || '|' || hadr_connect_status || '|' || " \
+    "COALESCE(primary_member_host, '') || '|' || " \
+    "COALESCE(standby_member_host, '') || '|' || " \
+    "RTRIM(CHAR(hadr_log_gap)) || '|' || " \
+    "COALESCE(primary_log_file, '') || '|' || " \
+    "COALESCE(standby_log_file, '') " \
+    "FROM TABLE(MON_GET_HADR(-2))"
+
+# Aliases of the local databases of the instance
+LIST_DATABASES = \
+    "db2 list db directory | awk -F'= *' " \
+    "'/Database alias/ {alias=$2} " \
+    "/Directory entry type/ && /Indirect/ {print alias}'"
+
+DATABASE_MARK = '@@database '
+STATUS_MARK = '@@status '
+
+
+class HadrStatus(namedtuple('HadrStatus', 'database role sync_mode state '
+                                          'connect_status primary_host '
+                                          'standby_host log_gap '
+                                          'primary_log_file '
+                                          'standby_log_file')):
+    """HADR status of a database, as seen from this instance."""
+    __slots__ = ()
+
+    @property
+    def local_host(self):
+        if self.role == 'PRIMARY':
+            return self.primary_host
+        return self.standby_host
+
+    @property
+    def remote_host(self):
+        if self.role == 'PRIMARY':
+            return self.standby_host
+        return self.primary_host
+
+    @property
+    def log_diff(self):
+        """
+        Number of log files the standby is behind the primary, ``None`` if
+        the log files are not known.
+        """
+        try:
+            return _log_number(self.primary_log_file) - \
+                _log_number(self.standby_log_file)
+        except ValueError:
+            return None
+
+
+class Snapshot(namedtuple('Snapshot', 'statuses errors')):
+    """
+    HADR statuses of all the databases collected, and the error message of
+    the databases that could not be queried.
+    """
+    __slots__ = ()
+
+    def databases(self):
+        return sorted(set(status.database for status in self.statuses) |
+                      set(self.errors))
+
+
+def _log_number(log_file):
+    # S0000123.LOG -> 123
+    return int(log_file[1:8])
+
+
+def build_script(db2_user, databases=None):
+    """
+    Return the command collecting the HADR status of ``databases`` (all the
+    local databases by default) in one ``sudo`` session of ``db2_user``.
+    """
+    if databases:
+        database_list = ' '.join(databases)
+    else:
+        database_list = '$({0})'.format(LIST_DATABASES)
+
+    return '\n'.join([
+        'sudo -u {0} -i <<\'__HADR_SNAPSHOT__\''.format(db2_user),
+        'for db in {0}; do'.format(database_list),
+        '  echo "{0}$db"'.format(DATABASE_MARK),
+        '  if db2 connect to $db > /dev/null 2>&1; then',
+        '    db2 -x "{0}" 2>&1'.format(HADR_QUERY),
+        '    echo "{0}$?"'.format(STATUS_MARK),
+        '    db2 connect reset > /dev/null 2>&1',
+        '  else',
+        '    db2 connect to $db 2>&1 | head -1',
+        '    echo "{0}255"'.format(STATUS_MARK),
+        '  fi',
+        'done',
+        '__HADR_SNAPSHOT__',
+    ])
+
+
+def parse_snapshot(content):
+    """
+    Parse the output of the :func:`build_script` command.
+
+    Databases whose query failed (DB2 CLP return codes 4 and 8, or the
+    connection failed) are reported in :attr:`Snapshot.errors`. Databases not
+    using HADR have no status.
+
+    :returns: a :class:`Snapshot`.
+    """
+    statuses = []
+    errors = {}
+    database = None
+    lines = []
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith(DATABASE_MARK):
+            database = line[len(DATABASE_MARK):]
+            lines = []
+        elif database is None:
+            continue
+        elif line.startswith(STATUS_MARK):
+            status = int(line[len(STATUS_MARK):])
+            if status >= 4:
+                errors[database] = '\n'.join(lines)
+            else:
+                try:
+                    statuses.extend(list(_statuses(database, lines)))
+                except (ValueError, IndexError) as e:
+                    errors[database] = 'Cannot parse HADR status: {0}\n' \
+                                       '{1}'.format(e, '\n'.join(lines))
+            database = None
+        elif line:
+            lines.append(line)
+
+    return Snapshot(statuses, errors)
+
+
+def _statuses(database, lines):
+    for line in lines:
+        if '|' not in line:
+            continue
+        role, sync_mode, state, connect_status, primary_host, \
+            standby_host, log_gap, primary_log_file, standby_log_file = \
+            [field.strip() for field in line.split('|')]
+        if role == 'STANDARD':
+            continue
+        yield HadrStatus(database, role, sync_mode, state, connect_status,
+                         primary_host, standby_host, int(log_gap),
+                         primary_log_file, standby_log_file)
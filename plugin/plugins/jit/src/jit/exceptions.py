@@ -41,6 +41,14 @@ class UndefinedSeverity(Exception):
     pass
 
 
+class InvalidInterface(Exception):
+    """
+    Raised when the XML file is malformed or misses the date time, version or
+    role of its source.
+    """
+    pass
+
+
 class FTPError(Exception):
     """
     Raised when there is a problem authenticating to the FTP server to retrieve
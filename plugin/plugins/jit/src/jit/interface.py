@@ -28,20 +28,16 @@ Contains classes that handle the XML interface file parsing and events
 collection.
 """
 
-# Std imports
+
 import logging
 from datetime import datetime
 from pprint import pformat
+from xml.etree import cElementTree
 
-# Exceptions
 from exceptions import *
 
-# Monitoring imports
 from monitoring.nagios.plugin import NagiosPlugin
 
-# 3rd party imports
-from bs4 import BeautifulSoup
-
 
 logger = logging.getLogger('plugin.jit.interface')
 
@@ -61,8 +57,11 @@ class Event(object):
     main message that will be redirected to Nagios with the severity and extra
     messages as long output.
 
-    :param events: list of tags for the event from the XML file.
-    :type events: list
+    :param name: the name of the event.
+    :type name: basestring
+    :param records: list of ``(severity, message)`` tuples for the event, in
+                    the order of the XML file.
+    :type records: list
 
     The following instance attributes are made available:
 
@@ -89,38 +88,33 @@ class Event(object):
         A list of the lines for long output or any extra details about the
         alert.
     """
-    def __init__(self, events):
-        self._events = events
-        self.name = events[0].string
-        self.main = self._find_tag_with_highest_severity()
-        self.severity = SEVERITY_LEVEL[self.main.severity.string][1]
-        if self.main.message.string != "UNUSED":
-            self.message = self.main.message.string
+    def __init__(self, name, records):
+        self._records = list(records)
+        self.name = name
+        main_severity, main_message = self._find_record_with_highest_severity()
+        self.severity = SEVERITY_LEVEL[main_severity][1]
+        if main_message != "UNUSED":
+            self.message = main_message
         else:
             self.message = "This check is not verified on this host."
-        self.details = []
 
         # Get extra details messages (for long output)
-        for event in self._events:
-            parent = event.parent
-            self.details.append(parent.message.string)
+        self.details = [message for _, message in self._records]
 
-    def _find_tag_with_highest_severity(self):
-        all_tags_severity = []
+    def _find_record_with_highest_severity(self):
+        highest_level = None
+        highest_index = None
 
-        for tag in self._events:
-            parent = tag.parent
-            parent_severity = parent.severity.string
+        for index, (severity, _) in enumerate(self._records):
             try:
-                all_tags_severity.append(SEVERITY_LEVEL[parent_severity][0])
+                level = SEVERITY_LEVEL[severity][0]
             except KeyError:
-                raise UndefinedSeverity(parent_severity, self.name)
+                raise UndefinedSeverity(severity, self.name)
+            if highest_level is None or level > highest_level:
+                highest_level = level
+                highest_index = index
 
-        hightest_severity_tag_index = all_tags_severity.index(
-            max(all_tags_severity))
-        main = self._events.pop(hightest_severity_tag_index)
-
-        return main.parent
+        return self._records.pop(highest_index)
 
     def __str__(self):
         return self.name
@@ -134,11 +128,105 @@ class Event(object):
                                          len(self.details))
 
 
+class _InterfaceCollector(object):
+    """
+    Parser target that collects the XML interface data in one single pass.
+
+    Tag names are compared lowercased. Events are grouped by name as soon as
+    their ``</Event>`` tag is read, so nothing but the needed text is kept in
+    memory.
+    """
+    def __init__(self):
+        self.source = {}
+        self.events = {}
+        self.event_names = []
+
+        self._path = []
+        self._text = []
+        self._event = None
+
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        self._path.append(tag)
+        self._text = []
+        if tag == 'event' and self._path[-2:-1] == ['events']:
+            self._event = {}
+
+    def data(self, data):
+        self._text.append(data)
+
+    def end(self, tag):
+        tag = self._path.pop()
+        parent = self._path[-1] if self._path else None
+
+        if parent == 'source':
+            self.source[tag] = u''.join(self._text)
+        elif self._event is not None:
+            if tag == 'event':
+                self._add_event(self._event)
+                self._event = None
+            elif parent == 'event':
+                self._event[tag] = u''.join(self._text) or None
+        self._text = []
+
+    def close(self):
+        return self
+
+    def _add_event(self, event):
+        name = event.get('event-name')
+        records = self.events.get(name)
+        if records is None:
+            logger.debug('\t%s', name)
+            records = self.events[name] = []
+            self.event_names.append(name)
+        records.append((event.get('severity'), event.get('message')))
+
+
+class InterfaceParser(object):
+    """
+    Incremental parser for the XML interface.
+
+    Use it to parse the XML while it is downloaded, then give it to
+    :class:`XMLInterface`::
+
+     >>> xml_file = open('sample_data/interface.xml')
+     >>> parser = InterfaceParser()
+     >>> for chunk in iter(lambda: xml_file.read(4096), ''):
+     ...     parser.feed(chunk)
+     >>> interface = XMLInterface(parser)
+     >>> interface.role
+     u'MAIN'
+
+    :param encoding: override the encoding declared in the XML.
+    :type encoding: str
+    """
+    def __init__(self, encoding=None):
+        self._parser = cElementTree.XMLParser(target=_InterfaceCollector(),
+                                              encoding=encoding)
+
+    def feed(self, data):
+        """Parse a chunk of the XML data."""
+        try:
+            self._parser.feed(data)
+        except cElementTree.ParseError as e:
+            raise InvalidInterface('Malformed XML interface: {0}'.format(e))
+
+    def close(self):
+        """Finish parsing and return the collected data."""
+        try:
+            return self._parser.close()
+        except cElementTree.ParseError as e:
+            raise InvalidInterface('Malformed XML interface: {0}'.format(e))
+
+
 class XMLInterface(object):
     """
     Class :class:`XMLInterface` interacts with the XML interface defined between
     monitoring and industrialization applications.
 
+    The XML is read with a streaming parser in one pass, events are indexed by
+    name so looking up an event does not depend on the number of events.
+
     The following instances attributes are made available:
 
     .. attribute:: XMLInterface.version
@@ -158,11 +246,6 @@ class XMLInterface(object):
 
         The attribute that stores all data about found events from the XML file.
 
-    .. attribute:: XMLInterface.xml
-
-        The is the :class:`BeautifulSoup` instance.
-        Use it to do what you want with the XML file.
-
     **Usage**::
 
      >>> interface = XMLInterface(open('sample_data/interface.xml'))
@@ -185,61 +268,81 @@ Processed OK. Updates: Number: 209']
      >>> interface.role
      u'MAIN'
     """
+    chunk_size = 65536
+
     def __init__(self, xml_data):
         """
         Read XML data and collect all related events.
 
-        :param xml_data: a file-object or string which is valid XML.
-        :type xml_data: file, basestring
+        :param xml_data: a file-object or string which is valid XML, or an
+                         :class:`InterfaceParser` already fed with the XML.
+        :type xml_data: file, basestring, InterfaceParser
+
+        :raises InvalidInterface: if the XML is malformed or incomplete.
         """
         logger.debug('XML Interface initialization.')
 
-        # Initialize the XML parser
-        self.xml = BeautifulSoup(xml_data)
-
         # Internals
         self.events = []
-        self.last_updated = datetime.strptime(
-            self.xml.alerts.source.datetime.string, '%d-%m-%Y_%H:%M:%S')
-        self.version = self.xml.alerts.source.version.text
-        self.role = self.xml.alerts.source.role.text
+        self._index = {}
+
+        # Parse the XML in one pass
+        collector = self._parse(xml_data)
+        try:
+            self.last_updated = datetime.strptime(
+                collector.source['datetime'], '%d-%m-%Y_%H:%M:%S')
+            self.version = collector.source['version']
+            self.role = collector.source['role']
+        except KeyError as e:
+            raise InvalidInterface('No {0} in the source of the XML '
+                                   'interface !'.format(e))
+        except ValueError as e:
+            raise InvalidInterface('Invalid date time in the XML interface: '
+                                   '{0}'.format(e))
+
+        # Build the events
+        self._collect_events(collector)
+
+    def _parse(self, xml_data):
+        """
+        Feed the streaming parser with ``xml_data`` and return the collector.
+        """
+        logger.debug('Available events:')
+
+        if isinstance(xml_data, InterfaceParser):
+            parser = xml_data
+        elif isinstance(xml_data, unicode):
+            # Already decoded, ignore the encoding declared in the XML
+            parser = InterfaceParser(encoding='utf-8')
+            parser.feed(xml_data.encode('utf-8'))
+        elif hasattr(xml_data, 'read'):
+            parser = InterfaceParser()
+            for chunk in iter(lambda: xml_data.read(self.chunk_size), ''):
+                parser.feed(chunk)
+        else:
+            parser = InterfaceParser()
+            parser.feed(xml_data)
 
-        # Start collecting the events
-        self._collect_events()
+        return parser.close()
 
-    def _collect_events(self):
+    def _collect_events(self, collector):
         """
         Collect all events and store :class:`Event` instances in :attr:`events`
         list.
         """
-        # Get the list of available events and deduplicate
-        event_types = []
-        logger.debug('Available events:')
-        for event in self.xml.alerts.events.find_all('event-name'):
-            event_name = event.string
-            if not event_name in event_types:
-                logger.debug('\t%s', event_name)
-                event_types.append(event_name)
-
-        # Get all tags for an event
-        for event_type in event_types:
-            event_tags = self.xml.alerts.events.find_all('event-name',
-                                                         text=event_type)
-            self.events.append(Event(event_tags))
+        for event_name in collector.event_names:
+            event = Event(event_name, collector.events[event_name])
+            self.events.append(event)
+            self._index[event_name] = event
 
-        logger.debug('Events data:\n%s', pformat(self.events, indent=4))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Events data:\n%s', pformat(self.events, indent=4))
 
     def __getitem__(self, eventname):
         """
         Return the :class:`Event` instance for the corresponding event ``name``.
         """
-        found_event = None
-        for event in self.events:
-            if event.name == eventname:
-                found_event = event
-                break
-
-        if not found_event:
+        try:
+            return self._index[eventname]
+        except KeyError:
             raise EventNotFound
-
-        return found_event
\ No newline at end of file
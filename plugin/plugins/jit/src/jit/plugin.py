@@ -27,14 +27,19 @@
 Contains classes that handle plugin creation that make use of XML interface.
 """
 
+import logging
+
 # Monitoring imports
 from monitoring.nagios.plugin import NagiosPlugin
 from monitoring.nagios.plugin import argument
+from monitoring.nagios.cache import ResponseCache, CacheError
 
-from .exceptions import FTPError
+from .exceptions import FTPError, InvalidInterface
 from requests.exceptions import HTTPError
 from .session import RemoteInterfaceSession
-from .interface import XMLInterface
+from .interface import XMLInterface, InterfaceParser
+
+logger = logging.getLogger('plugin.jit.plugin')
 
 
 class XMLInterfacePlugin(NagiosPlugin):
@@ -51,15 +56,32 @@ class XMLInterfacePlugin(NagiosPlugin):
         super(XMLInterfacePlugin, self).initialize()
 
         # Establish a connection to the remote server provided by --url argument
-        remote = RemoteInterfaceSession(self.options.url,
-                                        self.options.timeout)
         try:
-            remote.connect()
-            self.interface = XMLInterface(remote.read_data())
+            try:
+                cache = ResponseCache(ttl=self.options.cache_ttl)
+                self.interface = self._read_interface(cache)
+            except CacheError as e:
+                logger.debug('Cannot use the XML cache, downloading the '
+                             'XML directly: %s', e)
+                self.interface = self._read_interface(None)
         except FTPError as e:
             self.unknown(e)
         except HTTPError as e:
             self.unknown(e)
+        except InvalidInterface as e:
+            self.unknown(e)
+
+    def _read_interface(self, cache):
+        """Download the XML interface, through ``cache`` if not ``None``."""
+        remote = RemoteInterfaceSession(self.options.url,
+                                        self.options.timeout,
+                                        cache=cache)
+        remote.connect()
+
+        # Parse the XML while it is received
+        parser = InterfaceParser()
+        remote.read_data(parser.feed)
+        return XMLInterface(parser)
 
     def define_plugin_arguments(self):
         """
@@ -81,6 +103,15 @@ class XMLInterfacePlugin(NagiosPlugin):
             default=10,
             help='Connection timeout in seconds (default to 10 secs).')
 
+        self.parser.add_argument(
+            '--cache-ttl',
+            dest='cache_ttl',
+            type=int,
+            default=0,
+            help='Share the XML interface between event checks for this '
+                 'number of seconds (default to 0, always check if the XML '
+                 'has changed).')
+
 
 class XMLStatusCheck(XMLInterfacePlugin):
     """
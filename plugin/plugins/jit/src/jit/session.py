@@ -33,11 +33,11 @@ import urlparse
 import socket
 import ftplib
 
-from StringIO import StringIO
-
 import exceptions
 import requests
 
+from monitoring.nagios.cache import CachedResponse
+
 logger = logging.getLogger('plugin.jit.session')
 
 
@@ -45,11 +45,19 @@ class RemoteInterfaceSession(object):
     """
     Remote session handling to fetch XML interface content.
     """
-    def __init__(self, url, timeout=10):
+    blocksize = 65536
+
+    def __init__(self, url, timeout=10, cache=None):
         """
         Initialize a new remote session on ``url``. Raise an error if
         ``timeout` in seconds is reached.
 
+        Content is stored in ``cache`` if this is an instance of
+        :class:`monitoring.nagios.cache.ResponseCache`. Over FTP, the file is
+        not downloaded again if its modification time and size did not change
+        since the cached copy, and no connection is made at all while the
+        cached copy is fresh.
+
         >>> session = RemoteInterfaceSession(\
                 "http://insalert.app.corp:80/insequence/Alert_USMSMSQL0001.xml")
         >>> session.protocol
@@ -75,6 +83,11 @@ class RemoteInterfaceSession(object):
         self.username = getattr(self._url, "username", None)
         self.password = getattr(self._url, "password", None)
 
+        # Cache key, without credentials
+        self.url = "{0.protocol}://{0.hostname}:{1}{0.path}".format(
+            self, self.port or ftplib.FTP_PORT)
+
+        self._cache = cache
         self._remote = None
 
     def connect(self):
@@ -106,23 +119,13 @@ class RemoteInterfaceSession(object):
         logger.debug("Remote session uses %s." % self.protocol.upper())
 
         if self.protocol == "ftp":
-            self._remote = ftplib.FTP()
-            try:
-                self._remote.connect(self.hostname,
-                                     self.port,
-                                     self.timeout)
-                if self.username and self.password:
-                    self._remote.login(self.username, self.password)
-                else:
-                    self._remote.login()
-            except socket.timeout:
-                raise exceptions.FTPTimedOut("Timeout on FTP server %s !" %
-                                             self.hostname)
-            except:
-                raise exceptions.FTPError(self.hostname,
-                                          self.port,
-                                          self.username)
-            logger.debug('Successfully authenticated on FTP server.')
+            if self._cache is not None:
+                self._remote = self._cache.lookup(self.url, fresh=True)
+                if self._remote is not None:
+                    logger.debug('Using fresh cached copy of %s.', self.url)
+                    return
+
+            self._remote = self._ftp_connection()
         elif self.protocol == "http":
             if self.username and self.password:
                 credentials = (self.username, self.password)
@@ -130,15 +133,70 @@ class RemoteInterfaceSession(object):
                 credentials = None
 
             url = "{0.protocol}://{0.hostname}{0.path}?{0.query}"
-            self._remote = requests.get(url.format(self), auth=credentials)
-            self._remote.raise_for_status()
+            if self._cache is not None:
+                self._remote = self._cache.get(url.format(self),
+                                               auth=credentials,
+                                               timeout=self.timeout)
+            else:
+                self._remote = requests.get(url.format(self),
+                                            auth=credentials)
+                self._remote.raise_for_status()
             logger.debug('Successfully authenticated on HTTP server.')
         else:
             raise NotImplementedError("Only HTTP or FTP are supported !")
 
-    def read_data(self):
+    def _ftp_connection(self):
+        """Return a logged in FTP connection."""
+        ftp = ftplib.FTP()
+        try:
+            ftp.connect(self.hostname, self.port, self.timeout)
+            if self.username and self.password:
+                ftp.login(self.username, self.password)
+            else:
+                ftp.login()
+        except socket.timeout:
+            raise exceptions.FTPTimedOut("Timeout on FTP server %s !" %
+                                         self.hostname)
+        except:
+            raise exceptions.FTPError(self.hostname,
+                                      self.port,
+                                      self.username)
+        logger.debug('Successfully authenticated on FTP server.')
+        return ftp
+
+    def _ftp_validators(self):
+        """
+        Return ``(modification time, size)`` of the remote file, or ``None``
+        if the server cannot tell.
+
+        Use ``MLST`` if supported, ``MDTM`` and ``SIZE`` otherwise.
+        """
+        try:
+            response = self._remote.sendcmd('MLST %s' % self.path)
+            facts = response.splitlines()[1].strip().split(' ', 1)[0]
+            facts = dict(fact.lower().split('=', 1)
+                         for fact in facts.split(';') if '=' in fact)
+            if 'modify' in facts and 'size' in facts:
+                return facts['modify'], facts['size']
+        except (ftplib.error_perm, IndexError, ValueError):
+            pass
+
+        try:
+            self._remote.voidcmd('TYPE I')
+            modify = self._remote.sendcmd('MDTM %s' % self.path).split()[-1]
+            size = self._remote.sendcmd('SIZE %s' % self.path).split()[-1]
+            return modify, size
+        except ftplib.error_perm as e:
+            logger.debug('Cannot get FTP file validators: %s', e)
+            return None
+
+    def read_data(self, callback=None):
         """
-        Returns the XML data as a file-like object (StringIO).
+        Returns the XML data as a string.
+
+        :param callback: if given, it is called with each chunk of the data as
+                         soon as it is received, like
+                         :meth:`jit.interface.InterfaceParser.feed`.
 
         # FTP session
         >>> session = RemoteInterfaceSession(\
@@ -156,15 +214,62 @@ class RemoteInterfaceSession(object):
         >>> "USMSMSQL0001" in data
         True
         """
-        data = StringIO()
-
         if isinstance(self._remote, ftplib.FTP):
             try:
-                self._remote.retrlines('RETR %s' % self.path, data.write)
+                if self._cache is not None:
+                    with self._cache.lock(self.url):
+                        data = self._ftp_read_cached(callback)
+                else:
+                    data = self._ftp_retrieve(callback)
             except ftplib.all_errors as e:
                 raise exceptions.FTPRetrError(
                     "Cannot read the XML data over FTP: %s" % e)
-        elif isinstance(self._remote, requests.Response):
-            data.write(self._remote.text)
+            finally:
+                self.close()
+            return data
+        elif isinstance(self._remote, (requests.Response, CachedResponse)):
+            if callback:
+                callback(self._remote.content)
+            return self._remote.text
+
+    def _ftp_read_cached(self, callback):
+        """Read the data from the cache, download it only if it changed."""
+        validators = self._ftp_validators()
+        cached = self._cache.lookup(self.url)
+
+        if validators is not None and cached is not None \
+           and cached.validators == validators:
+            logger.debug('Remote file unchanged (%s), using cached copy.',
+                         validators)
+            self._cache.touch(self.url)
+            if callback:
+                callback(cached.content)
+            return cached.content
+
+        data = self._ftp_retrieve(callback)
+        self._cache.store(self.url, data, validators)
+        return data
 
-        return data.getvalue()
+    def _ftp_retrieve(self, callback):
+        """Stream the remote file in binary mode."""
+        chunks = []
+
+        def receive(chunk):
+            chunks.append(chunk)
+            if callback:
+                callback(chunk)
+
+        logger.debug('Downloading %s over FTP.', self.path)
+        self._remote.retrbinary('RETR %s' % self.path, receive,
+                                self.blocksize)
+        return ''.join(chunks)
+
+    def close(self):
+        """
+        Close the FTP connection.
+        """
+        if isinstance(self._remote, ftplib.FTP):
+            try:
+                self._remote.quit()
+            except ftplib.all_errors:
+                self._remote.close()
@@ -5,39 +5,68 @@
 # check_ldap_account.py: check LDAP Account
 #
 #
-# Usage: check_ldap_account.py [-h] [--debug] [--version] 
+# Usage: check_ldap_account.py [-h] [--debug] [--version]
 #                              -H host_ad
-#                              -s account_search
+#                              (-s account_search [-s ...] | -f ldap_filter)
 #                              [-b base_dn]
 #                              [-l login] [-p password]
+#                              [--page-size size] [--batch-size size]
 #
 # Create: 14/01/2013
 # Author: BAILAT Patrick
 #
-# Modify: JJ/MM/AAAA
-# Author:
-# Object:
+# Modify: 03/11/2015
+# Author: Canux CHENG
+# Object: check several accounts in one bound session, using OR-ed filters and
+#         paged results, decode userAccountControl as a bit field.
 #
 ################################################################################
 
 import logging
 import traceback
 import ldap
-import time
+from ldap.controls import SimplePagedResultsControl
 from pprint import pformat
 from monitoring.nagios.plugin import NagiosPlugin
 
 logger = logging.getLogger('plugin.ldap')
 
-# define new args 
+# userAccountControl flags, see MS-ADTS 2.2.16
+ACCOUNT_FLAGS = [
+    (0x00000002, 'ACCOUNTDISABLE'),
+    (0x00000010, 'LOCKOUT'),
+    (0x00000020, 'PASSWD_NOTREQD'),
+    (0x00000200, 'NORMAL_ACCOUNT'),
+    (0x00010000, 'DONT_EXPIRE_PASSWORD'),
+    (0x00800000, 'PASSWORD_EXPIRED'),
+]
+NORMAL_ACCOUNT = 0x00000200
+DONT_EXPIRE_PASSWORD = 0x00010000
+KNOWN_FLAGS = reduce(lambda a, b: a | b, [flag for flag, _ in ACCOUNT_FLAGS])
+
+ATTRIBUTES = ['cn', 'userAccountControl']
+BASE_FILTER = '(&(objectClass=user)(objectcategory=person){0})'
+
+
+# define new args
 class PluginLdap(NagiosPlugin):
     def define_plugin_arguments(self):
         super(PluginLdap,self).define_plugin_arguments()
 
         self.required_args.add_argument('-s', '--accountsearch',
                                         dest="account_search",
-                                        help="Acount Search, an string",
-                                        required=True)
+                                        action="append",
+                                        help="Acount Search, an string. "
+                                             "Repeat it to check several "
+                                             "accounts at once",
+                                        )
+
+        self.required_args.add_argument('-f', '--filter',
+                                        dest="ldap_filter",
+                                        help="LDAP filter selecting the "
+                                             "accounts to check, eg. "
+                                             "'(memberOf=CN=...)'",
+                                        )
 
         self.required_args.add_argument('-l', '--login',
                                         dest="login_dn",
@@ -56,88 +85,189 @@ class PluginLdap(NagiosPlugin):
                                         help="Bese dn, an string",
                                         default='corp',
                                         )
+
+        self.parser.add_argument('--page-size',
+                                 dest="page_size",
+                                 type=int,
+                                 help="Entries per page of results (RFC 2696),"
+                                      " default to 500",
+                                 default=500,
+                                 )
+
+        self.parser.add_argument('--batch-size',
+                                 dest="batch_size",
+                                 type=int,
+                                 help="Accounts OR-ed in one search filter, "
+                                      "default to 100",
+                                 default=100,
+                                 )
+
+        self.parser.add_argument('-t', '--timeout',
+                                 dest="timeout",
+                                 type=int,
+                                 help="LDAP network and search timeout in "
+                                      "seconds, default to 30",
+                                 default=30,
+                                 )
+
+    def verify_plugin_arguments(self):
+        super(PluginLdap, self).verify_plugin_arguments()
+
+        if not self.options.account_search and not self.options.ldap_filter:
+            self.unknown('Missing accounts to check ! (option -s or -f)')
+        if self.options.page_size < 1 or self.options.batch_size < 1:
+            self.unknown('Page and batch sizes must be positive integers !')
+
+
+def escape_value(value):
+    """Escape an assertion value, but keep the * wildcard."""
+    for char, escaped in (('\\', r'\5c'), ('(', r'\28'), (')', r'\29'),
+                          ('\x00', r'\00')):
+        value = value.replace(char, escaped)
+    return value
+
+
+def account_filters(accounts, batch_size):
+    """Yield filters OR-ing at most batch_size accounts."""
+    for start in xrange(0, len(accounts), batch_size):
+        names = accounts[start:start + batch_size]
+        if len(names) == 1:
+            yield BASE_FILTER.format('(cn={0})'.format(escape_value(names[0])))
+        else:
+            yield BASE_FILTER.format('(|{0})'.format(''.join(
+                '(cn={0})'.format(escape_value(name)) for name in names)))
+
+
+def paged_search(connection, base, search_filter, page_size, timeout):
+    """Run a paged subtree search and yield (dn, attributes) entries."""
+    control = SimplePagedResultsControl(True, size=page_size, cookie='')
+    while True:
+        msgid = connection.search_ext(base, ldap.SCOPE_SUBTREE, search_filter,
+                                      ATTRIBUTES, serverctrls=[control],
+                                      timeout=timeout)
+        _, data, _, serverctrls = connection.result3(msgid, timeout=timeout)
+        for dn, attributes in data:
+            # Skip referrals returned by the global catalog
+            if dn is not None:
+                yield dn, attributes
+
+        cookies = [ctrl.cookie for ctrl in serverctrls
+                   if ctrl.controlType == SimplePagedResultsControl.controlType]
+        if not cookies or not cookies[0]:
+            break
+        control.cookie = cookies[0]
+
+
+def account_status(account_ctrl):
+    """
+    Return (status, flags) for a userAccountControl value.
+
+    Status is one of 'ok', 'warning' or 'critical'. Only a normal account
+    is fine, with a password that does not expire; any other flag combination
+    is critical.
+    """
+    flags = [name for flag, name in ACCOUNT_FLAGS if account_ctrl & flag]
+    unknown_flags = account_ctrl & ~KNOWN_FLAGS
+    if unknown_flags:
+        flags.append('0x{0:X}'.format(unknown_flags))
+
+    if account_ctrl == NORMAL_ACCOUNT | DONT_EXPIRE_PASSWORD:
+        status = 'ok'
+    elif account_ctrl == NORMAL_ACCOUNT:
+        status = 'warning'
+    else:
+        status = 'critical'
+    return status, flags
+
+
 # Init plugin
-plugin = PluginLdap(version="1.0",
+plugin = PluginLdap(version="1.1",
                     description="check Account LDAP" )
-plugin.shortoutput = "Account LDAP {0} exists".format(plugin.options.account_search)
-
 
-# Final status exit for the plugin
-status = None
+accounts = plugin.options.account_search or []
+if plugin.options.ldap_filter:
+    filters = [BASE_FILTER.format(plugin.options.ldap_filter)]
+    search_name = plugin.options.ldap_filter
+else:
+    filters = list(account_filters(accounts, plugin.options.batch_size))
+    search_name = ", ".join(accounts)
 
-# LDAP
+# LDAP, one bound session for all the searches
 try:
     l = ldap.initialize('ldap://{0}:3268'.format(plugin.options.hostname))
-    l.simple_bind(plugin.options.login_dn, plugin.options.passwd)
-except:
+    l.set_option(ldap.OPT_REFERRALS, 0)
+    l.set_option(ldap.OPT_NETWORK_TIMEOUT, plugin.options.timeout)
+    l.set_option(ldap.OPT_TIMEOUT, plugin.options.timeout)
+    l.simple_bind_s(plugin.options.login_dn, plugin.options.passwd)
+except ldap.LDAPError:
     plugin.unknown('LDAP connection error !\n{}'.format(traceback.format_exc()))
 
 # Search
+result = []
 try:
-    result = l.search_st('DC={0}'.format(plugin.options.base_dn), ldap.SCOPE_SUBTREE, '(&(objectClass=user)(objectcategory=person)(cn={0}))'.format(plugin.options.account_search), ['CN', 'UserAccountControl'], 0, 30)
-except:
+    for search_filter in filters:
+        logger.debug("filter: {0}".format(search_filter))
+        result.extend(paged_search(l, 'DC={0}'.format(plugin.options.base_dn),
+                                   search_filter, plugin.options.page_size,
+                                   plugin.options.timeout))
+except ldap.LDAPError:
+    plugin.unknown('LDAP search error !\n{}'.format(traceback.format_exc()))
+finally:
     try:
-        time.sleep( 5 )
-        result = l.search_st('DC={0}'.format(plugin.options.base_dn), ldap.SCOPE_SUBTREE, '(&(objectClass=user)(objectcategory=person)(cn={0}))'.format(plugin.options.account_search), ['CN', 'UserAccountControl'], 0, 30)
-    except:
-        plugin.unknown('LDAP search error !\n{}'.format(traceback.format_exc()))
-
+        l.unbind_s()
+    except ldap.LDAPError:
+        pass
 
 logger.debug("result:\n{0}".format(pformat(result)))
 
+# Accounts searched by exact name and not found
+found = set(attributes['cn'][0].lower() for _, attributes in result
+            if attributes.get('cn'))
+missing = [name for name in accounts
+           if '*' not in name and name.lower() not in found]
+
 if not result:
-    status=plugin.critical
-    plugin.shortoutput = "Account LDAP {0} no exists".format(plugin.options.account_search)
+    plugin.critical("Account LDAP {0} no exists".format(search_name))
+
+states = {'ok': [], 'warning': [], 'critical': []}
+for name in missing:
+    states['critical'].append("{0} : not found".format(name))
+
+for dn, attributes in result:
+    logger.debug(pformat((dn, attributes)))
+
+    cn = attributes['cn'][0] if attributes.get('cn') else dn
+    if not attributes.get('userAccountControl'):
+        states['warning'].append("no UserAccountControl for {0}".format(dn))
+        continue
+
+    account_ctrl = int(attributes['userAccountControl'][0])
+    state, flags = account_status(account_ctrl)
+    logger.info('{0}: {1} ({2})'.format(cn, ', '.join(flags), account_ctrl))
+    states[state].append("{0} : {1}".format(cn, ", ".join(flags)))
+
+problems = len(states['critical']) + len(states['warning'])
+if states['critical']:
+    status = plugin.critical
+elif states['warning']:
+    status = plugin.warning
 else:
     status = plugin.ok
-    msg = ""
-    msg_err = ""
-    for entry in result:
-        dn, attributes = entry
-        logger.debug(pformat(entry))
-        logger.debug(attributes)
-
-        if attributes.has_key('userAccountControl'):
-            account_ctrl = attributes['userAccountControl'].pop()
-            cn = attributes['cn'].pop()
-            logger.debug(account_ctrl)
-
-            if account_ctrl == '512':
-                logger.info('NORMAL_ACCOUNT')
-                plugin.shortoutput = "Problem UserAccountControl {0}".format(plugin.options.account_search)
-                status = plugin.warning
-                msg_err += "{0} : NORMAL_ACCOUNT\n".format(cn)
-            elif account_ctrl == '66048':
-                logger.info('DONT_EXPIRE_PASSWORD')
-                msg += "{0} : DONT_EXPIRE_PASSWORD\n".format(cn)
-            elif account_ctrl == '514':
-                logger.info('ACCOUNTDISABLE')
-                plugin.shortoutput = "Problem UserAccountControl {0}".format(plugin.options.account_search)
-                status = plugin.critical
-                msg_err += "{0} : ACCOUNTDISABLE\n".format(cn)
-            elif account_ctrl == '528':
-                logger.info('VERROUILLAGE')
-                plugin.shortoutput = "Problem UserAccountControl {0}".format(plugin.options.account_search)
-                status = plugin.critical
-                msg_err += "{0} : VERROUILLAGE\n".format(cn)
-            elif account_ctrl == '8388608' or account_ctrl == '8389120':
-                logger.info('PASSWORD_EXPIRED')
-                plugin.shortoutput = "Problem UserAccountControl {0}".format(plugin.options.account_search)
-                status = plugin.critical
-                msg_err += "{0} : PASSWORD_EXPIRED\n".format(cn)
-            else:
-                plugin.shortoutput = "Problem UserAccountControl {0}".format(plugin.options.account_search)
-                status = plugin.critical
-                msg_err += "{0} : UserAccountControl ({1})\n".format(cn, account_ctrl)
-        else:
-            status = plugin.warning
-            msg_err += "no UserAccountControl for {0} \n".format(dn)
 
-    plugin.longoutput.append("  -   Erreur :\n{0} \n  -  Normal : \n{1}".format(msg_err, msg))
+if problems:
+    plugin.shortoutput = "Problem UserAccountControl {0}".format(search_name) \
+        if len(accounts) == 1 else \
+        "Problem UserAccountControl for {0} of {1} accounts".format(
+            problems, len(result) + len(missing))
+elif len(accounts) == 1:
+    plugin.shortoutput = "Account LDAP {0} exists".format(search_name)
+else:
+    plugin.shortoutput = "All {0} LDAP accounts are fine".format(len(result))
+
+plugin.longoutput.append("  -   Erreur :\n{0} \n  -  Normal : \n{1}".format(
+    "\n".join(states['critical'] + states['warning']),
+    "\n".join(states['ok'])))
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
-if status:
-   status(plugin.output())
-else:
-   plugin.unknown('Unexpected error during plugin execution, please investigate with debug mode on.')
+status(plugin.output())
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Features of a license server, shared by the license manager backends.
+"""
+
+from datetime import datetime
+
+
+#-------------------------------------------------------------------------------
+# Features classes
+#-------------------------------------------------------------------------------
+
+class Feature(object):
+    """
+    Store data about a feature: name, used licenses and total.
+    """
+
+    __slots__ = ('name', 'used_licenses', 'total_licenses', 'expires')
+
+    def __init__(self, name, used_licenses, total_licenses, expire_date=None):
+        self.name = name
+
+        # Raise ValueError on wrong data
+        self.used_licenses = long(used_licenses)
+        self.total_licenses = long(total_licenses)
+        if expire_date:
+            self.expires = datetime.strptime(expire_date, '%Y-%m-%d')
+        else:
+            self.expires = None
+
+    def __str__(self):
+        """Print feature data as text to be used in Nagios long output."""
+        return '{0:>s}: {1:d} / {2:d}'.format(self.name,
+                                              self.used_licenses,
+                                              self.total_licenses)
+
+    def print_perfdata(self, prefix=''):
+        """Print feature performance data string."""
+        return '\'{0:>s}{1:>s}\'={2:d};;;0;{3:d}'.format(prefix,
+                                                         self.name,
+                                                         self.used_licenses,
+                                                         self.total_licenses)
+
+
+class Features(object):
+    """
+    This class stores all features objects. She is able to compute some
+    global stats about licenses usage.
+
+    Totals are updated when a feature is added and features are indexed by
+    name, so stats are available without iterating over all features again.
+    """
+
+    __slots__ = ('features', 'index', 'total_licenses', 'used_licenses')
+
+    today_date = datetime.today()
+
+    # Class customization
+    def __init__(self):
+        self.features = []
+        self.index = {}
+        self.total_licenses = 0
+        self.used_licenses = 0
+
+    def __iter__(self):
+        return iter(self.features)
+
+    def __len__(self):
+        return len(self.features)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __setitem__(self, key, value):
+        old = self.features[key]
+        self.features[key] = value
+        self._remove(old)
+        self._add(value)
+
+    def __getitem__(self, key):
+        """
+        Get a feature by position, or by name if key is a string.
+        """
+        if isinstance(key, basestring):
+            return self.index[key]
+        return self.features[key]
+
+    def __str__(self):
+        """
+        Return the Nagios output when all is OK.
+        """
+        return 'usage: %d / %d license(s) available.' % (
+            self.used_licenses, self.total_licenses)
+
+    # Private methods
+    def _add(self, feature):
+        self.total_licenses += feature.total_licenses
+        self.used_licenses += feature.used_licenses
+        self.index[feature.name] = feature
+
+    def _remove(self, feature):
+        self.total_licenses -= feature.total_licenses
+        self.used_licenses -= feature.used_licenses
+        if self.index.get(feature.name) is feature:
+            del self.index[feature.name]
+            # Index the last remaining feature with the same name, if any
+            for other in reversed(self.features):
+                if other.name == feature.name:
+                    self.index[feature.name] = other
+                    break
+
+    # Public methods
+    def append(self, value):
+        """
+        Lists append-like
+        """
+        self.features.append(value)
+        self._add(value)
+
+    def merge(self, features):
+        """
+        Add features of another license server of the same quorum. Features
+        already known by name are skipped, so redundant servers are not
+        counted several times.
+        """
+        known = set(self.index)
+        for feature in features:
+            if feature.name not in known:
+                self.append(feature)
+
+    def get(self, name, default=None):
+        """
+        Return the feature named name, default if there is not.
+        """
+        return self.index.get(name, default)
+
+    def calc_total_licenses(self):
+        """
+        Return the total number of available licenses for all features.
+        """
+        return self.total_licenses
+
+    def calc_used_licenses(self):
+        """
+        Return the total number of used licenses.
+        """
+        return self.used_licenses
+
+    def calc_expired_license(self):
+        """
+        Return a dictionnary with the feature name as the key and a tuple
+        (days_before_expiration, expiration_date).
+        """
+        today = Features.today_date
+        expire_list = {}
+        for name, feature in self.index.iteritems():
+            if feature.expires is None:
+                continue
+            expire_list[name] = (max((feature.expires - today).days, 0),
+                                 feature.expires)
+        return expire_list
+
+    def calc_expiration_buckets(self, warning_days=15):
+        """
+        Sort features by expiration in one pass. Return a tuple of three lists
+        (expired, about_to_expire, valid), each one containing
+        (feature, days_before_expiration) tuples.
+
+        A feature expires on its expiration date, it is about to expire when
+        it expires within warning_days days.
+        """
+        today = Features.today_date
+        expired, about_to_expire, valid = [], [], []
+        for feature in self.index.itervalues():
+            if feature.expires is None:
+                continue
+            days = max((feature.expires - today).days, 0)
+            if not days:
+                expired.append((feature, days))
+            elif days <= warning_days:
+                about_to_expire.append((feature, days))
+            else:
+                valid.append((feature, days))
+        return expired, about_to_expire, valid
+
+    def print_perfdata(self, prefix=''):
+        """
+        Construct and return the perfdata string for all features.
+        """
+        return ' | ' + ' '.join(feature.print_perfdata(prefix)
+                                for feature in self.features)
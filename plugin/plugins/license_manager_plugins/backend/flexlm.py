@@ -22,10 +22,11 @@
 # TODO: Check how to group status() and expiration() as a single function.
 
 import re
-import subprocess
 
 # Plugin configuration
 import config
+from backend.features import Feature, Features
+from backend.poller import run_command, CommandTimeout
 
 
 #-------------------------------------------------------------------------------
@@ -39,44 +40,106 @@ class FlexlmStatusError(Exception):
         self.license = license
 
 
+#-------------------------------------------------------------------------------
+# FlexLM classes
+#-------------------------------------------------------------------------------
+class StatusParser(object):
+    """Build features from 'lmstat' output, fed one line at a time."""
+
+    regexp_vendor_daemon = re.compile(r'\s*(.*): UP')
+    regexp_feature_name = re.compile(r'^Users of (.*):')
+    regexp_feature_stats = re.compile(r'^Users of .*: .* of (?P<total>\d+) .* issued; .* of (?P<in_use>\d+) .* in use')
+
+    def __init__(self):
+        self.vendor_daemon = ""
+        self.features = Features()
+        self.features_in_error = []
+
+    def feed(self, line):
+        """Parse one line of output."""
+        match = self.regexp_vendor_daemon.search(line)
+        if match:
+            self.vendor_daemon = match.group(1)
+            return
+
+        match_feature_line = self.regexp_feature_name.search(line)
+        if match_feature_line:
+            name = match_feature_line.group(1)
+            # Checking if this is possible to get stats from the feature
+            match_feature_stats = self.regexp_feature_stats.search(line)
+            if match_feature_stats:
+                self.features.append(Feature(name,
+                                             match_feature_stats.group('in_use'),
+                                             match_feature_stats.group('total')))
+            else:
+                self.features_in_error.append(name)
+
+
 #-------------------------------------------------------------------------------
 # FlexLM related
 #-------------------------------------------------------------------------------
-def status(license_port, timeout="30", with_stat=False):
-    """Execute a 'lmstat -a' command using lmutil on a remote server"""
-    cmdline = [config.LMUTIL_PATH, "lmstat", "-t", timeout, "-c", license_port]
-    if with_stat:
-        cmdline.append('-a')
-    
-    cmd = subprocess.Popen(cmdline, stdout=subprocess.PIPE)
-    cmd_output = cmd.communicate()[0].split('\n')
-    
+def _lmstat(cmdline, license_port, timeout, callback):
+    """Run lmstat, giving each output line to callback."""
+    last_line = ['']
+
+    def handle(line):
+        if line:
+            last_line[0] = line
+        callback(line)
+
+    # Let lmutil handle its own timeout, the watchdog is for hung commands
+    try:
+        retcode = run_command(cmdline, handle, timeout=int(timeout) + 10)
+    except CommandTimeout:
+        raise FlexlmStatusError("License server not responding !", -1,
+                                license_port)
+    except OSError as e:
+        raise FlexlmStatusError("Cannot execute lmutil: %s" % e.strerror, -1,
+                                license_port)
+
     # Check return code
-    if cmd.returncode != 0:
+    if retcode != 0:
         # Get error message
         error_pattern = re.compile('Error getting status: (.*). \(.*\)')
-        error_match = error_pattern.search(cmd_output[-1])
+        error_match = error_pattern.search(last_line[0])
         if error_match: error_message = error_match.group(1).title()
         else: error_message = "License server not available !"
-        raise FlexlmStatusError(error_message, cmd.returncode, license_port)
-    
-    return cmd_output
+        raise FlexlmStatusError(error_message, retcode, license_port)
+
 
+def status(license_port, timeout="30", with_stat=False, callback=None):
+    """
+    Execute a 'lmstat -a' command using lmutil on a remote server.
 
-def expiration(license_port, timeout=60):
+    Output lines are given to callback as soon as they are read, if any.
+    Return the output lines otherwise.
+    """
+    cmdline = [config.LMUTIL_PATH, "lmstat", "-t", str(timeout), "-c", license_port]
+    if with_stat:
+        cmdline.append('-a')
+
+    if callback:
+        _lmstat(cmdline, license_port, timeout, callback)
+    else:
+        cmd_output = []
+        _lmstat(cmdline, license_port, timeout, cmd_output.append)
+        return cmd_output
+
+
+def status_features(license_port, timeout="30", with_stat=False):
+    """Return a StatusParser filled with 'lmstat' results."""
+    parser = StatusParser()
+    status(license_port, timeout, with_stat, callback=parser.feed)
+    return parser
+
+
+def expiration(license_port, timeout=60, callback=None):
     """Execute a 'lmstat -i' command using lmutil on a remote server"""
-    cmdline = [config.LMUTIL_PATH, "lmstat", "-t", timeout, "-c", license_port, '-i']
-    
-    cmd = subprocess.Popen(cmdline, stdout=subprocess.PIPE)
-    cmd_output = cmd.communicate()[0].split('\n')
-    
-    # Check return code
-    if cmd.returncode != 0:
-        # Get error message
-        error_pattern = re.compile('Error getting status: (.*). \(.*\)')
-        error_match = error_pattern.search(cmd_output[-1])
-        if error_match: error_message = error_match.group(1).title()
-        else: error_message = "License server not available !"
-        raise FlexlmStatusError(error_message, cmd.returncode, license_port)
-    
-    return cmd_output
+    cmdline = [config.LMUTIL_PATH, "lmstat", "-t", str(timeout), "-c", license_port, '-i']
+
+    if callback:
+        _lmstat(cmdline, license_port, timeout, callback)
+    else:
+        cmd_output = []
+        _lmstat(cmdline, license_port, timeout, cmd_output.append)
+        return cmd_output
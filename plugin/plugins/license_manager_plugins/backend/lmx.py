@@ -20,11 +20,12 @@
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import subprocess
-from datetime import datetime
-from nagios.errorlevels import NagiosUnknown
+from xml.etree.ElementTree import XMLParser, ParseError
 
 # Plugin configuration
 import config
+from backend.features import Feature, Features
+from backend.poller import run_command, CommandTimeout
 
 
 #-------------------------------------------------------------------------------
@@ -46,142 +47,106 @@ class LmxStatusError(Exception):
 # Lmx classes
 #-------------------------------------------------------------------------------
 
-class Feature(object):
+class StatusParser(object):
     """
-    Store data about a feature: name, used licenses and total.
+    XML parser target building features from 'lmxendutil -licstatxml' output
+    while it is read.
     """
 
-    def __init__(self, name, used_licenses, total_licenses, expire_date):
-        self.name = name
+    def __init__(self):
+        self.features = Features()
 
-        try:
-            self.used_licenses = long(used_licenses)
-            self.total_licenses = long(total_licenses)
-            self.expires = datetime.strptime(expire_date, '%Y-%m-%d')
-        except ValueError as e:
-            raise NagiosUnknown('Exception: %s' % e)
-
-    def __str__(self):
-        """Print feature data as text to be used in Nagios long output."""
-        return '{0:>s}: {1:d} / {2:d}'.format(self.name,
-                                              self.used_licenses,
-                                              self.total_licenses)
-
-    def print_perfdata(self):
-        """Print feature performance data string."""
-        return '\'{0:>s}\'={1:d};;;0;{2:d}'.format(self.name,
-                                                   self.used_licenses,
-                                                   self.total_licenses)
-
-
-class Features(object):
-    """
-    This class stores all features objects. She is able to compute some
-    global stats about licenses usage.
-    """
+    def start(self, tag, attrib):
+        if tag == 'FEATURE':
+            self.features.append(Feature(attrib.get('NAME'),
+                                         attrib.get('USED_LICENSES'),
+                                         attrib.get('TOTAL_LICENSES'),
+                                         attrib.get('END')))
 
-    today_date = datetime.today()
+    def end(self, tag):
+        pass
 
-    # Class customization
-    def __init__(self):
-        self.features = []
-
-    def __iter__(self):
-        return iter(self.features)
-
-    def __len__(self):
-        return len(self.features)
-    
-    def __setitem__(self, key, value):
-        self.features[key] = value
-
-    def __getitem__(self, key):
-        return self.features[key]
-
-    def __str__(self):
-        """
-        Return the Nagios output when all is OK.
-        """
-        return 'LM-X: usage: %d / %d license(s) available.' % (
-            self.calc_used_licenses(), self.calc_total_licenses())
-
-    # Public methods
-    def append(self, value):
-        """
-        Lists append-like
-        """
-        self.features.append(value)
-
-    def calc_total_licenses(self):
-        """
-        Calculate the total number of available licenses for all features.
-        """
-        total = 0
-        for feature in self:
-            total += feature.total_licenses
-        return total
-
-    def calc_used_licenses(self):
-        """
-        Calculate the total number of used licenses.
-        """
-        in_use = 0
-        for feature in self:
-            in_use += feature.used_licenses
-        return in_use
-
-    def calc_expired_license(self):
-        """
-        Return a dictionnary with the feature name as the key and a tuple
-        (days_before_expiration, expiration_date).
-        """
-        remains = 0
-        expire_list = {}
-        for feature in self:
-            td = feature.expires - Features.today_date
-            if td.days < 0:
-                remains = 0
-            else:
-                remains = td.days
-            expire_list[feature.name] = (remains, feature.expires)
-        return expire_list
-
-    def print_perfdata(self):
-        """
-        Construct and return the perfdata string for all features.
-        """
-        perfdatas = [' |']
-        for feature in self:
-            perfdatas.append(feature.print_perfdata())
-        return " ".join(perfdatas)
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self.features
 
 
 #-------------------------------------------------------------------------------
 # Lmx functions
 #-------------------------------------------------------------------------------
 
-def status_xml(remote_host, license_port):
+def _licstatxml(remote_host, license_port, callback, timeout=None):
     """
-    Execute a 'lmxendutil' command on a remote server. Return results as XML.
+    Execute a 'lmxendutil' command on a remote server and give callback each
+    line of the XML output.
     """
 
     cmdline = [config.LMXENDUTIL_PATH,
                "-licstatxml",
                "-host", remote_host,
                '-port', license_port]
+    license = '%s@%s' % (license_port, remote_host)
 
-    cmd = subprocess.Popen(cmdline,
-                           stdout=subprocess.PIPE,
-                           stderr=subprocess.STDOUT)
-    cmd_output = cmd.communicate()[0]
+    # Make output to be XML. Skip first 3 lines that includes software name
+    # and copyright informations.
+    lines = [0]
 
-    if cmd.returncode:
-        raise LmxStatusError("Unexpected error !",
-                             cmd.returncode, '%s@%s' % (license_port,
-                                                        remote_host))
+    def handle(line):
+        lines[0] += 1
+        if lines[0] > 3:
+            callback(line)
 
-    # Make output to be XML. Remove first 3 lines that includes software name
-    # and copyright informations.
-    xml_data = "\n".join(cmd_output.split('\n')[3:])
+    try:
+        retcode = run_command(cmdline, handle, timeout=timeout,
+                              stderr=subprocess.STDOUT)
+    except CommandTimeout:
+        raise LmxStatusError("License server not responding !", -1, license)
+    except OSError as e:
+        raise LmxStatusError("Cannot execute lmxendutil: %s" % e.strerror, -1,
+                             license)
+
+    if retcode:
+        raise LmxStatusError("Unexpected error !", retcode, license)
+
+
+def status_xml(remote_host, license_port, timeout=None):
+    """
+    Execute a 'lmxendutil' command on a remote server. Return results as XML.
+    """
+
+    lines = []
+    _licstatxml(remote_host, license_port, lines.append, timeout)
+
+    return "\n".join(lines)
+
+
+def status(remote_host, license_port, timeout=None):
+    """
+    Execute a 'lmxendutil' command on a remote server. Return a Features
+    object, parsing the XML output while it is read.
+    """
+
+    parser = XMLParser(target=StatusParser())
+    errors = []
+
+    def feed(line):
+        if errors:
+            return
+        try:
+            parser.feed(line + '\n')
+        except (ParseError, ValueError, TypeError) as e:
+            # Keep reading so that lmxendutil is not blocked on a full pipe
+            errors.append(e)
+
+    _licstatxml(remote_host, license_port, feed, timeout)
+
+    if not errors:
+        try:
+            return parser.close()
+        except ParseError as e:
+            errors.append(e)
 
-    return xml_data
\ No newline at end of file
+    raise LmxStatusError("Invalid XML output: %s" % errors[0], 0,
+                         '%s@%s' % (license_port, remote_host))
@@ -23,10 +23,10 @@
 
 import re
 import subprocess
-from nagios.errorlevels import NagiosOk
 
 # Plugin configuration
 import config
+from backend.poller import run_command, CommandTimeout
 
 #-------------------------------------------------------------------------------
 # Exceptions
@@ -38,28 +38,73 @@ class LstcStatusError(Exception):
         self.retcode = retcode
         self.license = license
 
+class LstcExecutionError(LstcStatusError):
+    """Exception raised when lstc_qrun cannot be executed"""
+
 #-------------------------------------------------------------------------------
 # Lstc related
 #-------------------------------------------------------------------------------
-def status(license_port):
-    """Execute a 'lstc_qrun -s' command using lstc_qrun on a remote server"""
-    cmdline = [config.LSTCQRUN_PATH, "-s", license_port]
-    
-    cmd = subprocess.Popen(cmdline, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    cmd_output = cmd.communicate()[0]
-
+def _qrun(cmdline, license_port, callback, timeout=None):
+    """
+    Run lstc_qrun, giving each output line to callback. Return False if there
+    is no program running or queued.
+    """
     # Warn for error message if any
     error_pattern = re.compile('.*ERROR (.*)')
-    error_match = error_pattern.search(cmd_output)
-    if error_match:
-        error_message = error_match.group(1)
-        raise LstcStatusError(error_message, cmd.returncode, license_port)
+    errors = []
+
+    def handle(line):
+        error_match = error_pattern.search(line)
+        if error_match:
+            errors.append(error_match.group(1))
+        callback(line)
+
+    try:
+        retcode = run_command(cmdline, handle, timeout=timeout,
+                              stderr=subprocess.STDOUT)
+    except CommandTimeout:
+        raise LstcStatusError("License server not responding !", -1,
+                              license_port)
+    except OSError as e:
+        raise LstcExecutionError("Cannot execute lstc_qrun: %s" % e.strerror,
+                                 -1, license_port)
+
+    if errors:
+        raise LstcStatusError(errors[0], retcode, license_port)
 
     # Check return code
-    if cmd.returncode == 0:
-        raise NagiosOk("There is no program running or queued.")
-    
-    return cmd_output.split('\n')
+    return retcode != 0
+
+
+def status(license_port, timeout=None):
+    """
+    Execute a 'lstc_qrun -s' command using lstc_qrun on a remote server.
+
+    Return the output lines, or None if there is no program running or queued.
+    """
+    cmdline = [config.LSTCQRUN_PATH, "-s", license_port]
+    cmd_output = []
+
+    if _qrun(cmdline, license_port, cmd_output.append, timeout):
+        return cmd_output
+
+
+def connected_users(license_port, timeout=None):
+    """
+    Return the list of (user, host) running programs, parsed while lstc_qrun
+    output is read, or None if there is no program running or queued.
+    """
+    cmdline = [config.LSTCQRUN_PATH, "-s", license_port]
+    connected_users_pattern = re.compile(r'^(?:\s+|)(\w+)\s+(\d+@[\w\d.]+)')
+    users = []
+
+    def parse(line):
+        connected_users_match = connected_users_pattern.search(line)
+        if connected_users_match:
+            users.append(connected_users_match.groups())
+
+    if _qrun(cmdline, license_port, parse, timeout):
+        return users
 
 def expiration(license_port):
     """Execute a 'lstc_qrun -r -s' command using lstc_qrun on a remote server"""
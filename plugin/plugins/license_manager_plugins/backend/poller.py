@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Run license manager commands concurrently.
+
+Each command output is handed line by line to a callback as soon as it is
+read, so parsers can build their objects without waiting for the whole
+output. A watchdog kills commands that do not finish in time.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+from Queue import Queue, Empty
+
+# Parsers run in threads call datetime.strptime() whose first call is not
+# thread safe, see http://bugs.python.org/issue7980.
+import _strptime
+
+
+#-------------------------------------------------------------------------------
+# Exceptions
+#-------------------------------------------------------------------------------
+
+class CommandTimeout(Exception):
+    """
+    Exception raised when a command is killed by the watchdog.
+    """
+
+    def __init__(self, cmdline, timeout):
+        super(CommandTimeout, self).__init__(
+            '%s timed out after %s seconds' % (cmdline[0], timeout))
+        self.cmdline = cmdline
+        self.timeout = timeout
+
+
+#-------------------------------------------------------------------------------
+# Poller functions
+#-------------------------------------------------------------------------------
+
+def run_command(cmdline, callback, timeout=None, stderr=None):
+    """
+    Execute cmdline and call callback(line) for each line of its output, with
+    the line ending stripped. Return the command return code.
+
+    The command is killed and CommandTimeout is raised if it is still running
+    after timeout seconds.
+    """
+
+    # Own process group on POSIX, so that children keeping the output pipe
+    # open are killed too.
+    posix = os.name == 'posix'
+    cmd = subprocess.Popen(cmdline,
+                           stdout=subprocess.PIPE,
+                           stderr=stderr,
+                           preexec_fn=os.setsid if posix else None)
+
+    expired = threading.Event()
+
+    def kill():
+        expired.set()
+        try:
+            if posix:
+                os.killpg(cmd.pid, signal.SIGKILL)
+            else:
+                cmd.kill()
+        except OSError:
+            pass
+
+    watchdog = None
+    if timeout:
+        watchdog = threading.Timer(float(timeout), kill)
+        watchdog.daemon = True
+        watchdog.start()
+
+    try:
+        for line in iter(cmd.stdout.readline, ''):
+            callback(line.rstrip('\r\n'))
+    except BaseException:
+        kill()
+        cmd.wait()
+        raise
+    finally:
+        cmd.stdout.close()
+        if watchdog:
+            watchdog.cancel()
+            watchdog.join()
+
+    retcode = cmd.wait()
+    if expired.is_set():
+        raise CommandTimeout(cmdline, timeout)
+
+    return retcode
+
+
+def poll(queries, workers=4):
+    """
+    Run queries concurrently using at most workers threads.
+
+    queries is a list of (key, function, args) tuples. Return a list of
+    (key, result, error) tuples in the same order, error being the exception
+    raised by function(*args) or None.
+    """
+
+    results = [(key, None, None) for key, _, _ in queries]
+    pending = Queue()
+    for position, query in enumerate(queries):
+        pending.put((position, query))
+
+    def worker():
+        while True:
+            try:
+                position, (key, function, args) = pending.get_nowait()
+            except Empty:
+                return
+            try:
+                results[position] = (key, function(*args), None)
+            except Exception as e:
+                results[position] = (key, None, e)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(max(1, min(workers, len(queries))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
@@ -21,117 +21,118 @@
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 # Python Std Lib
-import re
 import backend.flexlm
 import backend.util
-from nagios.errorlevels import NagiosCritical, NagiosOk
+from backend.poller import poll
+from nagios.errorlevels import NagiosCritical, NagiosWarning, NagiosOk
 from nagios.arguments import process_plugin_options
 
 
-def format_perfdata(features):
+def format_perfdata(features, prefix=''):
     """Format the output of performance data"""
-    perfdata = " | "
-    for feature in features:
-        if feature["status"] == "OK":
-            perfdata += "'%s'=%s;;;0;%s " % (feature["name"], feature["in_use"], feature["total"])
-    
-    return perfdata.rstrip()
+    return features.print_perfdata(prefix).rstrip()
+
+
+def check_server(result, with_stat, nolongoutput, prefix=''):
+    """
+    Return the status (a Nagios exception class), output and perfdata for one
+    license server.
+    """
+    vendor_daemon = result.vendor_daemon
+    features = result.features
+
+    if len(vendor_daemon) == 0:
+        return NagiosCritical, "No vendor daemon is running !", ""
+
+    if not with_stat:
+        return NagiosOk, "Vendor daemon %s is up !" % vendor_daemon, ""
+
+    # Formating Nagios output
+    #
+    nagios_longoutput = ""
+    nagios_perfdata = format_perfdata(features, prefix)
+
+    # Output if errors are found in features
+    if result.features_in_error:
+        if not nolongoutput:
+            for name in result.features_in_error:
+                nagios_longoutput += "Feature: %s\n" % name
+
+        nagios_output = "%s: %d feature(s) in error(s) !\n%s" % (vendor_daemon, len(result.features_in_error), nagios_longoutput.rstrip('\n'))
+        return NagiosCritical, nagios_output, nagios_perfdata
+
+    # Output when everything is fine
+    #
+    if not nolongoutput:
+        for feature in features:
+            nagios_longoutput += "Feature '%s': %d / %d\n" % (feature.name, feature.used_licenses, feature.total_licenses)
+
+    nagios_output = "%s: usage: %d / %d license(s) available.\n%s" % (vendor_daemon, features.calc_used_licenses(), features.calc_total_licenses(), nagios_longoutput.rstrip('\n'))
+    return NagiosOk, nagios_output, nagios_perfdata
 
 
 def run():
     """Execute the plugin"""
     # Plugin arguments
     options = process_plugin_options()
-    
-    # Get the output of lmutil / lmstat, catching errors
-    try:
-        if options.debug:
-            output = backend.util.test_from_file("../tests/lmstat_status.txt")
-        else:
-            output = backend.flexlm.status("%s" % options.license,
-                                           options.timeout,
-                                           options.with_stat)
-    except backend.flexlm.FlexlmStatusError as e:
-        raise NagiosCritical("%s (code: %s, license: '%s') !" % (e.errmsg, e.retcode, e.license))
-    
-    # Some globals
-    all_feature_stats = []             # Store all features statistics
-    feature_error = 0                  # Counter for the number of feature in error
-    total_license_available = 0        # The total license available (sum of total license issued for all features)
-    total_license_used = 0             # The total license in use (sum of total license in use for all features)
-    vendor_daemon = ""                 # Store the vendor daemon name
-    
-    # Compile regexp used to check output
-    regexp_vendor_daemon = re.compile(r'\s*(.*): UP')
-    regexp_feature_name = re.compile(r'^Users of (.*):')
-    regexp_feature_stats = re.compile(r'^Users of .*: .* of (?P<total>\d+) .* issued; .* of (?P<in_use>\d+) .* in use')
-
-    # Checking if Vendor daemon is UP
-    for line in output:
-        match = regexp_vendor_daemon.search(line)
-        if match:
-            vendor_daemon = match.group(1)
-    
-    if len(vendor_daemon) == 0:
-        raise NagiosCritical("No vendor daemon is running !")
-
-    if options.with_stat:
-        # Retrieve features informations
-        for line in output:
-            feature = {
-                       'name': '',
-                       'in_use': '0',
-                       'total': '0',
-                       'status': '',
-            }
-            match_feature_line = regexp_feature_name.search(line)
-            if match_feature_line:
-                # Store feature name
-                feature["name"] = match_feature_line.group(1)
-
-                # Checking if this is possible to get stats from the feature
-                match_feature_stats = regexp_feature_stats.search(line)
-                if match_feature_stats:
-                    feature.update(match_feature_stats.groupdict())
-                    feature["status"] = "OK"
-
-                    # Calculate some stats about license usage
-                    total_license_available += int(feature["total"])
-                    total_license_used += int(feature["in_use"])
-                else:
-                    feature["status"] = "ERROR"
-                    feature_error+=1
-
-                all_feature_stats.append(feature)
-
-        # Formating Nagios output
-        #
-        nagios_output = ""
-        nagios_longoutput = ""
-        nagios_perfdata = format_perfdata(all_feature_stats)
-
-        # Output if errors are found in features
-        if feature_error > 0:
-            if not options.nolongoutput:
-                for feature in all_feature_stats:
-                    if feature["status"] == "ERROR":
-                        nagios_longoutput += "Feature: %s\n" % feature["name"]
-
-            nagios_output = "%s: %d feature(s) in error(s) !\n%s" % (vendor_daemon, feature_error, nagios_longoutput.rstrip('\n'))
-            raise NagiosCritical(nagios_output + nagios_perfdata)
-
-        # Output when everything is fine
-        #
-        if not options.nolongoutput:
-            for feature in all_feature_stats:
-                nagios_longoutput += "Feature '%s': %s / %s\n" % (feature["name"], feature["in_use"], feature["total"])
-
-        nagios_output = "%s: usage: %d / %d license(s) available.\n%s" % (vendor_daemon, total_license_used, total_license_available, nagios_longoutput.rstrip('\n'))
-
-        raise NagiosOk(nagios_output + nagios_perfdata)
+    licenses = options.license.split(',')
+
+    # Get the output of lmutil / lmstat of all license servers, catching errors
+    if options.debug:
+        parser = backend.flexlm.StatusParser()
+        for line in backend.util.test_from_file("../tests/lmstat_status.txt"):
+            parser.feed(line.rstrip('\r\n'))
+        results = [(licenses[0], parser, None)]
+    else:
+        results = poll([(license, backend.flexlm.status_features,
+                         (license, options.timeout, options.with_stat))
+                        for license in licenses], options.workers)
+
+    # Only one license server
+    if len(results) == 1:
+        license, result, error = results[0]
+        if isinstance(error, backend.flexlm.FlexlmStatusError):
+            raise NagiosCritical("%s (code: %s, license: '%s') !" % (error.errmsg, error.retcode, error.license))
+        elif error:
+            raise error
+        status, nagios_output, nagios_perfdata = check_server(result, options.with_stat, options.nolongoutput)
+        raise status(nagios_output + nagios_perfdata)
+
+    # Several license servers, give results for each of them
+    servers_down = 0
+    features_in_error = False
+    nagios_longoutput = ""
+    nagios_perfdata = ""
+    for license, result, error in results:
+        if isinstance(error, backend.flexlm.FlexlmStatusError):
+            servers_down += 1
+            nagios_longoutput += "\n%s: %s (code: %s) !" % (license, error.errmsg, error.retcode)
+            continue
+        elif error:
+            raise error
+
+        status, output, perfdata = check_server(result, options.with_stat, options.nolongoutput, '%s:' % license)
+        if status is not NagiosOk:
+            if result.vendor_daemon:
+                features_in_error = True
+            else:
+                servers_down += 1
+        nagios_longoutput += "\n%s: %s" % (license, output.rstrip('\n'))
+        if perfdata.lstrip(' |'):
+            nagios_perfdata += " " + perfdata.lstrip(' |')
+
+    nagios_output = "%d / %d license server(s) up." % (len(results) - servers_down, len(results))
+    if nagios_perfdata:
+        nagios_perfdata = " |" + nagios_perfdata
+
+    if servers_down == len(results) or features_in_error:
+        status = NagiosCritical
+    elif servers_down:
+        status = NagiosWarning
     else:
-        raise NagiosOk("Vendor daemon %s is up !" % vendor_daemon)
-    
+        status = NagiosOk
+    raise status(nagios_output + nagios_longoutput + nagios_perfdata)
+
 # Main
 if __name__ == "__main__":
     run()
@@ -20,10 +20,10 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import xml.dom.minidom as XML
-
+import backend.features
 import backend.lmx
 import backend.util
+from backend.poller import poll
 from nagios.errorlevels import NagiosCritical, NagiosWarning, NagiosOk, NagiosUnknown
 from nagios.arguments import process_plugin_options, argparser
 
@@ -47,76 +47,93 @@ def run():
     if not options.mode:
         raise NagiosUnknown("Syntax error: missing mode information !")
 
-    # Get the output of license manager command, catching errors
-    try:
-        output = backend.lmx.status_xml("%s" % options.license, options.port)
-    except backend.lmx.LmxStatusError as e:
-        raise NagiosCritical("%s (code: %s, license: '%s') !" % (e.errmsg,
-                                                                 e.retcode,
-                                                                 e.license))
-
-    # Process XML data
-    xml_data = XML.parseString(output)
-    all_features_tags = xml_data.getElementsByTagName('FEATURE')
-
-    if not len(all_features_tags):
-        raise NagiosCritical(
-            'Problem to query LM-X license manager '
-            'on port %s from host %s !' % (options.port, options.license))
-
-    # Get all features and compute stats (used, free, total licenses...)
-    features = backend.lmx.Features()
-
-    for node_feature in all_features_tags:
-        feature = node_feature.getAttribute('NAME')
-        used_licenses = node_feature.getAttribute('USED_LICENSES')
-        total_licenses = node_feature.getAttribute('TOTAL_LICENSES')
-        expire_date = node_feature.getAttribute('END')
-
-        feature = backend.lmx.Feature(feature,
-                                      used_licenses,
-                                      total_licenses,
-                                      expire_date)
-        features.append(feature)
+    # Query all license servers at once, features are built while the XML
+    # output is read.
+    servers = [(host, port)
+               for host in options.license.split(',')
+               for port in options.port.split(',')]
+    results = poll([('%s@%s' % (port, host), backend.lmx.status,
+                     (host, port, options.timeout))
+                    for host, port in servers], options.workers)
+
+    # Get all features and compute stats (used, free, total licenses...) for
+    # each license server. Servers of a quorum serve the same features, so
+    # they are only merged by name for expiration.
+    features = backend.features.Features()
+    servers_features = []
+    servers_errors = []
+
+    for (host, port), (license, server_features, error) in zip(servers,
+                                                              results):
+        if isinstance(error, backend.lmx.LmxStatusError):
+            servers_errors.append("%s (code: %s, license: '%s') !" % (
+                error.errmsg, error.retcode, error.license))
+            continue
+        elif error:
+            raise error
+
+        if not len(server_features):
+            servers_errors.append(
+                'Problem to query LM-X license manager '
+                'on port %s from host %s !' % (port, host))
+            continue
+
+        servers_features.append((license, server_features))
+        features.merge(server_features)
+
+    if not servers_features:
+        raise NagiosCritical("\n".join(servers_errors))
 
     # Format Nagios output
     # --------------------
     #
     # STATUS
     if options.mode == 'status':
-        nagios_output = str(features)
+        if len(servers) == 1:
+            nagios_output = 'LM-X: %s' % features
+            nagios_perfdata = features.print_perfdata()
+        else:
+            nagios_output = 'LM-X: %d / %d license server(s) up.' % (
+                len(servers_features), len(servers))
+            nagios_perfdata = ' |' + ''.join(
+                server_features.print_perfdata('%s:' % license)[2:]
+                for license, server_features in servers_features)
         nagios_longoutput = ''
-        nagios_perfdata = features.print_perfdata()
 
         # Must we show long output ?
         if not options.nolongoutput:
-            nagios_longoutput = '\nFeatures details:\n\n'
-            for feature in features:
-                nagios_longoutput += '%s\n' % feature
-
+            if servers_errors:
+                nagios_longoutput += '\n%s\n' % '\n'.join(servers_errors)
+            if len(servers) == 1:
+                nagios_longoutput += '\nFeatures details:\n\n'
+                for feature in features:
+                    nagios_longoutput += '%s\n' % feature
+            else:
+                for license, server_features in servers_features:
+                    nagios_longoutput += '\n%s: %s\n' % (license,
+                                                          server_features)
+                    for feature in server_features:
+                        nagios_longoutput += '%s\n' % feature
+
+        if servers_errors:
+            raise NagiosWarning(nagios_output + nagios_longoutput +
+                                nagios_perfdata)
         raise NagiosOk(nagios_output + nagios_longoutput + nagios_perfdata)
     # EXPIRATION
     elif options.mode == 'expire':
-        days_remaining = features.calc_expired_license()
-        days_before_expiration = [
-            days_remains for days_remains, expire_date
-            in days_remaining.itervalues()
-        ]
+        expired, about_to_expire, _ = features.calc_expiration_buckets(15)
 
-        if min(days_before_expiration) > 15:
+        if not expired and not about_to_expire:
             raise NagiosOk('Features are up-to-date.')
 
-        count = 1
         nagios_output = ''
         nagios_longoutput = '\n'
 
         # Check first if there are expired licenses
-        if 0 in days_before_expiration:
-            for feature in days_remaining:
-                if not days_remaining[feature]:
-                    nagios_longoutput += '** %s is expired ! **\n' % feature
-                    count += 1
-            nagios_output = 'There are %d features expired !' % count
+        if expired:
+            for feature, _ in expired:
+                nagios_longoutput += '** %s is expired ! **\n' % feature.name
+            nagios_output = 'There are %d features expired !' % len(expired)
 
             # Do not show long output if specified
             if not options.nolongoutput:
@@ -125,14 +142,12 @@ def run():
             raise NagiosCritical(nagios_output)
         else:
             # Check for about to expire licenses
-            for feature, expiration_info in days_remaining.iteritems():
-                days_remaining, expire_date = expiration_info
-                if 0 < days_remaining <= 15:
-                    nagios_longoutput += '%s will expire on %s !\n' % (
-                        feature,
-                        expire_date)
-                    count += 1
-            nagios_output = 'There are %d features about to expire !' % count
+            for feature, _ in about_to_expire:
+                nagios_longoutput += '%s will expire on %s !\n' % (
+                    feature.name,
+                    feature.expires)
+            nagios_output = 'There are %d features about to expire !' % len(
+                about_to_expire)
 
             # Do not show long output if specified
             if not options.nolongoutput:
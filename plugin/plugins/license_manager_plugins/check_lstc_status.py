@@ -24,36 +24,66 @@
 import re
 import backend.lstc
 import backend.util
-from nagios.errorlevels import NagiosCritical, NagiosOk, NagiosUnknown
+from backend.poller import poll
+from nagios.errorlevels import NagiosCritical, NagiosWarning, NagiosOk, NagiosUnknown
 from nagios.arguments import process_plugin_options
 
+
+def debug_users(output_file):
+    """Parse connected users from a test output file"""
+    connected_users_pattern = re.compile(r'^(?:\s+|)(\w+)\s+(\d+@[\w\d.]+)')
+    connected_users = []
+    for line in backend.util.test_from_file(output_file):
+        connected_users_match = connected_users_pattern.search(line)
+        if connected_users_match:
+            connected_users.append(connected_users_match.groups())
+    return connected_users
+
+
 def run():
     """Execute the plugin"""
     # Plugin arguments
     options = process_plugin_options()
-    
-    # Get the output of license manager command, catching errors
-    try:
-        if options.debug:
-            output = backend.util.test_from_file("../tests/lstc_status.txt")
-        else:
-            output = backend.lstc.status("%s" % options.license)
-    except backend.lstc.LstcStatusError as e:
-        raise NagiosCritical("%s (code: %s, license: '%s') !" % (e.errmsg, e.retcode, e.license))
+    licenses = options.license.split(',')
+
+    # Get the connected users of all license servers, catching errors
+    if options.debug:
+        results = [(licenses[0], debug_users("../tests/lstc_status.txt"), None)]
+    else:
+        results = poll([(license, backend.lstc.connected_users,
+                         (license, options.timeout))
+                        for license in licenses], options.workers)
 
     # Globals
     connected_users = []
+    servers_errors = []
+    servers_idle = 0
 
-    for line in output:
-        # Checking number of connected users
-        connected_users_pattern = re.compile(r'^(?:\s+|)(\w+)\s+(\d+@[\w\d.]+)')
-        connected_users_match = connected_users_pattern.search(line)
-        if connected_users_match:
-            connected_users.append((connected_users_match.group(1), connected_users_match.group(2)))
+    for license, users, error in results:
+        if isinstance(error, backend.lstc.LstcExecutionError):
+            # Local problem, the same for all the license servers
+            raise NagiosUnknown("%s !" % error.errmsg)
+        elif isinstance(error, backend.lstc.LstcStatusError):
+            servers_errors.append("%s (code: %s, license: '%s') !" % (error.errmsg, error.retcode, error.license))
+        elif error:
+            raise error
+        elif users is None:
+            servers_idle += 1
+        elif not users:
+            # Checking for unknown errors
+            servers_errors.append("Unexpected error on license '%s' ! Check with debug mode." % license)
+        else:
+            connected_users.extend(users)
+
+    if len(servers_errors) == len(results):
+        if len(results) == 1 and not results[0][2]:
+            raise NagiosUnknown("Unexpected error ! Check with debug mode.")
+        raise NagiosCritical("\n".join(servers_errors))
 
-    # Checking for unknown errors
     if not connected_users:
-        raise NagiosUnknown("Unexpected error ! Check with debug mode.")
+        if not servers_errors:
+            raise NagiosOk("There is no program running or queued.")
+        raise NagiosWarning("There is no program running or queued.\n%s" % "\n".join(servers_errors))
 
     # Format Nagios output
     # --------------------
@@ -73,10 +103,14 @@ def run():
     nagios_output = nagios_output % (verb, len(connected_users), plural)
     if not options.nolongoutput:
         nagios_longoutput = '\n'
+        for error in servers_errors:
+            nagios_longoutput += "%s\n" % error
         for user in connected_users:
             nagios_longoutput += "User %s from host %s.\n" % (user[0], user[1])
+    if servers_errors:
+        raise NagiosWarning(nagios_output + nagios_longoutput)
     raise NagiosOk(nagios_output + nagios_longoutput)
 
 # Main
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
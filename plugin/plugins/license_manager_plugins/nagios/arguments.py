@@ -31,11 +31,14 @@ def process_plugin_options():
     argparser.add_option('-l',
                          dest='license',
                          help='License file or remote host as '
-                              '<port>@<remote_host>')
+                              '<port>@<remote_host>. Status plugins accept '
+                              'several comma separated values.')
     argparser.add_option('-p',
                          dest='port',
                          help='License port (only for backend that does not '
-                              'support remote host as <port>@<remote_host>)')
+                              'support remote host as <port>@<remote_host>). '
+                              'Status plugins accept several comma separated '
+                              'values.')
     argparser.add_option('-d', '--debug',
                          dest='debug',
                          action='store_true',
@@ -44,6 +47,12 @@ def process_plugin_options():
                          dest='timeout',
                          help='Set a timeout in seconds (default 60 secs)',
                          default="30")
+    argparser.add_option('--workers',
+                         dest='workers',
+                         type='int',
+                         help='Number of license servers queried at the same '
+                              'time (default 4)',
+                         default=4)
     argparser.add_option('--no-long-output',
                          dest='nolongoutput',
                          action='store_true',
@@ -34,8 +34,8 @@ status = None
 
 #Attrs
 value = None
-host_tag = plugin.xml.find('host', hostname=plugin.options.hostname)
-host_run_jobs = plugin.xml.find_all('job', host=host_tag['hostname'], status='RUN')
+host_tag = plugin.index.hosts.get(plugin.options.hostname)
+host_run_jobs = plugin.index.rows(plugin.options.hostname, 'RUN')
 mode = {
     'cpu': 'ut',
     'mem': 'mem',
@@ -43,10 +43,10 @@ mode = {
 
 #Are there any hight utilisation of CPU or Memory ?
 if host_tag:
-    raw_value = float(host_tag[mode[plugin.options.mode]])
+    raw_value = float(getattr(host_tag, mode[plugin.options.mode]))
 
     if plugin.options.mode == 'mem':
-        maxmem = float(host_tag['maxmem'])
+        maxmem = float(host_tag.maxmem)
         value = ( raw_value * 100 ) / maxmem
     else:
         value = raw_value
@@ -21,7 +21,6 @@
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import logging
-import re
 from pprint import pformat
 from datetime import datetime
 
@@ -42,17 +41,15 @@ status = None
 job_age = None
 cwd_age = None
 cwd_last_modified = None
-jobs_with_old_jobs = plugin.xml.find_all('job',
-                                         starttime=re.compile(r'[^-]'),
-                                         finishtime='-')
+jobs_with_old_jobs = plugin.index.unfinished_jobs()
 
 #Are there any old jobs with an old logfile ?
 for j in jobs_with_old_jobs:
-    job_age = datetime.now() - datetime.fromtimestamp(float(j['starttime']))
+    job_age = datetime.now() - datetime.fromtimestamp(float(j.starttime))
 
     if job_age > plugin.options.max_job_age:
         cwd_last_modified = datetime.fromtimestamp(
-            plugin.ssh.get_file_lastmodified_timestamp(j['cwd']))
+            plugin.ssh.get_file_lastmodified_timestamp(j.cwd))
         cwd_age = datetime.now() - cwd_last_modified
 
         if cwd_age > plugin.options.max_cwd_age:
@@ -76,8 +73,8 @@ if plugin.inactive_cwd:
 # Set longoutput with name of logfiles
 for j in plugin.inactive_cwd:
     plugin.longoutput.append(
-        "{0[host]}: {0[jobname]} (ID: {0[jobid]}) - "
-        "Logfile path : {0[cwd]}".format(j))
+        "{0.host}: {0.jobname} (ID: {0.jobid}) - "
+        "Logfile path : {0.cwd}".format(j))
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
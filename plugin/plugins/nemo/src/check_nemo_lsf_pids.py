@@ -45,22 +45,25 @@ logger.debug("result of SNMPWALK : {0}".format(snmpquery))
 # Are there any jobs with an empty PIDS ?
 logger.debug("jobs_in_nemo_pids : {0}".format(jobs_in_nemo_pids))
 
-host_tag = plugin.xml.find('host', hostname=plugin.options.slave.lower())
-jobs_with_empty_pid = plugin.xml.find_all('job', host=host_tag['hostname'], status='RUN', pids='', queue=NemoPluginPid.job_queue)
-jobs_with_pid = plugin.xml.find_all('job', host=host_tag['hostname'], status='RUN', pids=NemoPluginPid.empty_pid, queue=NemoPluginPid.job_queue)
+host_tag = plugin.index.hosts.get(plugin.options.slave.lower())
+if not host_tag:
+    plugin.unknown('Slave {0.slave} is not found !'.format(plugin.options))
+
+nemo_run_jobs = plugin.index.jobs(host_tag.hostname, 'RUN', nemo=True)
+jobs_with_empty_pid = [job for job in nemo_run_jobs if job.pids == '']
+jobs_with_pid = [job for job in nemo_run_jobs
+                 if job.pids and NemoPluginPid.empty_pid.search(job.pids)]
+
+# PIDs of the running processes, from the hrSWRunTable index
+running_pids = set(str(process.index)
+                   for process in snmpquery['hrSWRunName'])
 
 # Check existing PIDs
 for job in jobs_with_pid:
-    pids = job['pids'].split(',')
+    pids = job.pids.split(',')
 
     for pid in pids:
-        pid_found = False
-        for process in snmpquery['hrSWRunName']:
-            if process.index == pid:
-                pid_found = True
-                break
-
-        if not pid_found:
+        if pid not in running_pids:
             plugin.missing_pids.append({'job': job, 'pid': pid})
 
 logger.debug('Process details for running PID:\n%s', pformat(plugin.missing_pids, indent=4))
@@ -70,15 +73,15 @@ if plugin.missing_pids:
     status = plugin.critical
     plugin.shortoutput = "{} jobs with missing PID !".format(len(plugin.missing_pids))
     for pid in plugin.missing_pids:
-        plugin.longoutput.append("Job \"{job[jobname]}\" has no process with PID {pid}".format(job=pid['job'], pid=pid['pid']))
+        plugin.longoutput.append("Job \"{job.jobname}\" has no process with PID {pid}".format(job=pid['job'], pid=pid['pid']))
 elif jobs_with_empty_pid:
     status = plugin.warning
     plugin.shortoutput = "{} jobs with empty PID !".format(len(jobs_with_empty_pid))
     for j in jobs_with_empty_pid:
-        plugin.longoutput.append("{0[jobname]} (Job ID: {0[jobid]})".format(j))
+        plugin.longoutput.append("{0.jobname} (Job ID: {0.jobid})".format(j))
 else:
     status = plugin.ok
-    plugin.shortoutput = "Slave {} is running his jobs normally.".format(host_tag['hostname'])
+    plugin.shortoutput = "Slave {} is running his jobs normally.".format(host_tag.hostname)
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
@@ -35,7 +35,7 @@ status = None
 
 #Attrs
 current_date = datetime.utcnow()
-xml_timestamp = int(plugin.xml.find('timestamp').text)
+xml_timestamp = int(plugin.index.timestamp)
 xml_age = datetime.utcfromtimestamp(xml_timestamp)
 age = current_date - xml_age
 
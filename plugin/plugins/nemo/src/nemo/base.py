@@ -19,13 +19,18 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import re
-import bs4
-import requests
 import logging
+import threading
+import time
+from Queue import Queue, Empty
+
+import requests
 
 from monitoring.nagios.plugin import NagiosPlugin
 from monitoring.nagios.exceptions import NagiosUnknown
+from monitoring.nagios.cache import ResponseCache
+
+from index import build_index, NEMO_QUEUE
 
 
 logger = logging.getLogger('plugin.nemo.base')
@@ -35,6 +40,10 @@ class NemoPlugin(NagiosPlugin):
     """
     Download and fetch XML file
 
+    All the URLs are fetched in parallel, the first one in the list that
+    answers in time is used. The XML is parsed into a
+    :class:`nemo.index.JobIndex` available as ``self.index``.
+
     Args :
         url - URL to fetch Nemo XML
     """
@@ -48,7 +57,7 @@ class NemoPlugin(NagiosPlugin):
     ]
 
     #Attrs
-    job_queue = re.compile(r'^nemo_.*')
+    job_queue = NEMO_QUEUE
 
     def define_plugin_arguments(self):
         super(NemoPlugin, self).define_plugin_arguments()
@@ -60,6 +69,24 @@ class NemoPlugin(NagiosPlugin):
                                              "Nemo XML",
                                         required=False)
 
+        self.parser.add_argument('--cache-ttl',
+                                 dest='cache_ttl',
+                                 type=int,
+                                 default=0,
+                                 help="(Optional) Share the Nemo XML between "
+                                      "checks for this number of seconds "
+                                      "(default is 0, no cache).")
+
+        # NagiosPluginSSH already defines a timeout, reused for the downloads
+        if '--timeout' not in self.parser._option_string_actions:
+            self.parser.add_argument('-t', '--timeout',
+                                     type=float,
+                                     dest='timeout',
+                                     default=10,
+                                     help="(Optional) Timeout in seconds to "
+                                          "fetch the Nemo XML (default to 10 "
+                                          "secs).")
+
     def initialize(self):
         super(NemoPlugin, self).initialize()
 
@@ -74,14 +101,72 @@ class NemoPlugin(NagiosPlugin):
         # Get the XML content
         logger.debug('Fetching XML file using \'%s\'...', ", ".join(urls))
         try:
+            self.index = self.fetch_index(urls)
+        except Exception as e:
+            self.unknown('Error: %s' % e)
+
+    def fetch_index(self, urls):
+        """
+        Return the job index of the first URL of ``urls`` that answers.
+
+        A fresh index in the cache is used without any download. Otherwise
+        all URLs are downloaded in parallel: the first URL is used as soon as
+        it answers, the next ones only when all the URLs before them failed.
+        Mirrors that do not answer within the timeout are given up.
+        """
+        timeout = self.options.timeout
+        cache = None
+        if self.options.cache_ttl:
+            cache = ResponseCache(ttl=self.options.cache_ttl)
             for url in urls:
-                r = requests.get(url)
-                if r.status_code == requests.codes.ok:
-                    self.xml = bs4.BeautifulSoup(r.text)
+                cached = cache.lookup(url, fresh=True, parser=build_index)
+                if cached is not None:
+                    logger.debug('Using fresh index of %s.', url)
+                    return cached.parsed
+
+        def fetch(position, url):
+            try:
+                if cache:
+                    index = cache.get(url, parser=build_index,
+                                      timeout=timeout).parsed
+                else:
+                    r = requests.get(url, timeout=timeout)
+                    r.raise_for_status()
+                    index = build_index(r.content)
+            except Exception as e:
+                logger.debug('Cannot fetch %s: %s', url, e)
+                index = None
+            results.put((position, index))
+
+        results = Queue()
+        for position, url in enumerate(urls):
+            thread = threading.Thread(target=fetch, args=(position, url))
+            thread.daemon = True
+            thread.start()
+
+        # Indexes by URL position, None for the URLs that failed. The timeout
+        # of requests applies to the connection and to each read, so a
+        # mirror sending its XML too slowly is given up after twice as long.
+        answers = {}
+        deadline = time.time() + 2 * timeout
+        while len(answers) < len(urls):
+            try:
+                position, index = results.get(
+                    timeout=max(deadline - time.time(), 0))
+            except Empty:
+                break
+            answers[position] = index
+
+            for first in range(len(urls)):
+                if first not in answers:
                     break
+                if answers[first] is not None:
+                    return answers[first]
 
-            if not hasattr(self, 'xml'):
-                raise NagiosUnknown('No XML content '
-                                    'delivered by URLs: %s' % ", ".join(urls))
-        except Exception as e:
-            self.unknown('Error: %s' % e)
+        # Mirrors left did not answer in time, use the first one that did
+        for position in sorted(answers):
+            if answers[position] is not None:
+                return answers[position]
+
+        raise NagiosUnknown('No XML content '
+                            'delivered by URLs: %s' % ", ".join(urls))
@@ -84,7 +84,7 @@ class NemoPluginCpuMem(NemoPlugin):
         self.jobs_in_nemo_queues = False
 
         # Are there any jobs in nemo queues ?
-        if self.xml.find_all('job', status='RUN', queue=NemoPlugin.job_queue):
+        if self.index.nemo_running:
             self.jobs_in_nemo_queues = True
 
         logger.debug("jobs_in_nemo_queues : {0}".format(
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Canux CHENG <canuxcheng@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""
+Compact index of the LSF jobs published in the Nemo XML.
+
+The XML is parsed once into columns (one list per job attribute) and arrays of
+row numbers per host, status and queue, so that each check only looks at the
+jobs it is interested in. The index is small and fast to unpickle: it is
+stored by :class:`monitoring.nagios.cache.ResponseCache` next to the XML and
+shared by all the checks during the polling interval.
+"""
+
+# Absolute imports, the nemo.xml module would shadow the xml package
+from __future__ import absolute_import
+
+import re
+import logging
+from array import array
+from collections import namedtuple
+from StringIO import StringIO
+from xml.etree import cElementTree
+
+import bs4
+
+logger = logging.getLogger('plugin.nemo.index')
+
+#: Queues of the Nemo jobs
+NEMO_QUEUE = re.compile(r'^nemo_.*')
+
+JOB_COLUMNS = ('jobid', 'jobname', 'host', 'queue', 'status', 'pids', 'cwd',
+               'starttime', 'finishtime')
+
+
+class Job(namedtuple('Job', JOB_COLUMNS)):
+    """A LSF job, all the attributes are the strings of the XML."""
+    __slots__ = ()
+
+
+class Host(namedtuple('Host', 'hostname ut mem maxmem')):
+    """A LSF host, all the attributes are the strings of the XML."""
+    __slots__ = ()
+
+
+class JobIndex(object):
+    """
+    Columnar index of the Nemo XML.
+
+    .. attribute:: JobIndex.timestamp
+
+        Text of the ``timestamp`` element, ``None`` if missing.
+
+    .. attribute:: JobIndex.hosts
+
+        Dict of hostname -> :class:`Host`.
+
+    **Example**::
+
+     index = build_index(xml)
+     for job in index.jobs(host='slave01', status='RUN', nemo=True):
+         print job.jobname, job.pids
+    """
+    def __init__(self):
+        self.timestamp = None
+        self.hosts = {}
+        self.columns = dict((name, []) for name in JOB_COLUMNS)
+        # Row numbers of the jobs, per (host, status)
+        self.by_host_status = {}
+        # Row numbers of the jobs in a Nemo queue, per (host, status)
+        self.nemo_by_host_status = {}
+        # Row numbers of the jobs started but not finished
+        self.unfinished = array('l')
+        self.nemo_running = 0
+
+    def __len__(self):
+        return len(self.columns['jobid'])
+
+    def add_job(self, attributes):
+        """Append a job given the attributes of its XML element."""
+        row = len(self)
+        for name in JOB_COLUMNS:
+            self.columns[name].append(attributes.get(name))
+
+        key = (attributes.get('host'), attributes.get('status'))
+        self.by_host_status.setdefault(key, array('l')).append(row)
+        if NEMO_QUEUE.search(attributes.get('queue') or ''):
+            self.nemo_by_host_status.setdefault(key, array('l')).append(row)
+            if key[1] == 'RUN':
+                self.nemo_running += 1
+
+        if re.search(r'[^-]', attributes.get('starttime') or '') \
+           and attributes.get('finishtime') == '-':
+            self.unfinished.append(row)
+
+    def add_host(self, attributes):
+        """Add a host given the attributes of its XML element."""
+        hostname = attributes.get('hostname')
+        if hostname is not None and hostname not in self.hosts:
+            self.hosts[hostname] = Host(*[attributes.get(name)
+                                          for name in Host._fields])
+
+    def job(self, row):
+        """Return the :class:`Job` at ``row``."""
+        return Job(*[self.columns[name][row] for name in JOB_COLUMNS])
+
+    def rows(self, host, status, nemo=False):
+        """Row numbers of the jobs of ``host`` in ``status``."""
+        index = self.nemo_by_host_status if nemo else self.by_host_status
+        return index.get((host, status), ())
+
+    def jobs(self, host, status, nemo=False):
+        """
+        List of the :class:`Job` of ``host`` in ``status``, only the ones in
+        a Nemo queue if ``nemo`` is set.
+        """
+        return [self.job(row) for row in self.rows(host, status, nemo)]
+
+    def unfinished_jobs(self):
+        """List of the :class:`Job` started and not yet finished."""
+        return [self.job(row) for row in self.unfinished]
+
+
+def build_index(content):
+    """
+    Parse the Nemo XML ``content`` into a :class:`JobIndex`.
+
+    The XML is streamed with ``cElementTree``. If it is not well formed, it
+    is parsed with ``BeautifulSoup`` as the checks always did.
+    """
+    index = JobIndex()
+    try:
+        for _, elem in cElementTree.iterparse(StringIO(content)):
+            tag = elem.tag.rsplit('}', 1)[-1].lower()
+            if tag in ('job', 'host'):
+                attributes = dict((key.lower(), value)
+                                  for key, value in elem.attrib.iteritems())
+                if tag == 'job':
+                    index.add_job(attributes)
+                else:
+                    index.add_host(attributes)
+                elem.clear()
+            elif tag == 'timestamp' and index.timestamp is None:
+                index.timestamp = elem.text
+    except SyntaxError as e:
+        logger.debug('XML is not well formed (%s), using BeautifulSoup.', e)
+        index = JobIndex()
+        soup = bs4.BeautifulSoup(content)
+        for elem in soup.find_all(['job', 'host', 'timestamp']):
+            if elem.name == 'job':
+                index.add_job(elem.attrs)
+            elif elem.name == 'host':
+                index.add_host(elem.attrs)
+            elif index.timestamp is None:
+                index.timestamp = elem.text
+
+    logger.debug('Indexed %d jobs on %d hosts.', len(index), len(index.hosts))
+    return index
@@ -40,22 +40,22 @@ call_type = {
     1: 'Incoming',
     2: 'Outgoing',
 }
-query = plugin.snmp.getnext(oid)
+# All the columns are walked together and joined on the call index
+table = plugin.snmp.table(oid)
 
 # Store temp data
 temp_data = []
 size_rm = 0
 size_rm_big = 0
 
-if query.has_key('isdnCallHistoryType'):
-    for status in query['isdnCallHistoryTime']:
-        isdnCallHistory_Type = [e.pretty() for e in query['isdnCallHistoryType']
-                                if e.index == status.index][0]
-        isdnCallHistory_Type = call_type[int(isdnCallHistory_Type)]
-        isdnCallHistory_Duration = [e.pretty() for e in query['isdnCallHistoryDuration']
-                                    if e.index == status.index][0]
-        isdnCallHistory_RemoteNumber = [e.pretty() for e in query['isdnCallHistoryRemoteNumber']
-                                        if e.index == status.index][0]
+if table.columns['isdnCallHistoryType']:
+    for row in table:
+        status = row['isdnCallHistoryTime']
+        if status is None:
+            continue
+        isdnCallHistory_Type = call_type[int(row['isdnCallHistoryType'].pretty())]
+        isdnCallHistory_Duration = row['isdnCallHistoryDuration'].pretty()
+        isdnCallHistory_RemoteNumber = row['isdnCallHistoryRemoteNumber'].pretty()
         size_rm = len(isdnCallHistory_RemoteNumber)
         if size_rm > size_rm_big:
             size_rm_big = size_rm
@@ -58,55 +58,56 @@ progdesc = 'Check all CPUs usage on Cisco devices supporting CISCO-PROCESS-MIB.'
 
 plugin = CheckCiscoCPU(version=__version__, description=progdesc)
 
-oids = {
-    'entity_name': '1.3.6.1.2.1.47.1.1.1.1.7',
+columns = {
     'cpu_indexes': '1.3.6.1.4.1.9.9.109.1.1.1.1.2',
     'cpu_usages': '1.3.6.1.4.1.9.9.109.1.1.1.1.8',
 }
+lookups = {
+    # The CPU index is the entPhysicalIndex of the CPU module
+    'entity_name': ('1.3.6.1.2.1.47.1.1.1.1.7', 'cpu_indexes'),
+}
 
 logger.debug('====== Query host...')
-query = plugin.snmp.getnext(oids)
+table = plugin.snmp.table(columns, lookups)
 
-cpu_data = {}
+cpu_rows = [row for row in table if row['cpu_usages'] is not None]
+cpu_names = []
 logger.debug('====== Getting name for CPU module...')
-for i in range(0, len(query['cpu_usages'])):
-    try:
-        cpu_index = query['cpu_indexes'][i].value
-        if cpu_index:
-            logger.debug('\tCPU index found: %s' % cpu_index)
-            cpu_name = [e.pretty() for e in query['entity_name'] if e.index == cpu_index][0]
-        else:
-            logger.debug('\tCPU index cannot be determined. Generating name...')
-            raise KeyError()
-    except KeyError:
+for i, row in enumerate(cpu_rows):
+    if row['entity_name'] is not None:
+        cpu_name = row['entity_name'].pretty()
+    else:
+        logger.debug('\tCPU index cannot be determined. Generating name...')
         # Set a default name for the CPU module
         cpu_name = 'CPU%d' % i
 
     logger.debug('\tCPU name: %s' % cpu_name)
-    cpu_data[cpu_name] = int(query['cpu_usages'][i].value)
+    cpu_names.append(cpu_name)
 
 # Checking values if in thresholds and formatting output
 output = ""
 longoutput = ""
 exit_code = 0
 nbr_error = 0
-i = 1
-for cpu in cpu_data:
-    if plugin.options.warnthr < cpu_data[cpu] < plugin.options.critthr:
-        longoutput += '* %s: %d%% * (>%d)\n' % (cpu, cpu_data[cpu], plugin.options.warnthr)
+cpu_data = zip(cpu_names, table.evaluate(
+    lambda row: int(row['cpu_usages'].value),
+    plugin.options.warnthr, plugin.options.critthr, rows=cpu_rows))
+for cpu, (status, _, usage) in cpu_data:
+    if status == 'warning':
+        longoutput += '* %s: %d%% * (>%d)\n' % (cpu, usage, plugin.options.warnthr)
         if exit_code != 2: exit_code = 1
         nbr_error+=1
-    elif cpu_data[cpu] > plugin.options.critthr:
-        longoutput += '** %s: %d%% ** (>%d)\n' % (cpu, cpu_data[cpu], plugin.options.critthr)
+    elif status == 'critical':
+        longoutput += '** %s: %d%% ** (>%d)\n' % (cpu, usage, plugin.options.critthr)
         exit_code = 2
         nbr_error+=1
-    elif cpu_data[cpu] < plugin.options.warnthr:
-        longoutput += '%s: %d%% (<%d)\n' % (cpu, cpu_data[cpu], plugin.options.warnthr)
+    else:
+        longoutput += '%s: %d%% (<%d)\n' % (cpu, usage, plugin.options.warnthr)
 
 # Formatting perfdata
 perfdata = " | "
-for cpu in cpu_data:
-    perfdata += '%s=%d%%;%d;%d;0;100 ' % (cpu.replace(' ', '_'), cpu_data[cpu], plugin.options.warnthr, plugin.options.critthr)
+for cpu, (_, _, usage) in cpu_data:
+    perfdata += '%s=%d%%;%d;%d;0;100 ' % (cpu.replace(' ', '_'), usage, plugin.options.warnthr, plugin.options.critthr)
 
 # Output to Nagios
 longoutput = longoutput.rstrip('\n')
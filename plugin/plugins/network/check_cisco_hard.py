@@ -26,6 +26,7 @@ import os, sys
 
 from shared import __version__
 from monitoring.nagios.plugin import NagiosPluginSNMP
+from monitoring.nagios.probes.snmp import SNMPTable
 
 logger = log.getLogger('plugin')
 
@@ -48,7 +49,7 @@ oids = {
 sensor_data = []
 
 # Query using CISCO-ENTITY-SENSOR-MIB be default, fallback to CISCO-ENVMON-MIB
-query = plugin.snmp.getnext(oids)
+query = plugin.snmp.walk(oids)
 
 # Return OK if no hardware sensor support is available
 if not query.has_key('sensors_status') \
@@ -56,33 +57,30 @@ if not query.has_key('sensors_status') \
    and not query.has_key('envmon_power_status'):
     plugin.ok('No support for hardware sensor available.')
 
+# Sensor names joined on the sensor index
+lookups = {'sensor_names': None}
+
 if not query.has_key('sensors_status'):
     # Does not support CISCO-ENTITY-SENSOR-MIB
     logger.debug('Device not supporting CISCO-ENTITY-SENSOR-MIB, fallback.')
 
-    sensor_status = query['envmon_fan_status'] + query['envmon_power_status']
-    for sensor in sensor_status:
-        sensor_name = [e.pretty() for e in query['sensor_names'] if e.index == sensor.index][0]
-        sensor_status = sensor.value
-
-        # Skip sensor status marked as unavailable(2)
-        if sensor_status == 5:
-            continue
-
-        sensor_data.append((sensor_name, sensor_status))
+    status_columns = ['envmon_fan_status', 'envmon_power_status']
+    unavailable = 5
 else:
     # Support CISCO-ENTITY-SENSOR-MIB
     logger.debug('Device supporting CISCO-ENTITY-SENSOR-MIB, continue.')
-    sensor_status = query['sensors_status']
-    for sensor in sensor_status:
-        sensor_name = [e.pretty() for e in query['sensor_names'] if e.index == sensor.index][0]
-        sensor_status = sensor.value
+    status_columns = ['sensors_status']
+    unavailable = 2
+
+for column in status_columns:
+    for row in SNMPTable(query, [column], lookups):
+        sensor_status = row[column].value
 
-        # Skip sensor status marked as unavailable(2)
-        if sensor_status == 2:
+        # Skip sensor status marked as unavailable
+        if sensor_status == unavailable:
             continue
 
-        sensor_data.append((sensor_name, sensor_status))
+        sensor_data.append((row['sensor_names'].pretty(), sensor_status))
 
 logger.debug('Sensor data:')
 logger.debug('\t%s' % sensor_data)
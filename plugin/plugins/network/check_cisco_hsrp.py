@@ -48,13 +48,16 @@ progdesc = 'Check HSRP on Cisco devices. Check if the router must be the active
 
 plugin = CheckCiscoHSRP(version=__version__, description=progdesc)
 
-oids = {
+columns = {
     'hsrp_states': '1.3.6.1.4.1.9.9.106.1.2.1.1.15',
-    'if_descr': '1.3.6.1.2.1.2.2.1.2',
+}
+lookups = {
+    # HSRP rows are indexed by ifIndex.groupNumber
+    'if_descr': ('1.3.6.1.2.1.2.2.1.2', lambda row: row.index.split('.')[0]),
 }
 
-query = plugin.snmp.getnext(oids)
-if not query.has_key('hsrp_states'):
+table = plugin.snmp.table(columns, lookups)
+if not table:
     raise plugin.unknown('No data about HSRP on this device !')
 
 # Checking state of HSRP for all interfaces
@@ -62,9 +65,9 @@ longoutput = ""
 output = ""
 exit_code = 0
 nbr_error = 0
-for state in query['hsrp_states']:
-    ifIndex = int(state.oid.split('.')[-2])
-    ifDescr = [i.pretty() for i in query['if_descr'] if i.index == ifIndex][0]
+for row in table:
+    state = row['hsrp_states']
+    ifDescr = row['if_descr'].pretty()
 
     if state.value != plugin.roleid[plugin.options.role]:
         longoutput += '** %s is in state %s (must be %s) **\n' % (
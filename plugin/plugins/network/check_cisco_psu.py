@@ -35,9 +35,11 @@ progdesc = 'Check all PSU of Cisco and alert if one is not on.'
 
 plugin = NagiosPluginSNMP(version=__version__, description=progdesc)
 
-oids = {
+columns = {
     'psu_status': '1.3.6.1.4.1.9.9.117.1.1.2.1.2', # From CISCO-ENTITY-FRU-CONTROL-MIB
-    'psu_descs': '1.3.6.1.2.1.47.1.1.1.1.2', # From ENTITY-MIB
+}
+lookups = {
+    'psu_descs': ('1.3.6.1.2.1.47.1.1.1.1.2', None), # From ENTITY-MIB
 }
 
 desc = {
@@ -55,15 +57,15 @@ desc = {
     12: 'onButInlinePowerFail',
 }
 
-query = plugin.snmp.getnext(oids)
+table = plugin.snmp.table(columns, lookups)
 
 # Store temp data
 temp_data = []
 
-if query.has_key('psu_status'):
-    for status in query['psu_status']:
-        psu_name = [e.pretty() for e in query['psu_descs'] if e.index == status.index][0]
-        temp_data.append((str(status.index), psu_name, status.value))
+if table:
+    for row in table:
+        psu_name = row['psu_descs'].pretty()
+        temp_data.append((row.index, psu_name, row['psu_status'].value))
 else:
     plugin.unknown('SNMP Query Error: query all psu status returned no result !')
 
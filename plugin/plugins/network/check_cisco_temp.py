@@ -50,62 +50,49 @@ class CheckCiscoTEMP(NagiosPluginSNMP):
         if self.options.warnthr >= self.options.critthr:
             raise self.unknown('Warning threshold cannot be >= critical threshold.')
 
-# Function that verify thresholds
-def check_thresholds(sensor, value, warn, crit):
-    global count, perfdata, longoutput_warn, longoutput_crit, longoutput_ok
-    global exit_code
-    global nbr_error, nbr_warn, nbr_crit, nbr_ok
-
-    if warn < value < crit:
-        longoutput_warn += ' * %s: %d C (>%d <%d) *\n' % (sensor, value, warn, crit)
-        if exit_code != 2: exit_code = 1
-        nbr_error += 1
-        nbr_warn += 1
-    elif value > crit:
-        longoutput_crit += ' ** %s: %d C (>%d) **\n' % (sensor, value, crit)
-        exit_code = 2
-        nbr_error += 1
-        nbr_crit += 1
-    elif value < warn:
-        longoutput_ok += ' %s: %d C (<%d)\n' % (sensor, value, warn)
-        nbr_ok += 1
-
-    perfdata += '%d_%s=%dC;%d;%d;; ' % (
-        count,
-        sensor.replace(' ', '_').replace(',', '_').replace('_temperature', ''),
-        value,
-        warn,
-        crit
-    )
+# Name of a sensor row
+def sensor_name(row):
+    if row['entity_names'] is not None:
+        return row['entity_names'].pretty()
+    return 'Sensor %s' % row.index
+
+# Thresholds of a sensor, by sensor name
+def sensor_thresholds(sensor):
+    if re.search(r'^Module.*Outlet', sensor):
+        return outlet_warn, outlet_crit
+    elif re.search(r'^Fex.*Outlet', sensor):
+        return fexout_warn, fexout_crit
+    elif re.search(r'^Fex.*Die', sensor):
+        return fexdie_warn, fexdie_crit
+    return outlet_warn, outlet_crit
 
 # The main procedure
 progdesc = 'Check all temperature on Cisco devices and alert if one is above thresholds.'
 
 plugin = CheckCiscoTEMP(version=__version__, description=progdesc)
 
-oids = {
+columns = {
     'sensor_types': '1.3.6.1.4.1.9.9.91.1.1.1.1.1',     # From CISCO-ENTITY-SENSOR-MIB
     'sensor_values': '1.3.6.1.4.1.9.9.91.1.1.1.1.4',     # From CISCO-ENTITY-SENSOR-MIB
-    'entity_names': '1.3.6.1.2.1.47.1.1.1.1.7',         # From ENTITY-MIB
+}
+lookups = {
+    'entity_names': ('1.3.6.1.2.1.47.1.1.1.1.7', None), # From ENTITY-MIB
 }
 
-query = plugin.snmp.getnext(oids)
-
-# Store temp data
-temp_data = []
+table = plugin.snmp.table(columns, lookups)
 
 # Get all "celsius" sensor types
-if query.has_key('sensor_types'):
-    for type in query['sensor_types']:
-        # If sensor type is celsius(8)
-        if type.value == 8:
-            sensor_name = [e.pretty() for e in query['entity_names'] if e.index == type.index][0]
-            sensor_value = [e.value for e in query['sensor_values'] if e.index == type.index][0]
-            temp_data.append((sensor_name, sensor_value))
-else:
+if not table:
     plugin.unknown('SNMP Query Error: query all sensor types returned no result !')
 
-logger.debug('Temp data: %s' % temp_data)
+# If sensor type is celsius(8)
+temp_rows = [row for row in table
+             if row['sensor_types'] is not None
+             and row['sensor_types'].value == 8
+             and row['sensor_values'] is not None]
+
+logger.debug('Temp data: %s' % [(sensor_name(row), row['sensor_values'].value)
+                                for row in temp_rows])
 
 # Check thresholds and format output to Nagios
 longoutput = ""
@@ -125,20 +112,38 @@ count = 0
 outlet_warn, fexout_warn, fexdie_warn = plugin.options.warnthr
 outlet_crit, fexout_crit, fexdie_crit = plugin.options.critthr
 
-for temp in temp_data:
+results = table.evaluate('sensor_values',
+                         lambda row: sensor_thresholds(sensor_name(row))[0],
+                         lambda row: sensor_thresholds(sensor_name(row))[1],
+                         rows=temp_rows)
+
+for status, row, value in results:
     count += 1
-    temp_descr, temp_value = temp
-
-    # Check 5K Outlet thresholds
-    logger.debug('Processing sensor %s.' % temp_descr)
-    if re.search(r'^Module.*Outlet', temp_descr):
-        check_thresholds(temp_descr, temp_value, outlet_warn, outlet_crit)
-    elif re.search(r'^Fex.*Outlet', temp_descr):
-        check_thresholds(temp_descr, temp_value, fexout_warn, fexout_crit)
-    elif re.search(r'^Fex.*Die', temp_descr):
-        check_thresholds(temp_descr, temp_value, fexdie_warn, fexdie_crit)
+    sensor = sensor_name(row)
+    warn, crit = sensor_thresholds(sensor)
+    logger.debug('Processing sensor %s.' % sensor)
+
+    if status == 'warning':
+        longoutput_warn += ' * %s: %d C (>%d <%d) *\n' % (sensor, value, warn, crit)
+        if exit_code != 2: exit_code = 1
+        nbr_error += 1
+        nbr_warn += 1
+    elif status == 'critical':
+        longoutput_crit += ' ** %s: %d C (>%d) **\n' % (sensor, value, crit)
+        exit_code = 2
+        nbr_error += 1
+        nbr_crit += 1
     else:
-        check_thresholds(temp_descr, temp_value, outlet_warn, outlet_crit)
+        longoutput_ok += ' %s: %d C (<%d)\n' % (sensor, value, warn)
+        nbr_ok += 1
+
+    perfdata += '%d_%s=%dC;%d;%d;; ' % (
+        count,
+        sensor.replace(' ', '_').replace(',', '_').replace('_temperature', ''),
+        value,
+        warn,
+        crit
+    )
 
 # Format output
 if nbr_crit > 0:
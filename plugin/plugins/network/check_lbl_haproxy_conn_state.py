@@ -31,7 +31,8 @@ __version__ = "git"
 
 import logging
 from monitoring.nagios.plugin import NagiosPlugin
-import requests
+from monitoring.nagios.probes import ProbeHAProxy
+from monitoring.nagios.cache import ResponseCache, CacheError
 
 logger = logging.getLogger('plugin.unix')
 
@@ -53,7 +54,8 @@ class PluginCFile(NagiosPlugin):
                                            required=False)
         self.required_args.add_argument('-c','--conn',
                                            dest="connexion",
-		                    			   type=int,
+                                           type=int,
+                                           default=0,
                                            help="minimum connexion to define if slave became the master , an integer.",
                                            required=False)
         self.required_args.add_argument('-i','--invert',
@@ -61,20 +63,37 @@ class PluginCFile(NagiosPlugin):
                     					   action="store_true",
                                            help="Invert Status, WARNING becomes OK ",
                                            required=False)
+        self.required_args.add_argument('--stats-socket',
+                                        dest="stats_socket",
+                                        type=int,
+                                        help="TCP port of the stats socket of HAProxy on the second server, "
+                                             "instead of the stats page on port 7777, an integer.",
+                                        required=False)
+        self.required_args.add_argument('--cache-ttl',
+                                        dest="cache_ttl",
+                                        type=int,
+                                        default=0,
+                                        help="Share the statistics with the other HAProxy checks "
+                                             "for this number of seconds (default to 0, no cache).")
 
 
 # Init plugin
 plugin = PluginCFile(version=__version__, description="Check Connexion State")
 
-r = requests.get("http://"+ plugin.options.host +":7777/;csv", auth=(plugin.options.login, plugin.options.password))
+# One snapshot of the statistics, from the stats socket or the stats page
+cache = None
+if plugin.options.cache_ttl:
+    try:
+        cache = ResponseCache(ttl=plugin.options.cache_ttl)
+    except CacheError as e:
+        logger.debug("No statistics cache: {0}".format(e))
 
-if r.status_code == 404 or r.status_code == 500:
-    "Didn't checkout the csv: error HTTP: " + r.status_code
-
-data=[]
-data_temp =  r.content.split('\n')
-for d in data_temp:
-    data.append(d.split(','))
+if plugin.options.stats_socket:
+    haproxy = ProbeHAProxy(socket=(plugin.options.host, plugin.options.stats_socket), cache=cache)
+else:
+    auth = (plugin.options.login, plugin.options.password) if plugin.options.login else None
+    haproxy = ProbeHAProxy(url="http://" + plugin.options.host + ":7777/", auth=auth, cache=cache)
+stats = haproxy.snapshot()
 
 if plugin.options.invert:
     status = plugin.warning
@@ -82,22 +101,18 @@ if plugin.options.invert:
 else:
     status = plugin.ok
     plugin.shortoutput = "Slave haven't got any connections"
-logger.debug(data[0])
 
-del data[0]
-del data[len(data)-1]
-for h in data:
-    if len(h)>2 and h[0]!='stats':
-        logger.debug(h[0] +" " +h[1]+" " +h[4])
-        if int(h[4]) > plugin.options.connexion:
-	        if plugin.options.invert:
-		    status = plugin.ok
-	            plugin.shortoutput = "Master have got connections"
-                    plugin.longoutput.append("Master have got some connections: " +h[0] +" "+h[1]+": "+h[4])
-	        else:
-           	    status = plugin.warning
-	            plugin.shortoutput = "Slave have got some connections: " +h[0] +" "+h[1]+": "+h[4]
-                    plugin.longoutput.append("Slave have got some connections: " +h[0] +" "+h[1]+": "+h[4])
+for h in stats.select():
+    logger.debug("{0} {1} {2}".format(h.pxname, h.svname, h.scur))
+    if h.scur > plugin.options.connexion:
+        if plugin.options.invert:
+            status = plugin.ok
+            plugin.shortoutput = "Master have got connections"
+            plugin.longoutput.append("Master have got some connections: {0} {1}: {2}".format(h.pxname, h.svname, h.scur))
+        else:
+            status = plugin.warning
+            plugin.shortoutput = "Slave have got some connections: {0} {1}: {2}".format(h.pxname, h.svname, h.scur)
+            plugin.longoutput.append("Slave have got some connections: {0} {1}: {2}".format(h.pxname, h.svname, h.scur))
 
 if len(plugin.longoutput)==0:
     if plugin.options.invert:
@@ -31,7 +31,8 @@ __version__ = "git"
 
 import logging
 from monitoring.nagios.plugin import NagiosPluginSSH
-import requests
+from monitoring.nagios.probes import ProbeHAProxy
+from monitoring.nagios.cache import ResponseCache, CacheError
 
 logger = logging.getLogger('plugin.unix')
 
@@ -51,6 +52,17 @@ class PluginCFile(NagiosPluginSSH):
                                         dest="file_app",
                                         help="File of application, an string",
                                         required=False)
+        self.required_args.add_argument('--stats-socket',
+                                        dest="stats_socket",
+                                        help="Stats socket of HAProxy, read over SSH with socat "
+                                             "instead of the stats page on port 7777, a string.",
+                                        required=False)
+        self.required_args.add_argument('--cache-ttl',
+                                        dest="cache_ttl",
+                                        type=int,
+                                        default=0,
+                                        help="Share the statistics with the other HAProxy checks "
+                                             "for this number of seconds (default to 0, no cache).")
 
 # Init plugin
 plugin = PluginCFile(version=__version__, description="Check Currents Connections")
@@ -70,36 +82,51 @@ if plugin.options.file_app:
 else:
    output_file = None
 
-
-r = requests.get("http://"+ plugin.options.hostname +":7777/;csv", auth=(plugin.options.login, plugin.options.password_web))
-
-if r.status_code == 404 or r.status_code == 500:
-    "Didn't checkout the csv: error HTTP: " + r.status_code
+# One snapshot of the statistics, from the stats socket or the stats page
+cache = None
+if plugin.options.cache_ttl:
+    try:
+        cache = ResponseCache(ttl=plugin.options.cache_ttl)
+    except CacheError as e:
+        logger.debug("No statistics cache: {0}".format(e))
+
+if plugin.options.stats_socket:
+    haproxy = ProbeHAProxy(socket=plugin.options.stats_socket, ssh=plugin.ssh,
+                           timeout=plugin.options.timeout, cache=cache)
+else:
+    auth = (plugin.options.login, plugin.options.password_web) if plugin.options.login else None
+    haproxy = ProbeHAProxy(url="http://" + plugin.options.hostname + ":7777/", auth=auth,
+                           timeout=plugin.options.timeout, cache=cache)
+stats = haproxy.snapshot()
+
+# Byte rates since the previous check
+try:
+    rates = stats.rates(plugin.load_data())
+except IOError:
+    rates = {}
+plugin.save_data(stats.counters())
 
 status = plugin.warning
 plugin.shortoutput = "Haven't connections!"
 
-
-data=[]
-data_temp =  r.content.split('\n')
-for d in data_temp:
-    data.append(d.split(','))
-
-logger.debug(data[0])
-
-del data[0]
-del data[len(data)-1]
-
-for serv in output_file:
-    for h in data:
-        if len(h)>2 and h[0]!='stats' and h[0]==serv:
-            logger.debug(h[0] +" " +h[1]+"_in " +h[8])
-            logger.debug(h[0] +" " +h[1]+"_out " +h[9])
-            status = plugin.ok
-            plugin.perfdata.append('{table}={value};;;0'.format(table=h[0] + "_" + h[1] + "_in" , value= h[8]))
-            plugin.longoutput.append('{table} : {value}'.format(table=h[0] + " -> " + h[1] + "_in" , value= h[8]))
-            plugin.perfdata.append('{table}={value};;;0'.format(table=h[0] + "_" + h[1] + "_out" , value= h[9]))
-            plugin.longoutput.append('{table} : {value}'.format(table=h[0] + " -> " + h[1] + "_out" , value= h[9]))
-            plugin.shortoutput = "Have connections!"
+if output_file is None:
+    records = stats.select()
+else:
+    records = [h for serv in output_file if serv != 'stats' for h in stats.proxy(serv)]
+
+for h in records:
+    logger.debug("{0} {1}_in {2}".format(h.pxname, h.svname, h.bin))
+    logger.debug("{0} {1}_out {2}".format(h.pxname, h.svname, h.bout))
+    status = plugin.ok
+    rate = rates.get(h.key, {})
+    for direction, counter in (("_in", 'bin'), ("_out", 'bout')):
+        value = h.fields[counter]
+        plugin.perfdata.append('{table}={value};;;0'.format(table=h.pxname + "_" + h.svname + direction , value= value))
+        line = '{table} : {value}'.format(table=h.pxname + " -> " + h.svname + direction , value= value)
+        if rate.get(counter) is not None:
+            plugin.perfdata.append('{table}_rate={value:.0f};;;0'.format(table=h.pxname + "_" + h.svname + direction , value= rate[counter]))
+            line += ', {0:.0f} B/s'.format(rate[counter])
+        plugin.longoutput.append(line)
+    plugin.shortoutput = "Have connections!"
 
 status(plugin.output(long_output_limit=None))
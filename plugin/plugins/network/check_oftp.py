@@ -4,7 +4,7 @@
 # Module        : check_oftp
 # Author        : Canux CHENG aka 'v!nZ' <canuxcheng@gmail.com>
 #                                             <canuxcheng@gmail.com>
-# Description   : Plugin to check if a OFTP server is available.
+# Description   : Plugin to check if OFTP servers are available.
 #-------------------------------------------------------------------------------
 # This file is part of check_oftp.
 #
@@ -22,74 +22,88 @@
 # along with check_oftp.  If not, see <http://www.gnu.org/licenses/>.
 #===============================================================================
 
-import socket
-import optparse
 import logging
-import time
 
+from shared import __version__
+from monitoring.nagios.plugin import NagiosPlugin
+from monitoring.nagios.probes.oftp import ProbeOFTP, probe_all
 
-logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger('plugin')
 
-# Create OptionParser instance
-argparser = optparse.OptionParser()
 
-# Defining plugin arguments
-argparser.add_option("-H", dest="hostname", help="OFTP server address")
-argparser.add_option("-p", dest="port", help="OFTP server port", type=int)
-argparser.add_option("-t", dest="timeout", help="Response timeout (default: 30 secs)", type=float, default="30")
-argparser.add_option("--debug", dest="debug", help="Enable debugging", action='store_true')
+class CheckOFTP(NagiosPlugin):
+    def define_plugin_arguments(self):
+        """Define arguments for the plugin"""
+        super(CheckOFTP, self).define_plugin_arguments()
 
-# Tell OptionParser to parse all args and return their values
-arguments = argparser.parse_args()[0]
+        self.required_args.add_argument('-p', '--port', dest='port', type=int,
+                                        help='OFTP server port', required=True)
+        self.parser.add_argument('-t', '--timeout', dest='timeout', type=float,
+                                 default=30,
+                                 help='Response timeout (default: 30 secs)')
+        self.parser.add_argument('-e', '--endpoint', dest='endpoints',
+                                 action='append', default=[],
+                                 help='Other OFTP server to check at the same '
+                                      'time, as HOST[:PORT]. Can be repeated.')
+        self.parser.add_argument('--code', dest='code',
+                                 help='Identification code (SSID) to also '
+                                      'check that the server accepts a '
+                                      'session.')
+        self.parser.add_argument('--password', dest='password', default='',
+                                 help='Password of the identification code.')
 
-# Check presence of mandatory arguments
-if not arguments.hostname or not arguments.port:
-    print "UNKNOWN - Syntax error, missing connection information !"
-    raise SystemExit(3)
+    def verify_plugin_arguments(self):
+        super(CheckOFTP, self).verify_plugin_arguments()
 
-# Enable debug messages ?
-if arguments.debug:
-    logger.setLevel(logging.DEBUG)
+        self.servers = [(self.options.hostname, self.options.port)]
+        for endpoint in self.options.endpoints:
+            host, _, port = endpoint.rpartition(':')
+            if not host:
+                host, port = port, self.options.port
+            try:
+                self.servers.append((host, int(port)))
+            except ValueError:
+                self.unknown('Invalid port in OFTP endpoint {0} !'.format(
+                    endpoint))
 
-# Establish a connection and catch any possible error
-try:
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.settimeout(arguments.timeout)
-    s.connect((arguments.hostname, arguments.port))
-    s.setblocking(0)
 
-    logger.debug('Successfully connected to socket.')
-except socket.error:
-    print "CRITICAL - Cannot establish a connection to OFTP server !"
-    raise SystemExit(2)
+plugin = CheckOFTP(version=__version__,
+                   description='Check if OFTP servers are available.')
 
-# Get data from the server and process response
-nagios_output = ""
-try:
-    start_time = time.time()
+probes = [ProbeOFTP(host, port, plugin.options.timeout,
+                    plugin.options.code, plugin.options.password)
+          for host, port in plugin.servers]
+results = probe_all(probes)
 
-    while 1:
-        # Break if timeout is reached
-        remaining_time = time.time()-start_time
-        if remaining_time > arguments.timeout:
-            logger.error('Timeout reached')
-            nagios_output = "CRITICAL - OFTP server is reachable but no data was received !"
-            raise SystemExit(2)
+# One server, keep the plain output
+if len(results) == 1:
+    labels = ['']
+else:
+    labels = ['{0.host}:{0.port} '.format(result) for result in results]
 
-        # Get some data from socket
-        try:
-            data = s.recv(32)
-            result = data.decode('utf-8')
-            if "READY" in result:
-                nagios_output = "OK - OFTP server is available."
-                raise SystemExit(0)
-        except socket.error:
-            # No data yet, make CPU happy ;-)
-            time.sleep(0.1)
-except socket.timeout:
-    nagios_output = "CRITICAL - Unable to connect to OFTP server within %d seconds !" % arguments.timeout
-    raise SystemExit(2)
-finally:
-    s.close()
-    print nagios_output
+for label, result in zip(labels, results):
+    logger.debug('Result: %s', result)
+    for name in ('connect_time', 'ready_time', 'session_time'):
+        value = getattr(result, name)
+        if value is not None:
+            plugin.perfdata.append("'{0}{1}'={2:.3f}s;;;0;".format(
+                label, name, value))
+
+failed = [result for result in results if not result.available]
+if len(results) == 1:
+    plugin.shortoutput = results[0].message
+else:
+    for result in failed + [r for r in results if r.available]:
+        plugin.longoutput.append('{0.host}:{0.port}: {0.message}'.format(
+            result))
+    if failed:
+        plugin.shortoutput = '{0} of {1} OFTP servers are not ' \
+                             'available !'.format(len(failed), len(results))
+    else:
+        plugin.shortoutput = 'All {0} OFTP servers are ' \
+                             'available.'.format(len(results))
+
+if failed:
+    plugin.critical(plugin.output(long_output_limit=None))
+else:
+    plugin.ok(plugin.output(long_output_limit=None))
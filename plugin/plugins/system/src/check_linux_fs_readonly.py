@@ -27,6 +27,9 @@ from monitoring.nagios.plugin import NagiosPluginSSH
 
 logger = logging.getLogger("plugin.fs_readonly")
 
+# Number of read-only filesystems shown in long output
+MOUNTS_SAMPLE = 20
+
 
 class PluginWriteable(NagiosPluginSSH):
     def define_plugin_arguments(self):
@@ -41,30 +44,32 @@ plugin = PluginWriteable(version='2.0.1',
 # Final status exit for the plugin
 status = None
 
-# Attrs
-if plugin.options.folder:
-    cmd = "awk '$3 !~ /iso9660/ && $4 ~ /(^|,)ro($|,)/' /proc/mounts | \
-    grep %s" % plugin.options.folder
-else:
-    cmd = "awk '$3 !~ /iso9660/ && $4 ~ /(^|,)ro($|,)/' /proc/mounts"
-
-logger.debug("cmd: {}".format(cmd))
-command = plugin.ssh.execute(cmd)
-logger.debug("Remote command output:\n%s", "\n".join(command.output))
-nbOut = len(command.output)
+# Read-only filesystems but CD-ROMs, selected on the remote side
+where = '$3 !~ /iso9660/ && $4 ~ /(^|,)ro($|,)/'
+try:
+    nbOut, mounts = plugin.ssh.matching_lines('cat /proc/mounts',
+                                              pattern=plugin.options.folder,
+                                              where=where,
+                                              limit=MOUNTS_SAMPLE)
+except plugin.ssh.SSHError as e:
+    plugin.unknown(str(e))
+logger.debug("Read-only filesystems:\n%s", "\n".join(mounts))
 
-if not command.output:
+if not nbOut:
     status = plugin.ok
     plugin.shortoutput = "All filesystems are writable"
-
-if command.output:
+else:
     status = plugin.critical
     plugin.shortoutput = "{0} filesystems are readable only".format(nbOut)
-    plugin.longoutput = command.output
+    plugin.longoutput = mounts
+    if nbOut > len(mounts):
+        plugin.longoutput.append("(...showing only first {0} filesystems, "
+                                 "{1} remaining...)".format(
+                                     len(mounts), nbOut - len(mounts)))
 
 # Return status with message to Nagios
 if status:
-    status(plugin.output())
+    status(plugin.output(long_output_limit=None))
 else:
     plugin.unknown('Unexpected error during plugin execution, please '
                    'investigate with debug mode on.')
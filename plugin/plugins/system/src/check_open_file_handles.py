@@ -20,13 +20,34 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
 # OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-__version__ = "1.1.30"
+"""
+Check the number of file handles opened by processes.
+
+File handles are read from /proc/<pid>/fd with sudo, so the monitoring user
+needs a sudoers rule like::
+
+    nagios ALL = (root) NOPASSWD: /usr/bin/find /proc/*/fd *
+
+and one for lsof with --list-files::
+
+    nagios ALL = (root) NOPASSWD: /usr/bin/lsof -p *
+"""
+
+__version__ = "1.2.0"
 
 import logging
+import pipes
 from monitoring.nagios.plugin import NagiosPluginSSH
 
 logger = logging.getLogger('plugin.unix')
 
+# Type of a file handle, from the target of its /proc/<pid>/fd link in the
+# fourth field of the lines of fd_command()
+AWK_FD_TYPE = '($4 ~ /^socket:/ ? "socket" : ' \
+              '$4 ~ /^pipe:/ ? "pipe" : ' \
+              '$4 ~ /^anon_inode:/ ? "anon_inode" : ' \
+              '$4 ~ /^\\/dev\\// ? "device" : "file")'
+
 
 # define new args
 class PluginCFile(NagiosPluginSSH):
@@ -34,8 +55,17 @@ class PluginCFile(NagiosPluginSSH):
         super(PluginCFile, self).define_plugin_arguments()
         self.required_args.add_argument('-n', '--process',
                                         dest="process",
-                                        help="process to check, an string",
-                                        default="gearmand",
+                                        action="append",
+                                        help="process to check, an string. "
+                                             "Repeat it to check several "
+                                             "processes.",
+                                        required=False)
+        self.required_args.add_argument('-R', '--pattern',
+                                        dest="pattern",
+                                        action="append",
+                                        help="check processes whose command "
+                                             "line matches this pattern "
+                                             "(pgrep -f). Can be repeated.",
                                         required=False)
         self.required_args.add_argument('-w',
                                         dest="warning",
@@ -51,12 +81,64 @@ class PluginCFile(NagiosPluginSSH):
                                              "an integer.",
                                         default=0,
                                         required=False)
+        self.required_args.add_argument('-T', '--by-type',
+                                        dest="by_type",
+                                        action="store_true",
+                                        help="Count file handles by type "
+                                             "(file, socket, pipe...).")
+        self.required_args.add_argument('--list-files',
+                                        dest="list_files",
+                                        action="store_true",
+                                        help="Show the full lsof listing in "
+                                             "long output, slow on processes "
+                                             "with many file handles.")
 
     def verify_plugin_arguments(self):
         super(PluginCFile, self).verify_plugin_arguments()
         # Checking if warning thresholds is not > critical
         if self.options.warning > self.options.critical:
             self.unknown('Warning cannot be greater than critical !')
+        if not self.options.process and not self.options.pattern:
+            self.options.process = ["gearmand"]
+
+
+def fd_command(label, pids):
+    """
+    Shell snippet printing "<label> <n> <pid>" for the n-th pid found by the
+    pids command, then "<label> <n> <pid> <link target>" for each of its file
+    handles, or "<label>! <n> <pid>" if they cannot be read (no sudo rule,
+    find error...). File handles closed while they are read are not errors.
+    """
+    return "n=0; for pid in $({pids}); do n=$((n + 1)); " \
+           "echo {label} $n $pid; " \
+           "sudo find /proc/$pid/fd -mindepth 1 -maxdepth 1 " \
+           "-ignore_readdir_race -printf \"{label} $n $pid %l\\n\" " \
+           "|| echo {label}! $n $pid; " \
+           "done".format(pids=pids, label=label)
+
+
+def pgrep_pattern(pattern):
+    """
+    Put the first literal character of a pgrep -f pattern in brackets, so
+    that the pattern does not match the shell running it: 'java' becomes
+    '[j]ava', which matches the same processes.
+    """
+    escaped = False
+    depth = 0
+    for index, char in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            depth = max(depth - 1, 0)
+        elif not depth and char.isalnum():
+            return "{0}[{1}]{2}".format(pattern[:index], char,
+                                        pattern[index + 1:])
+    return pattern
+
 
 # Init plugin
 plugin = PluginCFile(version=__version__, description="Check Open File Handles")
@@ -65,33 +147,119 @@ plugin = PluginCFile(version=__version__, description="Check Open File Handles")
 # Final status exit for the plugin
 status = None
 
-cmd = "sudo lsof -p $(pidof {0})".format(plugin.options.process)
+# Processes to check, by name or command line pattern
+checks = []
+for process in plugin.options.process or []:
+    checks.append((process, "pidof {0}".format(pipes.quote(process))))
+for pattern in plugin.options.pattern or []:
+    checks.append((pattern, "pgrep -f {0}".format(
+        pipes.quote(pgrep_pattern(pattern)))))
 
+labels = ["p{0}".format(i) for i in range(len(checks))]
+cmd = "; ".join(fd_command(label, pids)
+                for label, (_, pids) in zip(labels, checks))
 
 logger.debug("cmd : {0}".format(cmd))
 
-command = plugin.ssh.execute(cmd)
-output = command.output
-errors = command.errors
+# Count the file handles of each pid, and of each type, on the remote side.
+# The first line of a pid is not a file handle: it counts for 0, so that pids
+# without file handles are found.
+key = '$1 " " $2 " " $3'
+if plugin.options.by_type:
+    key += ' " " ' + AWK_FD_TYPE
+try:
+    counts = plugin.ssh.aggregate(cmd, key=key, value='NF > 3')
+except plugin.ssh.SSHError as e:
+    plugin.unknown(str(e))
+
+# Aggregate counters by process
+results = dict((label, {'pids': {}, 'nfiles': 0, 'types': {}})
+               for label in labels)
+unreadable = []
+for counter, count in counts.iteritems():
+    logger.debug("result : {0} {1}".format(counter, count.sum))
+    fields = counter.split()
+    if len(fields) < 3:
+        continue
+    if fields[0].endswith('!') and fields[0][:-1] in results:
+        unreadable.append(fields[2])
+        continue
+    if fields[0] not in results:
+        continue
+    result = results[fields[0]]
+    result['pids'][int(fields[1])] = fields[2]
+    result['nfiles'] += count.sum
+    if len(fields) > 3 and count.sum:
+        result['types'][fields[3]] = result['types'].get(fields[3], 0) + \
+            count.sum
+for result in results.itervalues():
+    result['pids'] = [pid for _, pid in sorted(result['pids'].iteritems())]
+
+output_pattern = "Process {process} has {nfiles} opened file handles."
+perfdata_pattern = "{label}={nfiles};{opt.warning};{opt.critical};0;"
 
-num_opened_files = len(output)
-output_pattern = "Process {opt.process} has {nfiles} opened file handles."
-perfdata_pattern = "open_file_handles={nfiles};{opt.warning};{opt.critical};0;"
+# Worst status of all processes
+severities = [plugin.ok, plugin.warning, plugin.critical]
 
-if output:
-    status = plugin.ok
+not_found = []
+messages = []
+for label, (process, _) in zip(labels, checks):
+    result = results[label]
+    if not result['pids']:
+        not_found.append(process)
+        continue
+
+    num_opened_files = result['nfiles']
+    process_status = plugin.ok
     if plugin.options.warning:
         if num_opened_files >= plugin.options.warning:
-            status = plugin.warning
+            process_status = plugin.warning
     if plugin.options.critical:
         if num_opened_files >= plugin.options.critical:
-            status = plugin.critical
+            process_status = plugin.critical
+    if status is None or \
+            severities.index(process_status) > severities.index(status):
+        status = process_status
+
+    # Prefix perfdata labels by the process if there are several
+    if len(checks) == 1:
+        perf_label = "{0}".format
+    else:
+        perf_label = "'{0}_{{0}}'".format(process.replace("'", "")).format
+    plugin.perfdata.append(perfdata_pattern.format(
+        label=perf_label("open_file_handles"), nfiles=num_opened_files,
+        opt=plugin.options))
+    for filetype, nfiles in sorted(result['types'].iteritems()):
+        plugin.perfdata.append("{0}={1};;;0;".format(perf_label(filetype),
+                                                      nfiles))
 
-    plugin.perfdata.append(perfdata_pattern.format(nfiles=num_opened_files,
-                                                   opt=plugin.options))
-    plugin.shortoutput = output_pattern.format(nfiles=num_opened_files,
-                                               opt=plugin.options)
-    plugin.longoutput = output
+    messages.append(output_pattern.format(process=process,
+                                          nfiles=num_opened_files))
+    plugin.longoutput.append("{0} (pid {1}): {2} opened file handles{3}".format(
+        process, ", ".join(result['pids']), num_opened_files,
+        "".join(", {0}: {1}".format(filetype, nfiles)
+                for filetype, nfiles in sorted(result['types'].iteritems()))))
+
+if not_found:
+    plugin.unknown("Process {0} not found !".format(", ".join(not_found)))
+
+if unreadable:
+    plugin.unknown("Cannot read the file handles of pid {0}, check the sudo "
+                   "rule for find !".format(", ".join(sorted(unreadable))))
+
+if len(messages) == 1:
+    plugin.shortoutput = messages[0]
+elif messages:
+    plugin.shortoutput = "{0} processes have {1} opened file handles.".format(
+        len(messages), sum(result['nfiles'] for result in results.values()))
+
+# Full listing, only on demand
+if status and plugin.options.list_files:
+    pids = " ".join(pid for result in results.values()
+                    for pid in result['pids'])
+    plugin.longoutput.extend(
+        plugin.ssh.execute("sudo lsof -p {0}".format(
+            ",".join(pids.split()))).output)
 
 # Return status with message to Nagios
 logger.debug("Return status and exit to Nagios.")
@@ -100,4 +268,3 @@ if status:
 else:
     plugin.unknown('Unexpected error during plugin execution, please '
                    'investigate with debug mode on.')
-
@@ -30,9 +30,9 @@ __version__ = "git"
 
 import logging
 from monitoring.nagios.plugin import NagiosPlugin
+from monitoring.nagios.probes import ProbeSNMP
 import requests
 import os
-import commands
 from datetime import datetime
 import time
 
@@ -64,11 +64,17 @@ class PluginGet_Uptime(NagiosPlugin):
 plugin = PluginGet_Uptime(version=__version__, description="Check Uptime Switch")
 
 
-cmd_get_uptime = "snmpget -t 1 -r 5 -m '' -v 2c -c {0} {1}:161 .1.3.6.1.4.1.1872.2.5.1.3.1.12.0 ".format(plugin.options.community,plugin.options.hostname)
-logger.debug("cmd_get_uptime : {0}".format(cmd_get_uptime))
+# SNMP v2c GET, 1 second timeout and 5 retries
+snmp = ProbeSNMP(hostaddress=plugin.options.hostname,
+                 community=plugin.options.community,
+                 snmp_version=1,
+                 timeout=1,
+                 retries=5)
+query = snmp.get({'uptime': '1.3.6.1.4.1.1872.2.5.1.3.1.12.0'})
+output = "{0} = {1}".format(query['uptime'].oid, query['uptime'])
+logger.debug("uptime : {0}".format(output))
 
-status, output = commands.getstatusoutput(cmd_get_uptime)
-date = output.split('STRING: "')[1].split(' (')[0]
+date = str(query['uptime']).split(' (')[0]
 date_object = datetime.strptime(date,"%H:%M:%S %a %b %d, %Y")
 
 logger.debug("date_object : {0}".format(date_object))
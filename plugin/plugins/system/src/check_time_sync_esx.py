@@ -24,14 +24,52 @@
 Plugin check_time_sync_esx.
 
 Checks time sync between ESX host and its VM.
+
+Both clocks are read on the VM by the same SSH command. The clock of the VM is
+read with sub-second precision right before and right after each read of the
+clock of the ESX host, until the ESX clock turns to its next second: the
+instant of this second in VM time is then known within two reads, whatever the
+SSH round trip.
+
+Other VMs of the same ESX host can be checked at the same time with -V.
 """
 
+import time
+import calendar
 import logging
+import threading
 from datetime import datetime, timedelta
 from monitoring.nagios.plugin import NagiosPluginSSH
+from monitoring.nagios.probes import ProbeSSH
 
 logger = logging.getLogger('plugin.ssh')
 
+# Print the UTC offset of the VM, then the last sample of the clocks before the
+# ESX clock turns to its next second and the first one after, or the last two
+# samples after 2 seconds. Samples are "<VM time> <VM time> <ESX time>".
+CLOCKS_COMMAND = """
+date +%z
+start=$(date +%s)
+previous=
+previous_host=
+while :; do
+    before=$(date +%s.%N)
+    host=$(vmware-toolbox-cmd stat hosttime) || exit 1
+    after=$(date +%s.%N)
+    sample="$before $after $host"
+    if [ -n "$previous" ] && [ "$host" != "$previous_host" ]; then
+        break
+    fi
+    if [ $((${after%.*} - start)) -ge 2 ]; then
+        break
+    fi
+    previous=$sample
+    previous_host=$host
+done
+echo "$previous"
+echo "$sample"
+"""
+
 
 # define new args
 class PluginTime(NagiosPluginSSH):
@@ -46,53 +84,190 @@ class PluginTime(NagiosPluginSSH):
                                              "least this number of minutes.",
                                         required=True)
 
-plugin = PluginTime(version='0.0.1', description="Check time sync with ESX")
+        self.parser.add_argument('-V', '--vms',
+                                 nargs='+',
+                                 dest="vms",
+                                 default=[],
+                                 help="Other VMs of the ESX host to check at "
+                                      "the same time, with the same "
+                                      "credentials.")
 
-# Final status exit for the plugin
-status = None
 
-# Attr
-esx_time_cmd = plugin.ssh.execute("vmware-toolbox-cmd stat hosttime")
-local_time_cmd = plugin.ssh.execute("date '+%d %b %Y %H:%M:%S'")
+class ClockSkew(object):
+    """
+    Skew of the VM clock from the ESX host clock, from the output of
+    :data:`CLOCKS_COMMAND`.
 
-if esx_time_cmd.output and local_time_cmd.output:
-    esx_time_str = esx_time_cmd.output[0]
-    esx_time = datetime.strptime(esx_time_str, '%d %b %Y %H:%M:%S')
-    logger.debug("ESX Host time: {0}".format(esx_time))
+    The skew in seconds is between ``low`` and ``high``. ``skew`` is the
+    middle of this interval and ``error`` its half width. ``round_trip`` is
+    the time between the SSH command sent and its output received.
+    """
+    def __init__(self, output, round_trip):
+        utc_offset = parse_utc_offset(output[0])
+        samples = [parse_sample(line, utc_offset)
+                   for line in output[1:] if line]
+        if not samples:
+            raise ValueError('No clock sample in output: {0}'.format(output))
 
-    local_time_str = local_time_cmd.output[0]
-    local_time = datetime.strptime(local_time_str, '%d %b %Y %H:%M:%S')
-    logger.debug("Local VM time: {0}".format(local_time))
-else:
-    plugin.unknown("No output during command execution !")
+        before, after, host = samples[-1]
+        if len(samples) > 1 and samples[0][2] < host:
+            # The ESX clock turned to the second ``host`` after the VM time
+            # of the previous sample
+            self.low, self.high = samples[0][0] - host, after - host
+        else:
+            # The ESX time is truncated to the second
+            self.low, self.high = before - host - 1, after - host
+        self.skew = (self.low + self.high) / 2
+        self.error = (self.high - self.low) / 2
+        self.round_trip = round_trip
+
+    def __repr__(self):
+        return "ClockSkew<{0:.3f}s +/- {1:.3f}s>".format(self.skew,
+                                                         self.error)
+
+
+def parse_utc_offset(offset):
+    """Return the seconds of a UTC offset like +0200."""
+    sign = -1 if offset.startswith('-') else 1
+    return sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+
+
+def parse_seconds(timestamp):
+    """Return the seconds of ``date +%s.%N``, even without %N support."""
+    try:
+        return float(timestamp)
+    except ValueError:
+        return float(timestamp.split('.')[0])
+
+
+def parse_sample(line, utc_offset):
+    """Return (VM time, VM time, ESX time) in seconds since the epoch."""
+    before, after, host = line.split(' ', 2)
+    host = datetime.strptime(host, '%d %b %Y %H:%M:%S')
+    return (parse_seconds(before), parse_seconds(after),
+            calendar.timegm(host.timetuple()) - utc_offset)
+
+
+def measure(probe):
+    """Return the :class:`ClockSkew` of the VM of the probe."""
+    sent = time.time()
+    command = probe.execute(CLOCKS_COMMAND)
+    received = time.time()
+    logger.debug("{0}: {1}".format(probe.hostaddress, command.output))
+    if command.status or not command.output:
+        raise ProbeSSH.SSHCommandFailed(
+            "No output during command execution !\n"
+            "Errors: {0}".format("\n".join(command.errors)))
+    return ClockSkew(command.output, received - sent)
+
+
+def measure_vms(addresses):
+    """
+    Measure the VMs in parallel.
+
+    Return a dict of address -> :class:`ClockSkew`, or the error message if
+    the VM could not be measured.
+    """
+    results = {}
 
-diff = (local_time - esx_time).total_seconds()
-diff_abs = abs(diff)
-delta = timedelta(seconds=diff_abs)
-logger.debug("Diff: {0}".format(delta))
+    def worker(address):
+        try:
+            probe = ProbeSSH(hostaddress=address,
+                             port=plugin.options.port,
+                             username=plugin.options.username,
+                             password=plugin.options.password,
+                             timeout=plugin.options.timeout,
+                             raise_errors=True)
+            try:
+                results[address] = measure(probe)
+            finally:
+                probe.close()
+        except ProbeSSH.SSHError as e:
+            results[address] = str(e)
+        except Exception as e:
+            results[address] = 'Unexpected error: {0!r}'.format(e)
+
+    threads = [threading.Thread(target=worker, args=(address,))
+               for address in addresses]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+plugin = PluginTime(version='0.0.1', description="Check time sync with ESX")
+
+addresses = [plugin.options.hostname]
+addresses.extend(vm for vm in plugin.options.vms if vm not in addresses)
+
+if len(addresses) == 1:
+    try:
+        results = {plugin.options.hostname: measure(plugin.ssh)}
+    except ProbeSSH.SSHError as e:
+        plugin.unknown(str(e))
+    except ValueError as e:
+        plugin.unknown("Unexpected output of the command !\n{0}".format(e))
+else:
+    results = measure_vms(addresses)
 
 # Convert second into timedelta format
 sec = timedelta(seconds=plugin.options.second)
 
 # Is the ESX sync ?
-if esx_time_cmd.output and local_time_cmd.output:
-    if delta < sec:
-        status = plugin.ok
-        plugin.shortoutput = "The ESX time is sync properly - " \
-                             "Timedelta : {0}".format(delta)
+unsync = []
+failed = []
+lines = []
+for address in addresses:
+    skew = results[address]
+    if not isinstance(skew, ClockSkew):
+        failed.append(address)
+        lines.append("{0}: {1}".format(address, skew))
+        continue
+
+    delta = timedelta(seconds=abs(skew.skew))
+    logger.debug("{0}: {1!r}, SSH round trip {2:.3f}s".format(
+        address, skew, skew.round_trip))
+    if delta >= sec:
+        unsync.append(address)
+    lines.append("{0}: Timedelta : {1} (+/- {2:.3f}s)".format(
+        address, delta, skew.error))
+
+    # Performance data
+    if address == plugin.options.hostname:
+        label = 'time_sync_esx'
     else:
+        label = 'time_sync_esx_{0}'.format(address)
+    plugin.perfdata.append('{0}={1:.3f}s;'.format(label, skew.skew))
+
+if len(addresses) == 1:
+    skew = results[plugin.options.hostname]
+    delta = timedelta(seconds=abs(skew.skew))
+    if unsync:
         status = plugin.critical
         plugin.shortoutput = "The ESX time isn't sync properly - " \
                              "Timedelta : {0}".format(delta)
+    else:
+        status = plugin.ok
+        plugin.shortoutput = "The ESX time is sync properly - " \
+                             "Timedelta : {0}".format(delta)
+    plugin.shortoutput += " (+/- {0:.3f}s)".format(skew.error)
+elif unsync:
+    status = plugin.critical
+    plugin.shortoutput = "The ESX time isn't sync properly on {0} " \
+                         "VM(s) !".format(len(unsync))
+elif failed:
+    status = plugin.unknown
+    plugin.shortoutput = "The time of {0} VM(s) cannot be " \
+                         "checked !".format(len(failed))
 else:
-    status = plugin.unknown('No output during command execution !')
+    status = plugin.ok
+    plugin.shortoutput = "The ESX time is sync properly on {0} " \
+                         "VMs".format(len(addresses))
 
-# Performance data
-plugin.perfdata.append('time_sync_esx={0}s;'.format(diff))
+if len(addresses) > 1:
+    plugin.longoutput.extend(lines)
 
 # Return status with message to Nagios
-if status:
-    status(plugin.output())
-else:
-    plugin.unknown('Unexpected error during plugin execution, please '
-                   'investigate with debug mode on.')
+status(plugin.output())